@@ -1,5 +1,6 @@
 import uuid
-from typing import Dict, Any, List, Optional, Literal
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Literal, Tuple
 from datetime import datetime
 from pydantic import BaseModel, Field
 from langchain_google_genai import ChatGoogleGenerativeAI
@@ -13,25 +14,44 @@ import os
 
 from app.config import settings
 from app.models import ProductSearchRequest
+from app.agent.stubs import StubChatModel, StubWebSearchTool
+from app.agent.llm_scheduler import get_llm_scheduler, usage_tokens
+from app.deadlines import DeadlineExceeded, call_with_deadline, current_deadline
+from app.metrics import (
+    GRAPH_NODE_SECONDS, LLM_CALL_SECONDS, WEB_SEARCH_SECONDS, INTENT_ROUTES, RESPONSE_FALLBACKS, timed, record_llm_usage
+)
+from app.tracing import span, traced
 from IPython.display import Image
 
+# Scheduler priority class of each LLM call; routing runs ahead of generation
+LLM_CALL_CLASSES = {
+    "intent": "routing",
+    "web_summary": "generation",
+    "product_recommendation": "generation",
+    "query_clarification": "generation",
+}
+
 class AgentState(MessagesState):
     context: Dict[str, Any]
     image_path: Optional[str]
     response: Optional[str]
     intent: Optional[str]
+    reply_id: Optional[str]
 
 class ChatbotAgent:
     """LangGraph-based chatbot agent with memory and thread capabilities"""
     
     def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(
-            model=settings.MODEL_NAME,
-            temperature=settings.TEMPERATURE,
-            #max_output_tokens=settings.MAX_TOKENS,
-            google_api_key=settings.GOOGLE_API_KEY,
-            #safety_settings=settings.SAFETY_SETTINGS
-        )
+        if settings.LLM_PROVIDER == "stub":
+            self.llm = StubChatModel()
+        else:
+            self.llm = ChatGoogleGenerativeAI(
+                model=settings.MODEL_NAME,
+                temperature=settings.TEMPERATURE,
+                #max_output_tokens=settings.MAX_TOKENS,
+                google_api_key=settings.GOOGLE_API_KEY,
+                #safety_settings=settings.SAFETY_SETTINGS
+            )
         
         from app.services.service_manager import get_product_service
         # Initialize product service for RAG
@@ -46,9 +66,18 @@ class ChatbotAgent:
         # Compile the graph
         self.app = self.graph.compile(checkpointer=self.memory_saver)
 
+        # Per thread: (messages indexed, id of the last one, message id -> position), least recently used first
+        self._message_positions: "OrderedDict[str, Tuple[int, Optional[str], Dict[str, int]]]" = OrderedDict()
+
+        # Rate limits are per API key, so every agent shares one scheduler
+        self.llm_scheduler = get_llm_scheduler()
+
         #self._save_graph_architecture()
 
-        self.web_search_tool = TavilySearchResults(k=1, tavily_api_key=settings.TAVILY_API_KEY)
+        if settings.LLM_PROVIDER == "stub":
+            self.web_search_tool = StubWebSearchTool()
+        else:
+            self.web_search_tool = TavilySearchResults(k=1, tavily_api_key=settings.TAVILY_API_KEY)
     
     def _create_agent_graph(self) -> StateGraph:
         """Create the LangGraph state graph for the chatbot"""                   
@@ -90,14 +119,47 @@ class ChatbotAgent:
             f.write(img_data.data)
 
         print(f"LangGraph architecture saved to: {output_path}")
+
+    async def _call_llm(
+        self,
+        call: str,
+        chain: Any,
+        messages: List[BaseMessage],
+        system_prompt: str = "",
+        config: Optional[Dict[str, Any]] = None,
+        usage: Any = usage_tokens,
+        timeout: Optional[float] = None
+    ) -> Any:
+        """Invoke an LLM chain through the shared scheduler
+
+        Tokens are estimated at four characters each plus
+        LLM_OUTPUT_TOKEN_ESTIMATE until the provider reports actual usage.
+        Queueing and the call together get ``timeout`` (LLM_TIMEOUT_SECONDS by
+        default) or the request's remaining budget, whichever is shorter;
+        DeadlineExceeded is raised past it.
+        """
+        prompt_chars = len(system_prompt) + sum(len(str(message.content)) for message in messages)
+        estimated_tokens = prompt_chars // 4 + settings.LLM_OUTPUT_TOKEN_ESTIMATE
+
+        async def invoke() -> Any:
+            with LLM_CALL_SECONDS.labels(call=call).time(), span(f"llm.{call}"):
+                return await chain.ainvoke({"messages": messages}, config=config)
+
+        return await call_with_deadline(
+            f"llm.{call}",
+            lambda: self.llm_scheduler.run(
+                LLM_CALL_CLASSES[call], invoke, estimated_tokens, deadline=current_deadline().expires_at, usage=usage
+            ),
+            timeout or settings.LLM_TIMEOUT_SECONDS,
+            hedge=settings.HEDGE_REQUESTS
+        )
     
-    def _find_user_intent(self, state: AgentState) -> AgentState:
+    @traced("node.find_user_intent")
+    @timed(GRAPH_NODE_SECONDS.labels(node="find_user_intent"), error_stage="find_user_intent")
+    async def _find_user_intent(self, state: AgentState) -> AgentState:
         messages = state.get("messages", [])
 
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                SystemMessage(
-                    content="""
+        system_prompt = """
                     You are a helpful and intelligent AI agent for an e-commerce platform. Your primary role is to assist users by routing their queries appropriately.
 
                     Product Catalog:
@@ -110,34 +172,58 @@ class ChatbotAgent:
 
                     Always respond politely and professionally, and ensure the user receives a relevant and helpful answer, whether through internal search or web search.
                     """
-                ),
+        prompt = ChatPromptTemplate.from_messages(
+            [
+                SystemMessage(content=system_prompt),
                 MessagesPlaceholder(variable_name="messages"),
             ]
         )
 
-        chain = prompt | self.llm.with_structured_output(UserQueryIntent)
-
-        intent = chain.invoke(
-            {"messages": messages}
-        )
+        chain = prompt | self.llm.with_structured_output(UserQueryIntent, include_raw=True)
 
-        return {"intent": intent.step}
+        try:
+            result = await self._call_llm(
+                "intent", chain, messages, system_prompt,
+                usage=lambda result: usage_tokens(result["raw"]), timeout=settings.INTENT_TIMEOUT_SECONDS
+            )
+        except DeadlineExceeded as e:
+            # Retrieval is local, so the product path can still answer if generation also runs late
+            print(f"⚠️  {e}; routing to product search")
+            return {"intent": "search_products"}
+        record_llm_usage("intent", result["raw"])
+        intent = result["parsed"]
+
+        # Fall back to web search when the structured output could not be parsed
+        return {"intent": intent.step if intent else "search_web"}
 
     def _route_intent(self, state: AgentState):
         # Return the node name you want to visit next
+        INTENT_ROUTES.labels(intent=state["intent"] or "none").inc()
         if state["intent"] == "search_products":
             return "search_products"
         else:
             return "search_web"
 
-    def _search_web(self, state: AgentState) -> AgentState:
+    @traced("node.search_web")
+    @timed(GRAPH_NODE_SECONDS.labels(node="search_web"), error_stage="search_web")
+    async def _search_web(self, state: AgentState) -> AgentState:
         messages = state.get("messages", [])
         user_query = ""
         if messages:
             user_query = messages[-1].content if hasattr(messages[-1], 'content') else str(messages[-1])
 
         # Web search
-        docs = self.web_search_tool.invoke({"query": user_query})
+        try:
+            with WEB_SEARCH_SECONDS.time(), span("web_search"):
+                docs = await call_with_deadline(
+                    "web_search",
+                    lambda: self.web_search_tool.ainvoke({"query": user_query}),
+                    settings.WEB_SEARCH_TIMEOUT_SECONDS,
+                    hedge=settings.HEDGE_REQUESTS
+                )
+        except DeadlineExceeded as e:
+            print(f"⚠️  {e}; answering without web results")
+            docs = []
         web_results = "\n".join([d["content"] for d in docs])
 
         system_prompt = self._create_system_prompt_for_web_search(user_query, web_results)
@@ -152,14 +238,19 @@ class ChatbotAgent:
         chain = prompt | self.llm
 
         config = {"configurable": {"thread_id": state.get("thread_id")}}
-        response = chain.invoke({"messages": messages},config=config)
+        try:
+            response = await self._call_llm("web_summary", chain, messages, system_prompt, config=config)
+        except DeadlineExceeded as e:
+            print(f"⚠️  {e}; returning web results without a summary")
+            RESPONSE_FALLBACKS.labels(node="search_web").inc()
+            content = self._fallback_web_response(docs)
+            return self._reply(state, content)
+        record_llm_usage("web_summary", response)
         
-        return {
-            **state,
-            "response": response.content,
-            "messages": [AIMessage(content=response.content)]   
-        }            
+        return self._reply(state, response.content)            
         
+    @traced("node.search_products")
+    @timed(GRAPH_NODE_SECONDS.labels(node="search_products"), error_stage="search_products")
     async def _search_products(self, state: AgentState) -> AgentState:
         """Generate response using the LLM with RAG capabilities"""
         messages = state.get("messages", [])
@@ -178,9 +269,20 @@ class ChatbotAgent:
             image_query_path=state.get("image_path", None),
             limit=3
         )
-        result = await self.product_service.search_products(product_search_request)
-        if(result.products):
-            print(f"Found #{len(result.products)} product for system prompt")
+        try:
+            result = await call_with_deadline(
+                "vector_search",
+                lambda: self.product_service.search_products(product_search_request),
+                settings.VECTOR_SEARCH_TIMEOUT_SECONDS
+            )
+            products = result.products
+        except DeadlineExceeded as e:
+            # The search keeps running for any caller sharing it; this one asks the user to narrow the query
+            print(f"⚠️  {e}; asking a clarifying question instead")
+            RESPONSE_FALLBACKS.labels(node="search_products").inc()
+            products = []
+        if(products):
+            print(f"Found #{len(products)} product for system prompt")
 
             product_context = "Here is a list of product(s) found:"
             product_context += "\n".join([f"""
@@ -188,11 +290,11 @@ class ChatbotAgent:
                 Description: {product.description}
                 Price: ${product.price}
                 Category: {product.category}
-                Tags: {product.tags}---""" for product in result.products])
+                Tags: {product.tags}---""" for product in products])
    
         
         # Create system prompt with context and RAG
-        system_prompt = self._create_system_prompt_for_product_recormendation(context, product_context) if result.products else self._create_system_prompt_for_query_clarification(context, user_query)
+        system_prompt = self._create_system_prompt_for_product_recormendation(context, product_context) if products else self._create_system_prompt_for_query_clarification(context, user_query)
         
         # Create the prompt template
         prompt = ChatPromptTemplate.from_messages([
@@ -203,14 +305,43 @@ class ChatbotAgent:
         # Generate response
         chain = prompt | self.llm
 
+        call = "product_recommendation" if products else "query_clarification"
         config = {"configurable": {"thread_id": state.get("thread_id")}}
-        response = chain.invoke({"messages": messages}, config=config)
+        try:
+            response = await self._call_llm(call, chain, messages, system_prompt, config=config)
+        except DeadlineExceeded as e:
+            print(f"⚠️  {e}; returning retrieved products without generated text")
+            RESPONSE_FALLBACKS.labels(node="search_products").inc()
+            content = self._fallback_product_response(products)
+            return self._reply(state, content)
+        record_llm_usage(call, response)
         
-        return {
-            **state,
-            "response": response.content,
-            "messages": [AIMessage(content=response.content)]   
-        }
+        return self._reply(state, response.content)
+
+    def _reply(self, state: AgentState, content: str) -> AgentState:
+        """Node result adding the assistant's reply under the id chosen for it in ``chat``"""
+        reply = AIMessage(
+            content=content,
+            id=state.get("reply_id") or str(uuid.uuid4()),
+            additional_kwargs={"created_at": datetime.now().isoformat()}
+        )
+        return {**state, "response": content, "messages": [reply]}
+
+    def _fallback_product_response(self, products: List[Any]) -> str:
+        """Plain product listing used when generation does not finish in time"""
+        if not products:
+            return (
+                "I couldn't find an exact match for that. Could you tell me more about what you're looking for, "
+                "such as the product type, brand or price range?"
+            )
+        lines = [f"- {product.title} (${product.price}, {product.category})" for product in products]
+        return "Here are the products I found:\n" + "\n".join(lines)
+
+    def _fallback_web_response(self, docs: List[Dict[str, Any]]) -> str:
+        """Raw web result used when the summary does not finish in time"""
+        if not docs:
+            return "Sorry, I couldn't get an answer to that in time. Please try again in a moment."
+        return "Here's what I found online:\n" + docs[0]["content"]
 
     def _create_system_prompt_for_web_search(self, user_query: str, web_results: str) -> str:
 
@@ -285,15 +416,17 @@ class ChatbotAgent:
         
         return base_prompt.format(context=context, product_context=product_context)
     
+    @traced("agent.chat")
     async def chat(
         self, 
         message: str, 
         query_image_path: Optional[str] = None,
         thread_id: Optional[str] = None,
         user_id: Optional[str] = None,
-        context: Optional[Dict[str, Any]] = None
+        context: Optional[Dict[str, Any]] = None,
+        message_id: Optional[str] = None
     ) -> Dict[str, Any]:
-        """Process a chat message and return response"""
+        """Process a chat message and return response; ``message_id`` becomes the reply's id"""
         
         # Generate thread_id if not provided
         if not thread_id:
@@ -305,19 +438,28 @@ class ChatbotAgent:
         # Get existing messages from memory or start fresh
         config = {"configurable": {"thread_id": thread_id}}
                 # Create initial state
+        # Messages carry their own ids and creation times so history can be paged and stamped
         initial_state = {
-            "messages": [HumanMessage(content=message)],    
+            "messages": [HumanMessage(
+                content=message,
+                id=str(uuid.uuid4()),
+                additional_kwargs={"created_at": datetime.now().isoformat()}
+            )],    
             "image_path": query_image_path,     
             "context": context or {},
-            "response": None
+            "response": None,
+            "reply_id": message_id or str(uuid.uuid4())
         }
         
         # Run the graph
         result = await self.app.ainvoke(initial_state, config=config)
+        reply = result["messages"][-1]
 
         return {
             "response": result["response"],
             "thread_id": thread_id,
+            "message_id": reply.id,
+            "timestamp": reply.additional_kwargs.get("created_at"),
             "metadata": {
                 "user_id": user_id,
                 "timestamp": datetime.now().isoformat(),
@@ -325,30 +467,93 @@ class ChatbotAgent:
             }
         }
     
-    async def get_thread_history(self, thread_id: str) -> List[Dict[str, Any]]:
-        """Get conversation history for a thread"""
+    async def get_thread_history(
+        self,
+        thread_id: str,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        after_message_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Get one page of a thread's conversation history, oldest message first
+
+        By default the page holds the newest ``limit`` messages, or with
+        ``cursor`` the ones just before that message, and ``next_cursor``
+        names the page of older messages. With ``after_message_id`` it holds
+        the messages that followed that one, and ``has_more`` says whether
+        newer ones remain. Only the returned messages are converted.
+        """
+        if cursor and after_message_id:
+            raise ValueError("Pass either cursor or after_message_id, not both")
+
         config = {"configurable": {"thread_id": thread_id}}
-        
+        messages: List[BaseMessage] = []
+        checkpoint_time = None
         try:
             # Get the current state from memory
             state = await self.app.aget_state(config)
             if state and state.values:
                 messages = state.values.get("messages", [])
-                return [
-                    {
-                        "role": "user" if isinstance(msg, HumanMessage) else "assistant",
-                        "content": msg.content,
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    for msg in messages
-                ]
+                checkpoint_time = state.created_at
         except Exception:
             pass
-        
-        return []
+
+        def position(message_id: str) -> int:
+            return self._message_position(thread_id, messages, message_id)
+
+        if after_message_id:
+            start = position(after_message_id) + 1
+            end = min(start + limit, len(messages))
+            has_more = end < len(messages)
+        else:
+            end = position(cursor) if cursor else len(messages)
+            start = max(end - limit, 0)
+            has_more = start > 0
+
+        page = messages[start:end]
+        return {
+            "messages": [
+                {
+                    "id": msg.id,
+                    "role": "user" if isinstance(msg, HumanMessage) else "assistant",
+                    "content": msg.content,
+                    # Messages stored before timestamps were recorded fall back to the checkpoint time
+                    "timestamp": msg.additional_kwargs.get("created_at") or checkpoint_time or datetime.now().isoformat()
+                }
+                for msg in page
+            ],
+            "total": len(messages),
+            "has_more": has_more,
+            "next_cursor": page[0].id if has_more and not after_message_id and page else None,
+        }
     
+    def _message_position(self, thread_id: str, messages: List[BaseMessage], message_id: str) -> int:
+        """Position of a message in a thread, from an id map that only indexes messages added since the last call
+
+        Threads only grow, so the map stays valid while the last message it
+        indexed is still in place; otherwise it is rebuilt.
+        """
+        indexed, last_id, positions = self._message_positions.pop(thread_id, (0, None, {}))
+        if indexed > len(messages) or (indexed and messages[indexed - 1].id != last_id):
+            indexed, positions = 0, {}
+        for i in range(indexed, len(messages)):
+            positions[messages[i].id] = i
+        self._message_positions[thread_id] = (len(messages), messages[-1].id if messages else None, positions)
+        while len(self._message_positions) > settings.THREAD_HISTORY_INDEX_THREADS:
+            self._message_positions.popitem(last=False)
+
+        i = positions.get(message_id)
+        if i is not None and messages[i].id != message_id:
+            # Messages were removed and others added since; index the thread afresh
+            positions.clear()
+            positions.update((msg.id, j) for j, msg in enumerate(messages))
+            i = positions.get(message_id)
+        if i is None:
+            raise ValueError(f"Message {message_id} not found in thread {thread_id}")
+        return i
+
     async def delete_thread(self, thread_id: str) -> bool:
         """Delete a conversation thread"""
+        self._message_positions.pop(thread_id, None)
         try:
             config = {"configurable": {"thread_id": thread_id}}
             await self.app.adelete_state(config)
@@ -0,0 +1,220 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Awaitable, Callable, List, Optional, TypeVar
+
+from app.config import settings
+from app.metrics import LLM_SCHEDULER_EVENTS, LLM_SCHEDULER_QUEUE_DEPTH, LLM_SCHEDULER_WAIT_SECONDS
+
+
+T = TypeVar("T")
+
+# Lower runs first: routing decides where a request goes and is short, generation is long
+PRIORITIES = {"routing": 0, "generation": 1}
+
+
+class LLMOverloadedError(RuntimeError):
+    """Raised when an LLM call cannot start before its deadline or the queue is full"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Continuously refilling budget of ``rate_per_minute`` units, holding at most one minute's worth
+
+    A rate of 0 disables the limit. Usage may drive the balance negative when
+    a call turns out larger than estimated; later calls then wait longer.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.balance = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.balance = min(self.capacity, self.balance + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` units are available"""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill(now)
+        # A request larger than the whole bucket only waits for a full bucket
+        deficit = min(amount, self.capacity) - self.balance
+        return max(deficit, 0.0) * 60.0 / self.capacity
+
+    def take(self, amount: float, now: float) -> None:
+        if self.capacity > 0:
+            self._refill(now)
+            self.balance -= amount
+
+
+class _Waiter:
+    def __init__(self, priority: int, sequence: int, tokens: int, deadline: float, future: asyncio.Future):
+        self.priority = priority
+        self.sequence = sequence
+        self.tokens = tokens
+        self.deadline = deadline
+        self.future = future
+        self.enqueued = time.monotonic()
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+def usage_tokens(message: Any) -> Optional[int]:
+    """Total tokens reported in a LangChain message's usage metadata, if any"""
+    usage = getattr(message, "usage_metadata", None) or {}
+    return usage.get("total_tokens")
+
+
+class LLMScheduler:
+    """Admission control for LLM calls shared by every request in the process
+
+    Calls wait in a bounded priority queue until the requests-per-minute and
+    tokens-per-minute buckets and the concurrency limit allow them to start.
+    Higher-priority classes always start first. A call is shed with
+    LLMOverloadedError once its deadline passes, or as soon as the buckets
+    show it cannot start before the deadline, instead of piling up behind a
+    provider that would answer with 429s.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        max_queue: Optional[int] = None
+    ):
+        self.requests = TokenBucket(settings.LLM_REQUESTS_PER_MINUTE if requests_per_minute is None else requests_per_minute)
+        self.tokens = TokenBucket(settings.LLM_TOKENS_PER_MINUTE if tokens_per_minute is None else tokens_per_minute)
+        self.max_concurrency = max_concurrency or settings.LLM_MAX_CONCURRENCY
+        self.max_queue = max_queue or settings.LLM_QUEUE_SIZE
+        self._heap: List[_Waiter] = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    async def run(
+        self,
+        call_class: str,
+        call: Callable[[], Awaitable[T]],
+        estimated_tokens: int,
+        deadline: Optional[float] = None,
+        usage: Callable[[T], Optional[int]] = usage_tokens
+    ) -> T:
+        """Run ``call`` once admitted
+
+        ``deadline`` is a time.monotonic() value; queueing never lasts past it
+        or past LLM_QUEUE_TIMEOUT_SECONDS.
+        """
+        await self._acquire(call_class, estimated_tokens, deadline)
+        try:
+            result = await call()
+        finally:
+            self._in_flight -= 1
+            self._wakeup.set()
+        actual = usage(result)
+        if actual is not None:
+            # Settle the estimate against what the provider reported
+            self.tokens.take(actual - estimated_tokens, time.monotonic())
+        return result
+
+    async def _acquire(self, call_class: str, estimated_tokens: int, deadline: Optional[float]) -> None:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch(), name="llm-scheduler")
+
+        if len(self._heap) >= self.max_queue:
+            LLM_SCHEDULER_EVENTS.labels(call_class=call_class, result="queue_full").inc()
+            raise LLMOverloadedError(f"LLM queue is full ({self.max_queue} calls waiting)", retry_after=1.0)
+
+        queue_deadline = time.monotonic() + settings.LLM_QUEUE_TIMEOUT_SECONDS
+        waiter = _Waiter(
+            PRIORITIES[call_class],
+            next(self._sequence),
+            estimated_tokens,
+            queue_deadline if deadline is None else min(deadline, queue_deadline),
+            asyncio.get_running_loop().create_future()
+        )
+        heapq.heappush(self._heap, waiter)
+        LLM_SCHEDULER_QUEUE_DEPTH.set(len(self._heap))
+        self._wakeup.set()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            # Admitted just before the caller gave up: hand the slot back
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                self._in_flight -= 1
+                self._wakeup.set()
+            else:
+                waiter.future.cancel()
+            raise
+        LLM_SCHEDULER_EVENTS.labels(call_class=call_class, result="admitted").inc()
+        LLM_SCHEDULER_WAIT_SECONDS.labels(call_class=call_class).observe(time.monotonic() - waiter.enqueued)
+
+    def _shed(self, waiter: _Waiter, reason: str, retry_after: float) -> None:
+        call_class = next(name for name, priority in PRIORITIES.items() if priority == waiter.priority)
+        LLM_SCHEDULER_EVENTS.labels(call_class=call_class, result="shed").inc()
+        waiter.future.set_exception(LLMOverloadedError(reason, retry_after=retry_after))
+
+    async def _dispatch(self) -> None:
+        while True:
+            now = time.monotonic()
+
+            # Drop callers that gave up and shed those whose deadline passed while queued
+            live = []
+            for waiter in self._heap:
+                if waiter.future.done():
+                    continue
+                if waiter.deadline <= now:
+                    self._shed(waiter, "LLM call deadline passed while queued", retry_after=1.0)
+                    continue
+                live.append(waiter)
+            if len(live) != len(self._heap):
+                heapq.heapify(live)
+                self._heap = live
+            LLM_SCHEDULER_QUEUE_DEPTH.set(len(self._heap))
+
+            sleep_for: Optional[float] = None
+            if self._heap and self._in_flight < self.max_concurrency:
+                head = self._heap[0]
+                wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(head.tokens, now))
+                if wait <= 0:
+                    heapq.heappop(self._heap)
+                    self.requests.take(1, now)
+                    self.tokens.take(head.tokens, now)
+                    self._in_flight += 1
+                    head.future.set_result(None)
+                    continue
+                if now + wait > head.deadline:
+                    heapq.heappop(self._heap)
+                    self._shed(head, f"LLM rate limit cannot admit this call within its deadline (needs {wait:.1f}s)", retry_after=wait)
+                    continue
+                sleep_for = wait
+            if self._heap:
+                # Wake for the next queued deadline too
+                until_deadline = min(waiter.deadline for waiter in self._heap) - now
+                sleep_for = until_deadline if sleep_for is None else min(sleep_for, until_deadline)
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(sleep_for, 0.001) if sleep_for is not None else None)
+            except asyncio.TimeoutError:
+                pass
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """The process-wide LLM scheduler"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler()
+    return _scheduler
@@ -0,0 +1,95 @@
+import asyncio
+import re
+import time
+from typing import Any, Dict, List, Optional, Type
+
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from pydantic import BaseModel
+
+from app.config import settings
+
+
+# Words that make the stub route a message to product search
+PRODUCT_KEYWORDS = {
+    "buy", "price", "cheap", "electronics", "headphones", "earbuds", "speaker", "laptop", "monitor",
+    "camera", "tv", "keyboard", "mouse", "charger", "watch", "tablet", "phone", "oled", "wireless",
+}
+
+
+def _last_message_text(prompt_value: Any) -> str:
+    """Extract the latest message content from a prompt value or message list"""
+    messages: List[BaseMessage] = prompt_value.to_messages() if hasattr(prompt_value, "to_messages") else prompt_value
+    if not messages:
+        return ""
+    last = messages[-1]
+    return last.content if isinstance(last.content, str) else str(last.content)
+
+
+class StubChatModel(Runnable):
+    """Local stand-in for ChatGoogleGenerativeAI with configurable artificial latency
+
+    Used for load testing so the server's own scaling limits can be measured
+    without network calls. Replies are canned, intent routing is keyword based,
+    and token usage is estimated from whitespace-separated words.
+    """
+
+    def __init__(self, latency_ms: Optional[float] = None):
+        self.latency_s = (settings.STUB_LLM_LATENCY_MS if latency_ms is None else latency_ms) / 1000.0
+
+    def _reply(self, prompt_value: Any) -> AIMessage:
+        text = _last_message_text(prompt_value)
+        content = f"This is a stubbed assistant reply to: {text[:200]}"
+        input_tokens = len(str(prompt_value).split())
+        output_tokens = len(content.split())
+        return AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            }
+        )
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AIMessage:
+        time.sleep(self.latency_s)
+        return self._reply(input)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AIMessage:
+        await asyncio.sleep(self.latency_s)
+        return self._reply(input)
+
+    def with_structured_output(self, schema: Type[BaseModel], include_raw: bool = False, **kwargs: Any) -> Runnable:
+        """Return a runnable producing the routing schema from keyword matching"""
+
+        def classify(prompt_value: Any) -> Any:
+            words = set(re.findall(r"\w+", _last_message_text(prompt_value).lower()))
+            parsed = schema(step="search_products" if words & PRODUCT_KEYWORDS else "search_web")
+            if include_raw:
+                return {"raw": self._reply(prompt_value), "parsed": parsed, "parsing_error": None}
+            return parsed
+
+        def route(prompt_value: Any) -> Any:
+            time.sleep(self.latency_s)
+            return classify(prompt_value)
+
+        async def aroute(prompt_value: Any) -> Any:
+            await asyncio.sleep(self.latency_s)
+            return classify(prompt_value)
+
+        return RunnableLambda(route, afunc=aroute)
+
+
+class StubWebSearchTool:
+    """Local stand-in for TavilySearchResults with configurable artificial latency"""
+
+    def __init__(self, latency_ms: Optional[float] = None):
+        self.latency_s = (settings.STUB_WEB_SEARCH_LATENCY_MS if latency_ms is None else latency_ms) / 1000.0
+
+    def invoke(self, input: Dict[str, Any], config: Optional[RunnableConfig] = None, **kwargs: Any) -> List[Dict[str, str]]:
+        time.sleep(self.latency_s)
+        return [{"url": "https://example.com", "content": f"Stubbed web result for: {input.get('query', '')}"}]
+
+    async def ainvoke(self, input: Dict[str, Any], config: Optional[RunnableConfig] = None, **kwargs: Any) -> List[Dict[str, str]]:
+        await asyncio.sleep(self.latency_s)
+        return [{"url": "https://example.com", "content": f"Stubbed web result for: {input.get('query', '')}"}]
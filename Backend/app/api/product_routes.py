@@ -1,13 +1,21 @@
-from fastapi import APIRouter, HTTPException, Depends, Query, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, Depends, Query, UploadFile, File, Form, Request
 from typing import List, Optional, Annotated
 from datetime import datetime
-from app.services.service_manager import get_product_service
+from app.services.service_manager import get_product_service, get_file_service
+from app.config import settings
 
 from app.models import (
     ProductCreate, ProductUpdate, ProductResponse, 
-    ProductSearchRequest, ProductSearchResponse, ImageSearchRequest, MultiModalSearchRequest
+    ProductSearchRequest, ProductSearchResponse, ImageSearchRequest, MultiModalSearchRequest, ProductJobResponse,
+    BatchSearchRequest, BatchSearchResponse
 )
+from app.api.responses import FastJSONResponse, catalog_etag, not_modified, product_etag, with_etag
 from app.services.product_service import ProductService
+from app.services.product_jobs import QueueFullError
+from app.services.file_service import FileService
+from app.rag.embedding_client import UnsupportedModalityError
+from app.rag.active_collection import read_active_collection
+from app.rag.migration import list_migrations
 
 # Create router
 router = APIRouter(prefix="/api/v1/products", tags=["products"])
@@ -30,25 +38,68 @@ async def create_product(
     """
     try:
         return await product_service.create_product(product_data)
+    except UnsupportedModalityError as e:
+        raise HTTPException(status_code=501, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create product: {str(e)}")
 
 
+@router.post("/jobs", response_model=ProductJobResponse, status_code=202)
+async def submit_product(
+    product_data: Annotated[ProductCreate, Form()],
+    product_service: ProductService = Depends(get_product_service)
+) -> ProductJobResponse:
+    """
+    Create a product in the background.
+    
+    Takes the same fields as `POST /api/v1/products/`. Images are saved right away;
+    embedding and indexing run in a background worker queue. Returns a job to poll at
+    `GET /api/v1/products/jobs/{job_id}`. Responds 503 when the queue is full.
+    """
+    try:
+        return ProductJobResponse(**await product_service.submit_product(product_data))
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to queue product: {str(e)}")
+
+
+@router.get("/jobs/{job_id}", response_model=ProductJobResponse)
+async def get_product_job(
+    job_id: str,
+    product_service: ProductService = Depends(get_product_service)
+) -> ProductJobResponse:
+    """
+    Get the status of a background product job.
+    
+    - **job_id**: The job identifier returned by `POST /api/v1/products/jobs`
+    """
+    job = await product_service.get_product_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return ProductJobResponse(**job)
+
+
 @router.get("/{product_id}", response_model=ProductResponse)
 async def get_product(
     product_id: str,
+    request: Request,
     product_service: ProductService = Depends(get_product_service)
 ) -> ProductResponse:
     """
     Get a product by ID.
     
     - **product_id**: The product identifier
+    
+    Responses carry an ETag derived from the product's `updated_at`; send it back in
+    `If-None-Match` to get a 304 when the product is unchanged.
     """
     try:
         product = await product_service.get_product(product_id)
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
-        return product
+        etag = product_etag(product)
+        return not_modified(request, etag) or with_etag(FastJSONResponse(product), etag)
     except HTTPException:
         raise
     except Exception as e:
@@ -113,15 +164,20 @@ async def search_products(
     - **max_price**: Maximum price filter (optional)
     - **min_price**: Minimum price filter (optional)
     - **limit**: Maximum number of results (optional, default: 10)
+    - **mmr_lambda**: Relevance/diversity trade-off for reranking (optional, 1.0 disables)
+    - **mmr_pool_size**: Candidates considered by reranking (optional)
     """
     try:
-        return await product_service.search_products(search_request)
+        return FastJSONResponse(await product_service.search_products(search_request))
+    except UnsupportedModalityError as e:
+        raise HTTPException(status_code=501, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
 
 @router.get("/", response_model=List[ProductResponse])
 async def get_all_products(
+    request: Request,
     limit: int = Query(100, ge=1, le=1000, description="Maximum number of products to return"),
     product_service: ProductService = Depends(get_product_service)
 ) -> List[ProductResponse]:
@@ -129,9 +185,18 @@ async def get_all_products(
     Get all products.
     
     - **limit**: Maximum number of products to return (default: 100, max: 1000)
+    
+    Responses carry an ETag of the catalog version; send it back in `If-None-Match` to
+    get a 304 while the catalog is unchanged.
     """
     try:
-        return await product_service.get_all_products(limit=limit)
+        # Read the version before the products: a change in between leaves an older tag on
+        # newer data, which only costs the client one extra full response
+        etag = catalog_etag(product_service.catalog_version())
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        return with_etag(FastJSONResponse(await product_service.get_all_products(limit=limit)), etag)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get products: {str(e)}")
 
@@ -139,6 +204,7 @@ async def get_all_products(
 @router.get("/category/{category}", response_model=List[ProductResponse])
 async def get_products_by_category(
     category: str,
+    request: Request,
     limit: int = Query(50, ge=1, le=500, description="Maximum number of products to return"),
     product_service: ProductService = Depends(get_product_service)
 ) -> List[ProductResponse]:
@@ -147,9 +213,17 @@ async def get_products_by_category(
     
     - **category**: Product category
     - **limit**: Maximum number of products to return (default: 50, max: 500)
+    
+    Supports `If-None-Match` with the catalog-version ETag, like the product listing.
     """
     try:
-        return await product_service.get_products_by_category(category, limit=limit)
+        etag = catalog_etag(product_service.catalog_version())
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        return with_etag(
+            FastJSONResponse(await product_service.get_products_by_category(category, limit=limit)), etag
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get products by category: {str(e)}")
 
@@ -161,6 +235,8 @@ async def simple_search(
     max_price: Optional[float] = Query(None, description="Maximum price"),
     min_price: Optional[float] = Query(None, description="Minimum price"),
     limit: int = Query(10, ge=1, le=100, description="Maximum number of results"),
+    mmr_lambda: Optional[float] = Query(None, ge=0.0, le=1.0, description="MMR trade-off between relevance (1.0) and diversity (0.0)"),
+    mmr_pool_size: Optional[int] = Query(None, ge=1, le=200, description="Candidates considered by MMR reranking"),
     product_service: ProductService = Depends(get_product_service)
 ) -> ProductSearchResponse:
     """
@@ -171,6 +247,8 @@ async def simple_search(
     - **max_price**: Maximum price filter (optional)
     - **min_price**: Minimum price filter (optional)
     - **limit**: Maximum number of results (optional, default: 10)
+    - **mmr_lambda**: Relevance/diversity trade-off for reranking (optional, 1.0 disables)
+    - **mmr_pool_size**: Candidates considered by reranking (optional)
     """
     try:
         search_request = ProductSearchRequest(
@@ -178,9 +256,13 @@ async def simple_search(
             category=category,
             max_price=max_price,
             min_price=min_price,
-            limit=limit
+            limit=limit,
+            mmr_lambda=mmr_lambda,
+            mmr_pool_size=mmr_pool_size
         )
-        return await product_service.search_products(search_request)
+        return FastJSONResponse(await product_service.search_products(search_request))
+    except UnsupportedModalityError as e:
+        raise HTTPException(status_code=501, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
@@ -188,7 +270,8 @@ async def simple_search(
 @router.post("/search/image", response_model=ProductSearchResponse)
 async def image_search(
     search_request: ImageSearchRequest,
-    product_service: ProductService = Depends(get_product_service)
+    product_service: ProductService = Depends(get_product_service),
+    file_service: FileService = Depends(get_file_service)
 ) -> ProductSearchResponse:
     """
     Search products using image similarity.
@@ -198,16 +281,93 @@ async def image_search(
     - **max_price**: Maximum price filter (optional)
     - **min_price**: Minimum price filter (optional)
     - **limit**: Maximum number of results (optional, default: 10)
+    - **mmr_lambda**: Relevance/diversity trade-off for reranking (optional, 1.0 disables)
+    - **mmr_pool_size**: Candidates considered by reranking (optional)
     """
     try:
+        query_image = file_service.load_base64_image(search_request.image)
         product_search_request = ProductSearchRequest(
-            image_query=search_request.image,
             category=search_request.category,
             max_price=search_request.max_price,
             min_price=search_request.min_price,
-            limit=search_request.limit
+            limit=search_request.limit,
+            mmr_lambda=search_request.mmr_lambda,
+            mmr_pool_size=search_request.mmr_pool_size
+        )
+        return FastJSONResponse(await product_service.search_products(product_search_request, query_image=query_image))
+    except HTTPException:
+        raise
+    except UnsupportedModalityError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Image search failed: {str(e)}")
+
+
+@router.post("/search/image/binary", response_model=ProductSearchResponse)
+async def binary_image_search(
+    request: Request,
+    category: Optional[str] = Query(None, description="Filter by category"),
+    max_price: Optional[float] = Query(None, description="Maximum price"),
+    min_price: Optional[float] = Query(None, description="Minimum price"),
+    limit: int = Query(10, ge=1, le=100, description="Maximum number of results"),
+    mmr_lambda: Optional[float] = Query(None, ge=0.0, le=1.0, description="MMR trade-off between relevance (1.0) and diversity (0.0)"),
+    mmr_pool_size: Optional[int] = Query(None, ge=1, le=200, description="Candidates considered by MMR reranking"),
+    product_service: ProductService = Depends(get_product_service),
+    file_service: FileService = Depends(get_file_service)
+) -> ProductSearchResponse:
+    """
+    Search products using image similarity with the raw image bytes as the request body.
+    
+    Avoids the base64 inflation and JSON parsing of `/search/image`; the image is
+    decoded in memory and never written to disk.
+    
+    - **body**: Raw image bytes, with an image `Content-Type` (required)
+    - **category**: Filter by category (optional)
+    - **max_price**: Maximum price filter (optional)
+    - **min_price**: Minimum price filter (optional)
+    - **limit**: Maximum number of results (optional, default: 10)
+    - **mmr_lambda**: Relevance/diversity trade-off for reranking (optional, 1.0 disables)
+    - **mmr_pool_size**: Candidates considered by reranking (optional)
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type not in settings.ALLOWED_IMAGE_TYPES:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Content type {content_type or 'missing'} not allowed. Allowed types: {settings.ALLOWED_IMAGE_TYPES}"
+        )
+
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > settings.MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File size {content_length} exceeds maximum allowed size of {settings.MAX_FILE_SIZE}"
+        )
+
+    # Content-Length is absent on chunked uploads, so the limit is enforced while reading
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > settings.MAX_FILE_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File size exceeds maximum allowed size of {settings.MAX_FILE_SIZE}"
+            )
+
+    try:
+        query_image = file_service.load_image(bytes(body))
+        product_search_request = ProductSearchRequest(
+            category=category,
+            max_price=max_price,
+            min_price=min_price,
+            limit=limit,
+            mmr_lambda=mmr_lambda,
+            mmr_pool_size=mmr_pool_size
         )
-        return await product_service.search_products(product_search_request)
+        return FastJSONResponse(await product_service.search_products(product_search_request, query_image=query_image))
+    except HTTPException:
+        raise
+    except UnsupportedModalityError as e:
+        raise HTTPException(status_code=501, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Image search failed: {str(e)}")
 
@@ -215,7 +375,8 @@ async def image_search(
 @router.post("/search/multimodal", response_model=ProductSearchResponse)
 async def multimodal_search(
     search_request: MultiModalSearchRequest,
-    product_service: ProductService = Depends(get_product_service)
+    product_service: ProductService = Depends(get_product_service),
+    file_service: FileService = Depends(get_file_service)
 ) -> ProductSearchResponse:
     """
     Multi-modal search combining text and image queries.
@@ -228,23 +389,65 @@ async def multimodal_search(
     - **limit**: Maximum number of results (optional, default: 10)
     - **weight_text**: Weight for text similarity (0-1, default: 0.5)
     - **weight_image**: Weight for image similarity (0-1, default: 0.5)
+    - **mmr_lambda**: Relevance/diversity trade-off for reranking (optional, 1.0 disables)
+    - **mmr_pool_size**: Candidates considered by reranking (optional)
     """
     try:
-
+        query_image = file_service.load_base64_image(search_request.image_query) if search_request.image_query else None
         
         product_search_request = ProductSearchRequest(
             query=search_request.text_query,
-            image_query=search_request.image_query,
             category=search_request.category,
             max_price=search_request.max_price,
             min_price=search_request.min_price,
-            limit=search_request.limit
+            limit=search_request.limit,
+            mmr_lambda=search_request.mmr_lambda,
+            mmr_pool_size=search_request.mmr_pool_size
         )
-        return await product_service.search_products(product_search_request)
+        return FastJSONResponse(await product_service.search_products(product_search_request, query_image=query_image))
+    except HTTPException:
+        raise
+    except UnsupportedModalityError as e:
+        raise HTTPException(status_code=501, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Multi-modal search failed: {str(e)}")
 
 
+@router.post("/search/batch", response_model=BatchSearchResponse)
+async def batch_search(
+    batch_request: BatchSearchRequest,
+    product_service: ProductService = Depends(get_product_service),
+    file_service: FileService = Depends(get_file_service)
+) -> BatchSearchResponse:
+    """
+    Run many searches in one call.
+    
+    All text queries are embedded in one forward pass, all images in another, and every
+    query embedding is sent to the vector store in a single query. Meant for offline jobs
+    such as feed enrichment and evaluation.
+    
+    - **queries**: List of searches, each with a `query`, a base64 `image` or both, plus
+      the per-query `category`, `max_price`, `min_price`, `limit`, `mmr_lambda` and
+      `mmr_pool_size` of the single-search endpoints
+    
+    Returns one result per query, in request order.
+    """
+    if len(batch_request.queries) > settings.SEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"{len(batch_request.queries)} queries exceeds the maximum of {settings.SEARCH_BATCH_MAX_QUERIES} per batch"
+        )
+    try:
+        query_images = [file_service.load_base64_image(search.image) if search.image else None for search in batch_request.queries]
+        return FastJSONResponse(await product_service.search_products_batch(batch_request, query_images))
+    except HTTPException:
+        raise
+    except UnsupportedModalityError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch search failed: {str(e)}")
+
+
 @router.post("/reset", tags=["admin"])
 async def reset_vector_store(
     product_service: ProductService = Depends(get_product_service)
@@ -295,4 +498,22 @@ async def get_vector_store_stats(
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get stats: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to get stats: {str(e)}") 
+
+@router.get("/migration/status", tags=["admin"])
+async def get_migration_status() -> dict:
+    """
+    Get the active collection and the progress of re-embedding migrations.
+
+    Migrations run as a separate job (`python -m app.rag.migration start --model ...`);
+    this endpoint reports the serving collection, its embedding model and each
+    migration's status, processed count, throughput and ETA.
+    """
+    try:
+        return {
+            "active": read_active_collection(settings.CHROMA_PERSIST_DIR),
+            "migrations": list_migrations(settings.CHROMA_PERSIST_DIR),
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get migration status: {str(e)}")
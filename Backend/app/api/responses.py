@@ -0,0 +1,198 @@
+import asyncio
+import gzip
+import json
+from datetime import date, datetime
+from typing import Any, Optional
+
+import pydantic_core
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Content types worth compressing; images and other binary formats are already compressed
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+# Bodies larger than this are compressed in a worker thread instead of on the event loop
+COMPRESS_IN_THREAD_BYTES = 64 * 1024
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _holds_models(content: Any) -> bool:
+    if isinstance(content, BaseModel):
+        return True
+    return isinstance(content, (list, tuple)) and bool(content) and isinstance(content[0], BaseModel)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response that accepts Pydantic models as they are
+
+    Returning one from a route skips FastAPI's response_model pass, which
+    re-validates the value and (before FastAPI 0.115) encodes it twice, through
+    jsonable_encoder and json.dumps. Only return models the service layer has
+    already built; the route's response_model then only documents the endpoint.
+
+    Models are written straight to JSON by pydantic-core, about twice as fast
+    as dumping them to dicts for orjson. Other content uses orjson when it is
+    installed and json.dumps otherwise.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if _holds_models(content):
+            return pydantic_core.to_json(content)
+        if orjson is not None:
+            return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _opaque_tag(etag: str) -> str:
+    etag = etag.strip()
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match lists ``etag``, compared weakly as RFC 9110 requires"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return _opaque_tag(etag) in {_opaque_tag(tag) for tag in header.split(",")}
+
+
+def _cache_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": settings.CATALOG_CACHE_CONTROL}
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """A 304 response when the client already holds ``etag``, else None"""
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=_cache_headers(etag))
+    return None
+
+
+def with_etag(response: Response, etag: str) -> Response:
+    response.headers.update(_cache_headers(etag))
+    return response
+
+
+def catalog_etag(catalog_version: dict) -> str:
+    """Weak ETag for responses computed from the whole catalog
+
+    Weak because the compression middleware serves the same tag for each encoding.
+    """
+    return f'W/"catalog-{catalog_version["catalog_id"]}-{catalog_version["version"]}"'
+
+
+def product_etag(product: BaseModel) -> str:
+    return f'W/"product-{product.id}-{int(product.updated_at.timestamp() * 1_000_000)}"'
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Preferred encoding the client accepts: brotli (when installed) or gzip, by q-value"""
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for coding in (("br",) if brotli is not None else ()) + ("gzip",):
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.RESPONSE_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.RESPONSE_GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """Compress responses with brotli or gzip as negotiated by Accept-Encoding
+
+    Only single-message bodies of a compressible type and at least
+    RESPONSE_COMPRESSION_MIN_SIZE bytes are compressed; streamed responses
+    such as uploaded images pass through untouched.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: Optional[int] = None):
+        self.app = app
+        self.minimum_size = settings.RESPONSE_COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                # Hold the headers until the body shows whether to compress
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            content_type = headers.get("content-type", "")
+            if (
+                message.get("more_body")
+                or "content-encoding" in headers
+                or len(body) < self.minimum_size
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                await send(start)
+                start = None
+                await send(message)
+                return
+
+            if len(body) > COMPRESS_IN_THREAD_BYTES:
+                body = await asyncio.to_thread(compress, body, encoding)
+            else:
+                body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            start = None
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
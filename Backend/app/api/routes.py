@@ -1,12 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
+from datetime import datetime
 from typing import List, Optional, Annotated
 from fastapi import Form
 from PIL import Image
 import io
+import math
 
-from app.models import ChatRequest, ChatResponse, ThreadInfo, ThreadHistory
+from app.agent.llm_scheduler import LLMOverloadedError
+from app.models import ChatRequest, ChatResponse, ThreadList, ThreadHistory
 from app.services.chat_service import ChatService
 from app.services.service_manager import get_chat_service
+from app.tracing import recorder
 # Create router
 router = APIRouter(prefix="/api/v1", tags=["chat"])
 
@@ -26,22 +30,30 @@ async def chat(
 
     try:
         return await chat_service.process_chat(request)
+    except LLMOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat processing failed: {str(e)}")
 
 
-@router.get("/threads", response_model=List[ThreadInfo])
+@router.get("/threads", response_model=ThreadList)
 async def list_threads(
     user_id: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of threads to return"),
+    cursor: Optional[str] = Query(None, description="next_cursor of a previous page"),
     chat_service: ChatService = Depends(get_chat_service)
-) -> List[ThreadInfo]:
+) -> ThreadList:
     """
-    List all conversation threads.
+    List conversation threads, most recently updated first.
     
     - **user_id**: Optional filter by user ID
+    - **limit**: Page size
+    - **cursor**: Continue from a previous page
     """
     try:
-        return await chat_service.list_threads(user_id)
+        return await chat_service.list_threads(user_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list threads: {str(e)}")
 
@@ -49,15 +61,25 @@ async def list_threads(
 @router.get("/threads/{thread_id}/history", response_model=ThreadHistory)
 async def get_thread_history(
     thread_id: str,
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of messages to return"),
+    cursor: Optional[str] = Query(None, description="next_cursor of a previous page, to fetch older messages"),
+    after_message_id: Optional[str] = Query(None, description="Return only messages newer than this one"),
     chat_service: ChatService = Depends(get_chat_service)
 ) -> ThreadHistory:
     """
-    Get conversation history for a specific thread.
+    Get conversation history for a specific thread, a page at a time.
     
     - **thread_id**: The thread identifier
+    - **limit**: Page size; without a cursor the newest messages are returned
+    - **cursor**: Continue into older messages
+    - **after_message_id**: Fetch only the messages after the last one the client has
     """
     try:
-        return await chat_service.get_thread_history(thread_id)
+        return await chat_service.get_thread_history(
+            thread_id, limit=limit, cursor=cursor, after_message_id=after_message_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get thread history: {str(e)}")
 
@@ -84,6 +106,21 @@ async def delete_thread(
         raise HTTPException(status_code=500, detail=f"Failed to delete thread: {str(e)}")
 
 
+@router.get("/admin/traces/slow", tags=["admin"])
+async def get_slow_traces(
+    limit: int = Query(10, ge=1, le=100, description="Maximum number of traces to return")
+) -> dict:
+    """
+    Get the slowest recently sampled request traces.
+    
+    - **limit**: Maximum number of traces to return (default: 10, max: 100)
+    """
+    return {
+        "traces": recorder.slowest(limit),
+        "timestamp": datetime.now().isoformat()
+    }
+
+
 @router.get("/health")
 async def health_check() -> dict:
     """Health check endpoint"""
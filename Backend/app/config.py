@@ -16,6 +16,31 @@ class Settings:
     MAX_TOKENS: int = int(os.getenv("MAX_TOKENS", "1000"))
     TEMPERATURE: float = float(os.getenv("TEMPERATURE", "0.7"))
     SAFETY_SETTINGS: str = os.getenv("SAFETY_SETTINGS", "BLOCK_MEDIUM_AND_ABOVE")
+    # "gemini" or "stub"; the stub replaces Gemini and Tavily for offline load testing
+    LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "gemini").lower()
+    STUB_LLM_LATENCY_MS: float = float(os.getenv("STUB_LLM_LATENCY_MS", "500"))
+    STUB_WEB_SEARCH_LATENCY_MS: float = float(os.getenv("STUB_WEB_SEARCH_LATENCY_MS", "300"))
+    # LLM call scheduling; a per-minute limit of 0 disables it
+    LLM_REQUESTS_PER_MINUTE: float = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "300"))
+    LLM_TOKENS_PER_MINUTE: float = float(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000"))
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    LLM_QUEUE_SIZE: int = int(os.getenv("LLM_QUEUE_SIZE", "256"))
+    # Longest an LLM call may wait for admission before it is shed
+    LLM_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10"))
+    # Output tokens assumed per call until the provider reports actual usage
+    LLM_OUTPUT_TOKEN_ESTIMATE: int = int(os.getenv("LLM_OUTPUT_TOKEN_ESTIMATE", "400"))
+    # Time budget for one chat request, shared by every call it makes
+    CHAT_REQUEST_TIMEOUT_SECONDS: float = float(os.getenv("CHAT_REQUEST_TIMEOUT_SECONDS", "30"))
+    # Upper bounds for single external calls within that budget
+    INTENT_TIMEOUT_SECONDS: float = float(os.getenv("INTENT_TIMEOUT_SECONDS", "8"))
+    LLM_TIMEOUT_SECONDS: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))
+    WEB_SEARCH_TIMEOUT_SECONDS: float = float(os.getenv("WEB_SEARCH_TIMEOUT_SECONDS", "8"))
+    VECTOR_SEARCH_TIMEOUT_SECONDS: float = float(os.getenv("VECTOR_SEARCH_TIMEOUT_SECONDS", "5"))
+    # Send a second copy of a slow external call after the recent HEDGE_PERCENTILE latency
+    HEDGE_REQUESTS: bool = os.getenv("HEDGE_REQUESTS", "False").lower() == "true"
+    HEDGE_PERCENTILE: float = float(os.getenv("HEDGE_PERCENTILE", "95"))
+    HEDGE_MIN_SAMPLES: int = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+    HEDGE_WINDOW: int = int(os.getenv("HEDGE_WINDOW", "200"))
     
     # Server Configuration
     HOST: str = os.getenv("HOST", "0.0.0.0")
@@ -30,15 +55,94 @@ class Settings:
     MEDIA_UPLOAD_DIR: str = os.getenv("MEDIA_UPLOAD_DIR", "./uploads")
     MAX_FILE_SIZE: int = int(os.getenv("MAX_FILE_SIZE", "10485760"))  # 10MB
     ALLOWED_IMAGE_TYPES: list = ["image/jpeg", "image/png", "image/webp", "image/jpg"]
-    CLIP_MODEL_NAME: str = os.getenv("CLIP_MODEL_NAME", "openai/clip-vit-base-patch32")
+    # Model for new collections; a running store serves the model recorded with its active collection
+    CLIP_MODEL_NAME: str = os.getenv("CLIP_MODEL_NAME", "openai/clip-vit-large-patch14-336")
     CLIP_DEVICE: str = os.getenv("CLIP_DEVICE", "cpu")
+    # Load CLIP from a memory-mapped local weight cache shared across processes
+    CLIP_MMAP_WEIGHTS: bool = os.getenv("CLIP_MMAP_WEIGHTS", "True").lower() == "true"
+    CLIP_WEIGHT_CACHE_DIR: str = os.getenv("CLIP_WEIGHT_CACHE_DIR", "./model_cache")
+    # "both", "text" or "vision": which CLIP towers this replica loads
+    CLIP_MODEL_ROLE: str = os.getenv("CLIP_MODEL_ROLE", "both").lower()
+    # Embedding server used for the modality a specialized replica does not load
+    CLIP_DELEGATE_SOCKET: str = os.getenv("CLIP_DELEGATE_SOCKET", "")
+    # "local" loads CLIP in-process; "server" uses the shared embedding server
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "local").lower()
+    EMBEDDING_SERVER_SOCKET: str = os.getenv("EMBEDDING_SERVER_SOCKET", "/tmp/shopping-agent-embeddings.sock")
+    EMBEDDING_SERVER_TIMEOUT: float = float(os.getenv("EMBEDDING_SERVER_TIMEOUT", "30"))
+    EMBEDDING_SERVER_MAX_BATCH: int = int(os.getenv("EMBEDDING_SERVER_MAX_BATCH", "32"))
+    EMBEDDING_SERVER_BATCH_WAIT_MS: float = float(os.getenv("EMBEDDING_SERVER_BATCH_WAIT_MS", "5"))
+    # Threads decoding image files and payloads in the embedding server
+    EMBEDDING_SERVER_DECODE_WORKERS: int = int(os.getenv("EMBEDDING_SERVER_DECODE_WORKERS", "4"))
+    # SQLite file for the thread registry; empty keeps it in memory like the conversation checkpointer
+    THREAD_REGISTRY_PATH: str = os.getenv("THREAD_REGISTRY_PATH", "")
+    # Threads whose message id -> position map is kept for history paging
+    THREAD_HISTORY_INDEX_THREADS: int = int(os.getenv("THREAD_HISTORY_INDEX_THREADS", "1024"))
+    CHROMA_PERSIST_DIR: str = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
+    # "embedded" keeps Chroma in-process under CHROMA_PERSIST_DIR; "http" uses a standalone Chroma server
+    CHROMA_MODE: str = os.getenv("CHROMA_MODE", "embedded").lower()
+    CHROMA_SERVER_HOST: str = os.getenv("CHROMA_SERVER_HOST", "localhost")
+    CHROMA_SERVER_PORT: int = int(os.getenv("CHROMA_SERVER_PORT", "8000"))
+    CHROMA_SERVER_SSL: bool = os.getenv("CHROMA_SERVER_SSL", "False").lower() == "true"
+    CHROMA_HTTP_MAX_CONNECTIONS: int = int(os.getenv("CHROMA_HTTP_MAX_CONNECTIONS", "32"))
+    CHROMA_HTTP_KEEPALIVE_SECONDS: float = float(os.getenv("CHROMA_HTTP_KEEPALIVE_SECONDS", "60"))
+    CHROMA_HTTP_TIMEOUT: float = float(os.getenv("CHROMA_HTTP_TIMEOUT", "10"))
+    CHROMA_HTTP_RETRIES: int = int(os.getenv("CHROMA_HTTP_RETRIES", "2"))
+    CHROMA_HTTP_RETRY_BACKOFF_SECONDS: float = float(os.getenv("CHROMA_HTTP_RETRY_BACKOFF_SECONDS", "0.1"))
+    # "chroma" (HNSW) or "numpy" (exact search over a memory-mapped matrix, suited to <~100k vectors)
+    VECTOR_INDEX_BACKEND: str = os.getenv("VECTOR_INDEX_BACKEND", "chroma").lower()
+    # "none", "category" (one shard per product category) or "hash" (VECTOR_INDEX_HASH_SHARDS buckets by product id)
+    VECTOR_INDEX_SHARDING: str = os.getenv("VECTOR_INDEX_SHARDING", "none").lower()
+    VECTOR_INDEX_HASH_SHARDS: int = int(os.getenv("VECTOR_INDEX_HASH_SHARDS", "8"))
+    # Threads querying shards in parallel, shared by all sharded indexes in a process
+    VECTOR_INDEX_FANOUT_WORKERS: int = int(os.getenv("VECTOR_INDEX_FANOUT_WORKERS", "8"))
+    # Fraction of tombstoned rows at which the numpy index rewrites its files
+    NUMPY_INDEX_COMPACT_RATIO: float = float(os.getenv("NUMPY_INDEX_COMPACT_RATIO", "0.25"))
+    # Seconds the on-disk size and per-modality counts reported by /stats may be stale; they are re-measured in the background
+    VECTOR_STATS_SIZE_TTL_SECONDS: float = float(os.getenv("VECTOR_STATS_SIZE_TTL_SECONDS", "300"))
+    # "float32", "float16" or "int8"; PCA and int8 use the compressor fitted by app.rag.compression
+    EMBEDDING_COMPRESSION_DTYPE: str = os.getenv("EMBEDDING_COMPRESSION_DTYPE", "float32").lower()
+    EMBEDDING_COMPRESSION_PATH: str = os.getenv("EMBEDDING_COMPRESSION_PATH", "")
+    # Query images are decoded at reduced scale when the codec supports it (JPEG)
+    QUERY_IMAGE_DRAFT_SIZE: int = int(os.getenv("QUERY_IMAGE_DRAFT_SIZE", "672"))
+
+    # Request tracing and profiling
+    TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+    TRACE_FILE: str = os.getenv("TRACE_FILE", "./traces/traces.jsonl")
+    TRACE_RECENT_LIMIT: int = int(os.getenv("TRACE_RECENT_LIMIT", "500"))
+    TRACE_PROFILE: bool = os.getenv("TRACE_PROFILE", "False").lower() == "true"
+    TRACE_PROFILE_THRESHOLD_MS: float = float(os.getenv("TRACE_PROFILE_THRESHOLD_MS", "2000"))
+    TRACE_PROFILE_DIR: str = os.getenv("TRACE_PROFILE_DIR", "./traces/profiles")
 
     AGENT_SIMILARITY_DISTANCE: float = float(os.getenv("AGENT_SIMILARITY_DISTANCE", "0.2"))
+    # Maximal Marginal Relevance defaults for search: 1.0 disables diversification
+    SEARCH_MMR_LAMBDA: float = float(os.getenv("SEARCH_MMR_LAMBDA", "0.7"))
+    SEARCH_MMR_POOL_SIZE: int = int(os.getenv("SEARCH_MMR_POOL_SIZE", "20"))
+    # Most queries accepted by POST /api/v1/products/search/batch
+    SEARCH_BATCH_MAX_QUERIES: int = int(os.getenv("SEARCH_BATCH_MAX_QUERIES", "256"))
+    # Responses of a compressible type at least this large are gzip/brotli encoded when the client accepts it
+    RESPONSE_COMPRESSION: bool = os.getenv("RESPONSE_COMPRESSION", "True").lower() == "true"
+    RESPONSE_COMPRESSION_MIN_SIZE: int = int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", "1024"))
+    RESPONSE_GZIP_LEVEL: int = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+    # Brotli's top qualities are meant for static assets; at 5 it beats gzip -6 on size at similar speed
+    RESPONSE_BROTLI_QUALITY: int = int(os.getenv("RESPONSE_BROTLI_QUALITY", "5"))
+    # Cache-Control sent with ETag-tagged catalog responses; "no-cache" lets clients and CDNs store them but revalidate each use
+    CATALOG_CACHE_CONTROL: str = os.getenv("CATALOG_CACHE_CONTROL", "no-cache")
+
+    # Blue/green re-embedding migrations
+    ACTIVE_COLLECTION_CHECK_SECONDS: float = float(os.getenv("ACTIVE_COLLECTION_CHECK_SECONDS", "5"))
+    MIGRATION_BATCH_SIZE: int = int(os.getenv("MIGRATION_BATCH_SIZE", "64"))
+
+    # Background product creation (POST /api/v1/products/jobs)
+    PRODUCT_JOB_QUEUE_SIZE: int = int(os.getenv("PRODUCT_JOB_QUEUE_SIZE", "100"))
+    PRODUCT_JOB_WORKERS: int = int(os.getenv("PRODUCT_JOB_WORKERS", "1"))
+    PRODUCT_JOB_BATCH_SIZE: int = int(os.getenv("PRODUCT_JOB_BATCH_SIZE", "8"))
+    # Finished jobs stay queryable for this long
+    PRODUCT_JOB_RETENTION_SECONDS: float = float(os.getenv("PRODUCT_JOB_RETENTION_SECONDS", "3600"))
     
     # Validation
     def validate(self) -> None:
         """Validate required settings"""
-        if not self.GOOGLE_API_KEY:
+        if not self.GOOGLE_API_KEY and self.LLM_PROVIDER != "stub":
             raise ValueError("GOOGLE_API_KEY is required")
         
         # Create media upload directory if it doesn't exist
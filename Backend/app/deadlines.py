@@ -0,0 +1,149 @@
+import asyncio
+import contextlib
+import contextvars
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, TypeVar
+
+from app.config import settings
+from app.metrics import EXTERNAL_CALL_TIMEOUTS, HEDGED_CALLS
+
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Raised when an external call runs out of its timeout or of the request's budget"""
+
+
+class Deadline:
+    """Point in time (time.monotonic) by which a request must be answered"""
+
+    def __init__(self, expires_at: Optional[float] = None):
+        self.expires_at = expires_at
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.monotonic()
+
+    def timeout(self, cap: float) -> float:
+        """Timeout for the next call: ``cap``, shortened to whatever budget is left"""
+        remaining = self.remaining()
+        return cap if remaining is None else min(cap, remaining)
+
+
+_current_deadline: contextvars.ContextVar[Deadline] = contextvars.ContextVar("current_deadline", default=Deadline())
+
+
+def current_deadline() -> Deadline:
+    return _current_deadline.get()
+
+
+@contextlib.contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[Deadline]:
+    """Give the enclosed work, including tasks it spawns, ``seconds`` to finish
+
+    A scope nested in another never extends the outer deadline.
+    """
+    outer = _current_deadline.get()
+    expires_at = time.monotonic() + seconds if seconds else None
+    if outer.expires_at is not None:
+        expires_at = outer.expires_at if expires_at is None else min(expires_at, outer.expires_at)
+    deadline = Deadline(expires_at)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+class LatencyWindow:
+    """Recent latencies of one kind of call, used to pick the hedging delay"""
+
+    def __init__(self, size: int):
+        self._lock = threading.Lock()
+        self._samples: deque = deque(maxlen=size)
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < settings.HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(int(len(ordered) * q / 100), len(ordered) - 1)]
+
+
+_latencies: Dict[str, LatencyWindow] = {}
+
+
+def _latency(name: str) -> LatencyWindow:
+    window = _latencies.get(name)
+    if window is None:
+        window = _latencies.setdefault(name, LatencyWindow(settings.HEDGE_WINDOW))
+    return window
+
+
+async def _hedged(name: str, call: Callable[[], Awaitable[T]], delay: float) -> T:
+    """Run ``call``, starting a second copy if the first is still running after ``delay``
+
+    The first copy to succeed wins and the other is cancelled.
+    """
+    primary = asyncio.ensure_future(call())
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done:
+        return primary.result()
+
+    hedge = asyncio.ensure_future(call())
+    pending = {primary, hedge}
+    try:
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    HEDGED_CALLS.labels(call=name, winner="hedge" if task is hedge else "primary").inc()
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in (primary, hedge):
+            task.cancel()
+
+
+async def call_with_deadline(
+    name: str,
+    call: Callable[[], Awaitable[T]],
+    cap: float,
+    hedge: bool = False
+) -> T:
+    """Await ``call()`` within ``cap`` seconds and the current request's remaining budget
+
+    With ``hedge``, a duplicate call is started once the first has run longer
+    than the recent HEDGE_PERCENTILE latency of calls named ``name``. Raises
+    DeadlineExceeded on timeout.
+    """
+    timeout = current_deadline().timeout(cap)
+    if timeout <= 0:
+        EXTERNAL_CALL_TIMEOUTS.labels(call=name).inc()
+        raise DeadlineExceeded(f"No time left in the request budget for {name}")
+
+    window = _latency(name)
+    delay = window.percentile(settings.HEDGE_PERCENTILE) if hedge else None
+    started = time.monotonic()
+    try:
+        if delay is not None and delay < timeout:
+            result = await asyncio.wait_for(_hedged(name, call, delay), timeout)
+        else:
+            result = await asyncio.wait_for(call(), timeout)
+    except asyncio.TimeoutError:
+        # A timed-out call still tells the window how slow the upstream is
+        window.observe(time.monotonic() - started)
+        EXTERNAL_CALL_TIMEOUTS.labels(call=name).inc()
+        raise DeadlineExceeded(f"{name} did not finish within {timeout:.1f}s") from None
+    window.observe(time.monotonic() - started)
+    return result
@@ -0,0 +1,113 @@
+import functools
+import inspect
+from typing import Any, Callable, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+
+# Latency buckets spanning fast index lookups to slow LLM generations (seconds)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+GRAPH_NODE_SECONDS = Histogram(
+    "chatbot_graph_node_seconds", "Time spent in each LangGraph node", ["node"], buckets=LATENCY_BUCKETS
+)
+EMBEDDING_SECONDS = Histogram(
+    "chatbot_embedding_seconds", "CLIP embedding time by modality", ["modality"], buckets=LATENCY_BUCKETS
+)
+VECTOR_DB_SECONDS = Histogram(
+    "chatbot_vector_db_seconds", "Chroma operation time", ["operation"], buckets=LATENCY_BUCKETS
+)
+RERANK_SECONDS = Histogram(
+    "chatbot_rerank_seconds", "Search result reranking time by method", ["method"], buckets=LATENCY_BUCKETS
+)
+IMAGE_SECONDS = Histogram(
+    "chatbot_image_seconds", "Image decode and save time", ["operation"], buckets=LATENCY_BUCKETS
+)
+LLM_CALL_SECONDS = Histogram(
+    "chatbot_llm_call_seconds", "LLM call time by purpose", ["call"], buckets=LATENCY_BUCKETS
+)
+WEB_SEARCH_SECONDS = Histogram(
+    "chatbot_web_search_seconds", "Web search tool call time", buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS = Counter(
+    "chatbot_llm_tokens", "LLM tokens consumed by purpose and direction", ["call", "direction"]
+)
+CACHE_EVENTS = Counter(
+    "chatbot_cache_events", "Cache lookups by cache and result", ["cache", "result"]
+)
+INTENT_ROUTES = Counter(
+    "chatbot_intent_routes", "Chat messages routed per intent", ["intent"]
+)
+LLM_SCHEDULER_WAIT_SECONDS = Histogram(
+    "chatbot_llm_scheduler_wait_seconds", "Time LLM calls waited for admission by call class", ["call_class"], buckets=LATENCY_BUCKETS
+)
+LLM_SCHEDULER_EVENTS = Counter(
+    "chatbot_llm_scheduler_events", "LLM calls admitted or shed by call class", ["call_class", "result"]
+)
+LLM_SCHEDULER_QUEUE_DEPTH = Gauge(
+    "chatbot_llm_scheduler_queue_depth", "LLM calls waiting for admission"
+)
+EXTERNAL_CALL_TIMEOUTS = Counter(
+    "chatbot_external_call_timeouts", "External calls abandoned at their timeout or the request deadline", ["call"]
+)
+HEDGED_CALLS = Counter(
+    "chatbot_hedged_calls", "Hedged external calls by which copy answered first", ["call", "winner"]
+)
+RESPONSE_FALLBACKS = Counter(
+    "chatbot_response_fallbacks", "Chat responses built without the LLM because a call timed out", ["node"]
+)
+SEARCH_FLIGHTS = Counter(
+    "chatbot_search_flights", "Product searches that ran (leader) or joined an identical in-flight search (coalesced)", ["result"]
+)
+PRODUCT_JOBS = Counter(
+    "chatbot_product_jobs", "Background product jobs by outcome", ["status"]
+)
+PRODUCT_JOB_SECONDS = Histogram(
+    "chatbot_product_job_seconds", "Background product job time queued and processing", ["stage"], buckets=LATENCY_BUCKETS
+)
+PRODUCT_JOB_QUEUE_DEPTH = Gauge(
+    "chatbot_product_job_queue_depth", "Product jobs waiting for a worker"
+)
+ERRORS = Counter(
+    "chatbot_errors", "Errors by stage", ["stage"]
+)
+
+
+def timed(histogram: Any, error_stage: Optional[str] = None) -> Callable:
+    """Decorator timing a sync or async callable with a histogram (or labelled child)
+
+    When ``error_stage`` is given, exceptions are also counted in ``ERRORS``.
+    """
+    def decorator(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with histogram.time():
+                    try:
+                        return await fn(*args, **kwargs)
+                    except Exception:
+                        if error_stage:
+                            ERRORS.labels(stage=error_stage).inc()
+                        raise
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with histogram.time():
+                try:
+                    return fn(*args, **kwargs)
+                except Exception:
+                    if error_stage:
+                        ERRORS.labels(stage=error_stage).inc()
+                    raise
+        return wrapper
+    return decorator
+
+
+def record_llm_usage(call: str, message: Any) -> None:
+    """Count input/output tokens from a LangChain message's usage metadata, if present"""
+    usage = getattr(message, "usage_metadata", None) or {}
+    if usage.get("input_tokens"):
+        LLM_TOKENS.labels(call=call, direction="input").inc(usage["input_tokens"])
+    if usage.get("output_tokens"):
+        LLM_TOKENS.labels(call=call, direction="output").inc(usage["output_tokens"])
@@ -7,6 +7,7 @@ from PIL import Image, ImageFile
 
 class ChatMessage(BaseModel):
     """Individual chat message model"""
+    id: Optional[str] = Field(None, description="Message identifier")
     role: str = Field(..., description="Role of the message sender (user/assistant)")
     content: str = Field(..., description="Content of the message")
     timestamp: Optional[datetime] = Field(default_factory=datetime.now)
@@ -38,11 +39,19 @@ class ThreadInfo(BaseModel):
     message_count: int = Field(default=0, description="Number of messages in thread")
 
 
+class ThreadList(BaseModel):
+    """Page of threads, most recently updated first"""
+    threads: List[ThreadInfo] = Field(default_factory=list, description="Threads in this page")
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page of older threads")
+
+
 class ThreadHistory(BaseModel):
     """Thread history model"""
     thread_id: str = Field(..., description="Thread identifier")
     messages: List[ChatMessage] = Field(default_factory=list, description="List of messages in thread")
     metadata: Optional[Dict[str, Any]] = Field(default_factory=dict, description="Thread metadata")
+    has_more: bool = Field(False, description="Whether messages remain beyond this page in the direction requested")
+    next_cursor: Optional[str] = Field(None, description="Cursor for the page of older messages")
 
 
 class ProductImage(BaseModel):
@@ -109,6 +118,21 @@ class ProductSearchRequest(BaseModel):
     max_price: Optional[float] = Field(None, description="Maximum price filter")
     min_price: Optional[float] = Field(None, description="Minimum price filter")
     limit: Optional[int] = Field(10, description="Maximum number of results")
+    mmr_lambda: Optional[float] = Field(None, ge=0.0, le=1.0, description="MMR trade-off between relevance (1.0) and diversity (0.0)")
+    mmr_pool_size: Optional[int] = Field(None, ge=1, le=200, description="Candidates considered by MMR reranking")
+
+
+class ProductJobResponse(BaseModel):
+    """Response model for a background product creation job"""
+    job_id: str = Field(..., description="Job identifier")
+    status: str = Field(..., description="queued, running, done or failed")
+    product_id: str = Field(..., description="Identifier the product will have once indexed")
+    queue_position: Optional[int] = Field(None, description="Jobs ahead of this one while queued")
+    images: int = Field(0, description="Number of images to embed")
+    error: Optional[str] = Field(None, description="Failure reason")
+    created_at: datetime = Field(..., description="Submission timestamp")
+    started_at: Optional[datetime] = Field(None, description="Processing start timestamp")
+    finished_at: Optional[datetime] = Field(None, description="Completion timestamp")
 
 
 class ProductSearchResponse(BaseModel):
@@ -125,6 +149,8 @@ class ImageSearchRequest(BaseModel):
     max_price: Optional[float] = Field(None, description="Maximum price filter")
     min_price: Optional[float] = Field(None, description="Minimum price filter")
     limit: Optional[int] = Field(10, description="Maximum number of results")
+    mmr_lambda: Optional[float] = Field(None, ge=0.0, le=1.0, description="MMR trade-off between relevance (1.0) and diversity (0.0)")
+    mmr_pool_size: Optional[int] = Field(None, ge=1, le=200, description="Candidates considered by MMR reranking")
 
 
 class MultiModalSearchRequest(BaseModel):
@@ -136,4 +162,28 @@ class MultiModalSearchRequest(BaseModel):
     min_price: Optional[float] = Field(None, description="Minimum price filter")
     limit: Optional[int] = Field(10, description="Maximum number of results")
     weight_text: float = Field(0.5, description="Weight for text similarity (0-1)")
-    weight_image: float = Field(0.5, description="Weight for image similarity (0-1)") 
\ No newline at end of file
+    weight_image: float = Field(0.5, description="Weight for image similarity (0-1)")
+    mmr_lambda: Optional[float] = Field(None, ge=0.0, le=1.0, description="MMR trade-off between relevance (1.0) and diversity (0.0)")
+    mmr_pool_size: Optional[int] = Field(None, ge=1, le=200, description="Candidates considered by MMR reranking")
+
+
+class BatchSearchQuery(BaseModel):
+    """One query of a batch search"""
+    query: Optional[str] = Field(None, description="Text search query")
+    image: Optional[str] = Field(None, description="Base64 encoded image")
+    category: Optional[str] = Field(None, description="Filter by category")
+    max_price: Optional[float] = Field(None, description="Maximum price filter")
+    min_price: Optional[float] = Field(None, description="Minimum price filter")
+    limit: Optional[int] = Field(10, ge=1, le=100, description="Maximum number of results")
+    mmr_lambda: Optional[float] = Field(None, ge=0.0, le=1.0, description="MMR trade-off between relevance (1.0) and diversity (0.0)")
+    mmr_pool_size: Optional[int] = Field(None, ge=1, le=200, description="Candidates considered by MMR reranking")
+
+
+class BatchSearchRequest(BaseModel):
+    """Request model for searching many queries in one call"""
+    queries: List[BatchSearchQuery] = Field(..., min_length=1, description="Queries, each with a text query, an image or both")
+
+
+class BatchSearchResponse(BaseModel):
+    """Response model for batch search, one result per query in request order"""
+    results: List[ProductSearchResponse] = Field(..., description="Search results per query")
@@ -0,0 +1,83 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.rag.catalog_version import bump_catalog_version
+
+
+BASE_COLLECTION_NAME = "products_multimodal"
+ACTIVE_COLLECTION_FILE = "active_collection.json"
+# The model the unversioned collection was always embedded with, whatever CLIP_MODEL_NAME said
+LEGACY_MODEL_ID = "openai/clip-vit-large-patch14-336"
+
+
+def active_collection_path(persist_directory: str) -> Path:
+    return Path(persist_directory) / ACTIVE_COLLECTION_FILE
+
+
+def read_active_collection(persist_directory: str) -> Dict[str, Any]:
+    """The collection serving traffic and the embedding model that produced it
+
+    Stores created before versioned collections have no pointer file; they
+    serve the unversioned collection, which was always embedded with
+    LEGACY_MODEL_ID. New stores get one from initialize_active_collection.
+    """
+    path = active_collection_path(persist_directory)
+    if not path.exists():
+        return {"collection": BASE_COLLECTION_NAME, "model_id": LEGACY_MODEL_ID, "version": 0}
+    with open(path) as f:
+        return json.load(f)
+
+
+def initialize_active_collection(
+    persist_directory: str,
+    model_id: str,
+    backend: Optional[str] = None,
+    sharding: Optional[str] = None
+) -> Dict[str, Any]:
+    """The active collection, first pointing a store that has no pointer and no embeddings at ``model_id``
+
+    Only a store already holding legacy embeddings keeps serving them with
+    LEGACY_MODEL_ID; an empty one starts on the model it is configured with.
+    """
+    if active_collection_path(persist_directory).exists():
+        return read_active_collection(persist_directory)
+    # Imported here so reading the pointer stays free of the index backends
+    from app.rag.compression import compression_label, load_configured_compressor
+    from app.rag.vector_index import create_vector_index
+    base = create_vector_index(
+        persist_directory,
+        BASE_COLLECTION_NAME,
+        {"embedding_compression": compression_label(load_configured_compressor()), "embedding_model": model_id},
+        backend=backend,
+        sharding=sharding
+    )
+    if base.count():
+        return read_active_collection(persist_directory)
+    print(f"📌 New vector store; serving {BASE_COLLECTION_NAME} with {model_id}")
+    return write_active_collection(persist_directory, BASE_COLLECTION_NAME, model_id, 0)
+
+
+def write_active_collection(persist_directory: str, collection: str, model_id: str, version: int) -> Dict[str, Any]:
+    """Point every store at a collection; the rename makes the swap atomic"""
+    path = active_collection_path(persist_directory)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    active = {
+        "collection": collection,
+        "model_id": model_id,
+        "version": version,
+        "activated_at": datetime.now().isoformat(),
+    }
+    tmp_path = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+    with open(tmp_path, "w") as f:
+        json.dump(active, f, indent=2)
+    os.replace(tmp_path, path)
+    # Results now come from another collection, so cached listings are stale
+    bump_catalog_version(persist_directory)
+    return active
+
+
+def versioned_collection_name(version: int) -> str:
+    return f"{BASE_COLLECTION_NAME}_v{version}"
@@ -0,0 +1,76 @@
+import fcntl
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, Tuple
+
+
+CATALOG_VERSION_FILE = "catalog_version.json"
+
+_cache_lock = threading.Lock()
+# Last version read per file, keyed by the file's inode and mtime; every write replaces the inode
+_cache: Dict[Path, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+
+
+def catalog_version_path(persist_directory: str) -> Path:
+    return Path(persist_directory) / CATALOG_VERSION_FILE
+
+
+@contextmanager
+def _locked(path: Path) -> Iterator[None]:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_suffix(".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def _write(path: Path, state: Dict[str, Any]) -> None:
+    tmp_path = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def read_catalog_version(persist_directory: str) -> Dict[str, Any]:
+    """Current catalog id and version, shared by every process using the persist directory
+
+    The catalog id is random and created with the file, so a wiped and
+    rebuilt store never repeats an earlier (id, version) pair. Reads cost one
+    stat while the file is unchanged.
+    """
+    path = catalog_version_path(persist_directory)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        with _locked(path):
+            if not path.exists():
+                _write(path, {"catalog_id": uuid.uuid4().hex[:12], "version": 0, "updated_at": datetime.now().isoformat()})
+        stat = path.stat()
+
+    key = (stat.st_ino, stat.st_mtime_ns)
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+    with open(path) as f:
+        state = json.load(f)
+    with _cache_lock:
+        _cache[path] = (key, state)
+    return state
+
+
+def bump_catalog_version(persist_directory: str) -> int:
+    """Advance the catalog version after any change to the products served; returns the new version"""
+    path = catalog_version_path(persist_directory)
+    read_catalog_version(persist_directory)
+    with _locked(path):
+        with open(path) as f:
+            state = json.load(f)
+        state["version"] += 1
+        state["updated_at"] = datetime.now().isoformat()
+        _write(path, state)
+    return state["version"]
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Embedding compression: PCA projection and reduced-precision quantization
+
+Run from the Backend directory:
+    python -m app.rag.compression evaluate --k 10 --pca-dims 128,256,384
+    python -m app.rag.compression fit --pca-dim 256 --dtype int8 --apply
+"""
+
+import argparse
+import json
+import os
+import numpy as np
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.config import settings
+
+
+DTYPES = ("float32", "float16", "int8")
+BYTES_PER_VALUE = {"float32": 4, "float16": 2, "int8": 1}
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class EmbeddingCompressor:
+    """Optional PCA projection followed by float16 or int8 scalar quantization
+
+    The same transform is applied to stored and query embeddings. Vectors are
+    L2-normalized before projection and again after, so cosine distances stay
+    meaningful. ``quantize`` returns the compact stored form; ``transform``
+    returns float32 values carrying the same precision loss, for indexes that
+    only accept float32.
+    """
+
+    def __init__(
+        self,
+        dtype: str = "float32",
+        mean: Optional[np.ndarray] = None,
+        components: Optional[np.ndarray] = None,
+        int8_scale: Optional[np.ndarray] = None
+    ):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown embedding dtype {dtype}. Expected one of {DTYPES}")
+        self.dtype = dtype
+        self.mean = mean
+        self.components = components
+        self.int8_scale = int8_scale
+
+    @property
+    def is_identity(self) -> bool:
+        return self.dtype == "float32" and self.components is None
+
+    @property
+    def output_dim(self) -> Optional[int]:
+        return None if self.components is None else self.components.shape[0]
+
+    def describe(self) -> str:
+        projection = f"pca{self.output_dim}" if self.components is not None else "full"
+        return f"{projection}-{self.dtype}"
+
+    def bytes_per_vector(self, input_dim: int, stored_dtype: Optional[str] = None) -> int:
+        """Bytes per stored vector; ``stored_dtype`` is what the index keeps when it cannot store ``dtype``"""
+        return (self.output_dim or input_dim) * BYTES_PER_VALUE[stored_dtype or self.dtype]
+
+    def fit(self, vectors: np.ndarray, pca_dim: Optional[int] = None, max_samples: int = 20000) -> "EmbeddingCompressor":
+        """Fit the PCA projection and int8 scales on a sample of full-precision vectors"""
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        if len(vectors) > max_samples:
+            rng = np.random.default_rng(0)
+            vectors = vectors[rng.choice(len(vectors), max_samples, replace=False)]
+
+        if pca_dim:
+            if pca_dim > min(vectors.shape):
+                raise ValueError(f"PCA dimension {pca_dim} exceeds what {vectors.shape[0]} samples of dim {vectors.shape[1]} support")
+            self.mean = vectors.mean(axis=0)
+            _, _, vt = np.linalg.svd(vectors - self.mean, full_matrices=False)
+            self.components = vt[:pca_dim].astype(np.float32)
+        else:
+            self.mean, self.components = None, None
+
+        if self.dtype == "int8":
+            projected = self._project(vectors)
+            self.int8_scale = (np.abs(projected).max(axis=0) / 127.0).astype(np.float32)
+            self.int8_scale[self.int8_scale == 0] = 1.0
+        return self
+
+    def _project(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32).reshape(-1, np.shape(vectors)[-1]))
+        if self.components is not None:
+            vectors = _normalize((vectors - self.mean) @ self.components.T)
+        return vectors
+
+    def quantize(self, vectors: np.ndarray) -> np.ndarray:
+        """Project and quantize into the compact stored representation"""
+        projected = self._project(vectors)
+        if self.dtype == "float16":
+            return projected.astype(np.float16)
+        if self.dtype == "int8":
+            if self.int8_scale is None:
+                raise ValueError("int8 quantization requires a fitted compressor")
+            return np.clip(np.rint(projected / self.int8_scale), -127, 127).astype(np.int8)
+        return projected
+
+    def dequantize(self, stored: np.ndarray) -> np.ndarray:
+        if self.dtype == "int8":
+            return stored.astype(np.float32) * self.int8_scale
+        return stored.astype(np.float32)
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        """Float32 vectors with the projection and precision loss of the stored form"""
+        return self.dequantize(self.quantize(vectors))
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        arrays = {"dtype": np.array(self.dtype)}
+        for name in ("mean", "components", "int8_scale"):
+            value = getattr(self, name)
+            if value is not None:
+                arrays[name] = value
+        # Workers load this file at startup, so never let them see it half written
+        tmp_path = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "EmbeddingCompressor":
+        with np.load(path) as data:
+            return cls(
+                dtype=str(data["dtype"]),
+                mean=data["mean"] if "mean" in data else None,
+                components=data["components"] if "components" in data else None,
+                int8_scale=data["int8_scale"] if "int8_scale" in data else None
+            )
+
+
+def compression_label(compressor: Optional[EmbeddingCompressor]) -> str:
+    """Label recorded in index metadata for the compression its embeddings use"""
+    return compressor.describe() if compressor else "none"
+
+
+COLLECTION_COMPRESSORS_DIR = "compressors"
+
+
+def compressor_path() -> Path:
+    return Path(settings.EMBEDDING_COMPRESSION_PATH or Path(settings.CHROMA_PERSIST_DIR) / "embedding_compression.npz")
+
+
+def collection_compressor_path(collection: str, persist_directory: Optional[str] = None) -> Path:
+    """Compressor saved with a collection by `fit --apply`; it overrides the configured one for that collection"""
+    return Path(persist_directory or settings.CHROMA_PERSIST_DIR) / COLLECTION_COMPRESSORS_DIR / f"{collection}.npz"
+
+
+def effective_compressor_path(collection: str, persist_directory: Optional[str] = None) -> Path:
+    """The compressor file a collection uses; it may not exist"""
+    path = collection_compressor_path(collection, persist_directory)
+    return path if path.exists() else compressor_path()
+
+
+def load_configured_compressor(
+    collection: Optional[str] = None,
+    persist_directory: Optional[str] = None
+) -> Optional[EmbeddingCompressor]:
+    """Compressor for a collection, or None for full precision
+
+    A collection's own file wins; otherwise the fitted file at
+    EMBEDDING_COMPRESSION_PATH or EMBEDDING_COMPRESSION_DTYPE applies.
+    """
+    path = effective_compressor_path(collection, persist_directory) if collection else compressor_path()
+    if path.exists():
+        compressor = EmbeddingCompressor.load(path)
+    elif settings.EMBEDDING_COMPRESSION_DTYPE in ("float32", "float16"):
+        # float16 needs no fitting; PCA and int8 need `fit` to have been run
+        compressor = EmbeddingCompressor(dtype=settings.EMBEDDING_COMPRESSION_DTYPE)
+    else:
+        raise ValueError(f"{settings.EMBEDDING_COMPRESSION_DTYPE} compression requires a fitted compressor at {path}")
+    return None if compressor.is_identity else compressor
+
+
+def recall_at_k(full: np.ndarray, compressor: EmbeddingCompressor, query_rows: np.ndarray, k: int) -> float:
+    """Mean overlap between exact full-precision and compressed top-k neighbours, excluding self"""
+    full = _normalize(full)
+    stored = compressor.transform(full)
+    queries_full, queries_compressed = full[query_rows], compressor.transform(full[query_rows])
+
+    overlaps = []
+    for start in range(0, len(query_rows), 256):
+        rows = query_rows[start:start + 256]
+        exact = queries_full[start:start + 256] @ full.T
+        approx = queries_compressed[start:start + 256] @ stored.T
+        exact[np.arange(len(rows)), rows] = -np.inf
+        approx[np.arange(len(rows)), rows] = -np.inf
+        exact_top = np.argpartition(-exact, k, axis=1)[:, :k]
+        approx_top = np.argpartition(-approx, k, axis=1)[:, :k]
+        overlaps.extend(len(set(e) & set(a)) / k for e, a in zip(exact_top, approx_top))
+    return float(np.mean(overlaps))
+
+
+def evaluate(
+    embeddings: np.ndarray,
+    k: int,
+    pca_dims: List[int],
+    queries: int,
+    stored_dtypes: Sequence[str] = DTYPES
+) -> List[Dict[str, Any]]:
+    """Recall@k and stored size of each option; ``stored_dtypes`` are the dtypes the index backend stores natively"""
+    rng = np.random.default_rng(1)
+    query_rows = rng.choice(len(embeddings), min(queries, len(embeddings)), replace=False)
+    input_dim = embeddings.shape[1]
+
+    results = []
+    for pca_dim in [None] + pca_dims:
+        for dtype in DTYPES:
+            compressor = EmbeddingCompressor(dtype=dtype).fit(embeddings, pca_dim=pca_dim)
+            stored_dtype = dtype if dtype in stored_dtypes else "float32"
+            stored_bytes = compressor.bytes_per_vector(input_dim, stored_dtype)
+            result = {
+                "config": compressor.describe(),
+                "stored_bytes_per_vector": stored_bytes,
+                "compression_ratio": round(input_dim * 4 / stored_bytes, 2),
+                f"recall@{k}": round(recall_at_k(embeddings, compressor, query_rows, k), 4),
+            }
+            if stored_dtype != dtype:
+                result["note"] = f"{dtype} costs recall but saves no storage on this backend"
+            results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding compression tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    evaluate_parser = subparsers.add_parser("evaluate", help="Measure recall@k loss of compression options on the catalog")
+    evaluate_parser.add_argument("--k", type=int, default=10)
+    evaluate_parser.add_argument("--pca-dims", default="128,256,384", help="Comma-separated PCA dimensions to try")
+    evaluate_parser.add_argument("--queries", type=int, default=500, help="Stored vectors used as queries")
+
+    fit_parser = subparsers.add_parser("fit", help="Fit a compressor on the catalog and re-index with it")
+    fit_parser.add_argument("--pca-dim", type=int, default=0, help="PCA dimension (0 keeps the full dimension)")
+    fit_parser.add_argument("--dtype", choices=DTYPES, default="float16")
+    fit_parser.add_argument("--apply", action="store_true", help="Re-index the stored embeddings and save the compressor")
+    for subparser in (evaluate_parser, fit_parser):
+        subparser.add_argument(
+            "--reembed", action="store_true",
+            help="Recompute full-precision embeddings from the catalog's text and images (required once compressed)"
+        )
+    args = parser.parse_args()
+
+    from app.rag.vector_index import VECTOR_INDEX_BACKENDS
+    from app.rag.vector_store import ProductVectorStore
+    store = ProductVectorStore(load_embedder=False)
+    stored = (store.product_collection.metadata or {}).get("embedding_compression", "none")
+    if stored != "none" and not args.reembed:
+        raise SystemExit(
+            f"❌ The collection is already compressed ({stored}), so its vectors are not full precision and "
+            "no longer match raw query embeddings. Pass --reembed to recompute them from the catalog's text and images"
+        )
+    records = store.get_full_precision_records(reembed=args.reembed)
+    embeddings = records["embeddings"]
+    print(f"Loaded {len(embeddings)} embeddings of dimension {embeddings.shape[1] if len(embeddings) else 0}")
+
+    if args.command == "evaluate":
+        backend = store.index_backend or settings.VECTOR_INDEX_BACKEND
+        pca_dims = [int(d) for d in args.pca_dims.split(",") if d.strip()]
+        pca_dims = [d for d in pca_dims if d < min(embeddings.shape)]
+        print(f"Sizes are what the {backend} backend stores")
+        print(json.dumps(evaluate(embeddings, args.k, pca_dims, args.queries, VECTOR_INDEX_BACKENDS[backend].STORED_DTYPES), indent=2))
+        return
+
+    compressor = EmbeddingCompressor(dtype=args.dtype).fit(embeddings, pca_dim=args.pca_dim or None)
+    if not args.apply:
+        # Saving alone would make every worker apply it to queries against the old vectors
+        print(f"Fitted {compressor.describe()}; nothing was changed. Re-run with --apply to re-index with it")
+        return
+    result = store.reindex_embeddings(compressor, records=records)
+    print(f"✅ Re-indexed {result['count']} embeddings into {result['collection']} with {compressor.describe()}; "
+          f"workers switch to it within {settings.ACTIVE_COLLECTION_CHECK_SECONDS}s. {result['previous']} is kept")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import json
+import os
+import socket
+import struct
+import threading
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+from PIL import Image, ImageFile
+
+from app.config import settings
+
+
+# Wire format: 4-byte big-endian header length, JSON header, then an optional
+# binary payload whose length is given by the header's "payload_bytes".
+HEADER_LENGTH = struct.Struct(">I")
+
+
+class EmbeddingServerError(RuntimeError):
+    """Raised when the embedding server reports an error or cannot be reached"""
+
+
+class UnsupportedModalityError(RuntimeError):
+    """Raised when a replica is asked to embed a modality whose tower it did not load"""
+
+
+def encode_frame(header: Dict[str, Any], payload: bytes = b"") -> bytes:
+    header = {**header, "payload_bytes": len(payload)}
+    header_bytes = json.dumps(header).encode("utf-8")
+    return HEADER_LENGTH.pack(len(header_bytes)) + header_bytes + payload
+
+
+def open_rgb_image(path: str, min_side: Optional[int] = None) -> Image.Image:
+    """Decode an image file to RGB; JPEGs decode at reduced scale while both sides stay at least ``min_side``"""
+    with Image.open(path) as image:
+        if min_side:
+            image.draft("RGB", (min_side, min_side))
+        return image.convert("RGB")
+
+
+def fit_image(image: Image.Image, min_side: Optional[int]) -> Image.Image:
+    """Downscale so the shorter side is ``min_side``, the same bicubic resize the CLIP processor applies first"""
+    if not min_side or min(image.size) <= min_side:
+        return image
+    scale = min_side / min(image.size)
+    size = (max(min_side, round(image.size[0] * scale)), max(min_side, round(image.size[1] * scale)))
+    return image.resize(size, Image.Resampling.BICUBIC)
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if count == 0:
+            raise EmbeddingServerError("Embedding server closed the connection")
+        received += count
+    return bytes(buffer)
+
+
+def recv_frame(sock: socket.socket) -> Tuple[Dict[str, Any], bytes]:
+    (header_length,) = HEADER_LENGTH.unpack(_recv_exactly(sock, HEADER_LENGTH.size))
+    header = json.loads(_recv_exactly(sock, header_length))
+    payload = _recv_exactly(sock, header["payload_bytes"]) if header["payload_bytes"] else b""
+    return header, payload
+
+
+class EmbeddingClient:
+    """Embedder that delegates to a shared embedding server over a Unix socket
+
+    Exposes the same get_text_embedding / get_image_embedding interface as
+    ClipEmbedder, so ProductVectorStore can use it without loading the model
+    in every API worker. Each thread keeps its own persistent connection.
+
+    Image files are sent as paths for the server to decode, since it runs on
+    the same host. In-memory images are downscaled to the model's input size
+    before their raw pixels are sent.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, timeout: Optional[float] = None):
+        self.socket_path = socket_path or settings.EMBEDDING_SERVER_SOCKET
+        self.timeout = timeout if timeout is not None else settings.EMBEDDING_SERVER_TIMEOUT
+        self._local = threading.local()
+        info = self._request({"op": "info"})[0]
+        self.model_id = info["model_id"]
+        # Shorter image side the server's processor resizes to; None for servers without a vision tower
+        self.image_size: Optional[int] = info.get("image_size")
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                sock.close()
+                raise EmbeddingServerError(f"Cannot connect to embedding server at {self.socket_path}: {e}")
+            self._local.sock = sock
+        return sock
+
+    def _reset_connection(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _request(self, header: Dict[str, Any], payload: bytes = b"") -> Tuple[Dict[str, Any], bytes]:
+        frame = encode_frame(header, payload)
+        # Retry once on a stale connection (e.g. after a server restart)
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                sock.sendall(frame)
+                response, response_payload = recv_frame(sock)
+                break
+            except (OSError, EmbeddingServerError):
+                self._reset_connection()
+                if attempt == 1:
+                    raise
+        if "error" in response:
+            if response.get("error_type") == UnsupportedModalityError.__name__:
+                raise UnsupportedModalityError(response["error"])
+            raise EmbeddingServerError(response["error"])
+        return response, response_payload
+
+    def _embeddings(self, header: Dict[str, Any], payload: bytes = b"") -> np.ndarray:
+        response, response_payload = self._request(header, payload)
+        return np.frombuffer(response_payload, dtype=response["dtype"]).reshape(response["shape"])
+
+    def get_text_embeddings(self, texts: List[str]) -> np.ndarray:
+        return self._embeddings({"op": "text", "texts": texts})
+
+    def get_image_embeddings(self, images: List[Image.Image]) -> np.ndarray:
+        # Raw RGB pixels avoid a re-encode on the client and a decode on the server
+        specs, chunks, offset = [], [], 0
+        for image in images:
+            image = fit_image(image.convert("RGB"), self.image_size)
+            data = image.tobytes()
+            specs.append({"size": list(image.size), "offset": offset, "length": len(data)})
+            chunks.append(data)
+            offset += len(data)
+        return self._embeddings({"op": "image", "images": specs}, b"".join(chunks))
+
+    def get_image_embeddings_from_paths(self, image_paths: List[str]) -> np.ndarray:
+        # The server runs on the same host and reads the files itself
+        return self._embeddings({"op": "image", "images": [{"path": os.path.abspath(path)} for path in image_paths]})
+
+    def get_text_embedding(self, text: str) -> np.ndarray:
+        return self.get_text_embeddings([text])[0]
+
+    def get_image_embedding(self, image_path: Optional[str] = '', image: Optional[ImageFile.ImageFile] = None) -> np.ndarray:
+        if image is not None:
+            return self.get_image_embeddings([image])[0]
+        return self.get_image_embeddings_from_paths([image_path])[0]
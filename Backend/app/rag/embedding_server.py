@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Shared embedding server
+A single local process owns the CLIP model and serves batched embedding
+requests to API workers over a Unix socket (see EmbeddingClient).
+
+Run from the Backend directory:
+    python -m app.rag.embedding_server
+Then start API workers with EMBEDDING_BACKEND=server.
+"""
+
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from PIL import Image
+
+from app.config import settings
+from app.rag.embedding_client import encode_frame, fit_image, open_rgb_image, HEADER_LENGTH
+
+
+class _PendingItem:
+    """One text or image awaiting a slot in a batched forward pass"""
+
+    def __init__(self, kind: str, value: Any, future: asyncio.Future):
+        self.kind = kind
+        self.value = value
+        self.future = future
+
+
+class EmbeddingServer:
+    """Serves embedding requests, coalescing concurrent items into batched forward passes"""
+
+    def __init__(self, embedder: Any, socket_path: str, max_batch: int, batch_wait_ms: float):
+        self.embedder = embedder
+        self.socket_path = socket_path
+        self.max_batch = max_batch
+        self.batch_wait_s = batch_wait_ms / 1000.0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        # The model runs on a single thread; batching supplies the parallelism
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-model")
+        # Image decoding runs off the event loop so one large file never stalls other connections
+        self._decode_executor = ThreadPoolExecutor(
+            max_workers=settings.EMBEDDING_SERVER_DECODE_WORKERS, thread_name_prefix="embedding-decode"
+        )
+        self.image_size = getattr(embedder, "image_size", None)
+        self.stats = {"requests": 0, "items": 0, "batches": 0}
+
+    async def serve_forever(self) -> None:
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+        batcher = asyncio.create_task(self._batch_loop())
+        print(f"🧠 Embedding server for {self.embedder.model_id} listening on {self.socket_path}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    async def _read_frame(self, reader: asyncio.StreamReader) -> Tuple[Dict[str, Any], bytes]:
+        (header_length,) = HEADER_LENGTH.unpack(await reader.readexactly(HEADER_LENGTH.size))
+        header = json.loads(await reader.readexactly(header_length))
+        payload = await reader.readexactly(header["payload_bytes"]) if header["payload_bytes"] else b""
+        return header, payload
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    header, payload = await self._read_frame(reader)
+                except asyncio.IncompleteReadError:
+                    break
+
+                try:
+                    response = await self._handle_request(header, payload)
+                except Exception as e:
+                    response = encode_frame({"error": str(e), "error_type": type(e).__name__})
+                writer.write(response)
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def _handle_request(self, header: Dict[str, Any], payload: bytes) -> bytes:
+        op = header.get("op")
+        if op == "info":
+            role = getattr(self.embedder, "role", "both")
+            return encode_frame({
+                "model_id": self.embedder.model_id, "role": role, "image_size": self.image_size, **self.stats
+            })
+
+        if op == "text":
+            items = [("text", text) for text in header["texts"]]
+        elif op == "image":
+            loop = asyncio.get_running_loop()
+            images = await asyncio.gather(*[
+                loop.run_in_executor(self._decode_executor, self._decode_image, spec, payload)
+                for spec in header["images"]
+            ])
+            items = [("image", image) for image in images]
+        else:
+            raise ValueError(f"Unknown op {op}")
+
+        self.stats["requests"] += 1
+        loop = asyncio.get_running_loop()
+        futures = []
+        for kind, value in items:
+            future = loop.create_future()
+            futures.append(future)
+            await self._queue.put(_PendingItem(kind, value, future))
+
+        embeddings = np.stack(await asyncio.gather(*futures)).astype(np.float32, copy=False)
+        return encode_frame({"shape": list(embeddings.shape), "dtype": "float32"}, embeddings.tobytes())
+
+    def _decode_image(self, spec: Dict[str, Any], payload: bytes) -> Image.Image:
+        if "path" in spec:
+            # Decode JPEGs at reduced scale, then resize once to the model's input size
+            return fit_image(open_rgb_image(spec["path"], self.image_size), self.image_size)
+        data = payload[spec["offset"]:spec["offset"] + spec["length"]]
+        return Image.frombytes("RGB", tuple(spec["size"]), data)
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[_PendingItem] = [await self._queue.get()]
+            # Wait briefly for concurrent requests to join the batch
+            deadline = time.monotonic() + self.batch_wait_s
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            for kind in ("text", "image"):
+                group = [item for item in batch if item.kind == kind]
+                if not group:
+                    continue
+                embed = self.embedder.get_text_embeddings if kind == "text" else self.embedder.get_image_embeddings
+                try:
+                    embeddings = await loop.run_in_executor(self._executor, embed, [item.value for item in group])
+                except Exception as e:
+                    for item in group:
+                        if not item.future.done():
+                            item.future.set_exception(e)
+                    continue
+                self.stats["batches"] += 1
+                self.stats["items"] += len(group)
+                for item, embedding in zip(group, embeddings):
+                    if not item.future.done():
+                        item.future.set_result(embedding)
+
+
+def main():
+    import argparse
+    from app.rag.active_collection import initialize_active_collection
+    from app.rag.embeddings import ClipEmbedder
+
+    parser = argparse.ArgumentParser(description="Shared embedding server")
+    parser.add_argument("--model", help="Model to serve (default: the active collection's model)")
+    args = parser.parse_args()
+    model_id = args.model or initialize_active_collection(settings.CHROMA_PERSIST_DIR, settings.CLIP_MODEL_NAME)["model_id"]
+
+    server = EmbeddingServer(
+        embedder=ClipEmbedder(model_id),
+        socket_path=settings.EMBEDDING_SERVER_SOCKET,
+        max_batch=settings.EMBEDDING_SERVER_MAX_BATCH,
+        batch_wait_ms=settings.EMBEDDING_SERVER_BATCH_WAIT_MS
+    )
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("👋 Shutting down embedding server...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import fcntl
+import os
+import shutil
+import time
+import numpy as np
+import torch
+from pathlib import Path
+from typing import List, Optional
+from transformers import (
+    CLIPProcessor, CLIPModel, CLIPConfig, CLIPTextModelWithProjection, CLIPVisionModelWithProjection
+)
+from PIL import Image, ImageFile
+
+from app.config import settings
+from app.rag.embedding_client import UnsupportedModalityError, open_rgb_image
+
+
+WEIGHTS_FILENAME = "weights.pt"
+
+
+def _rss_mb() -> Optional[float]:
+    """Current resident set size in MB (Linux only)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def weight_cache_path(model_id: str) -> Path:
+    """Directory of the pre-converted local weight cache for a model"""
+    return Path(settings.CLIP_WEIGHT_CACHE_DIR) / model_id.replace("/", "--")
+
+
+def build_weight_cache(model_id: str) -> Path:
+    """Convert a Hugging Face CLIP checkpoint into a memory-mappable local cache
+
+    The cache holds the config, the processor files and a single torch file
+    with the state dict plus non-persistent buffers, which torch.load can map
+    lazily with mmap=True.
+
+    Workers starting together serialize on a lock file next to the cache: the
+    first one builds it and the others find it published once they get the
+    lock. A published cache is never replaced, since other processes may have
+    its weight file mapped.
+    """
+    cache_dir = weight_cache_path(model_id)
+    cache_dir.parent.mkdir(parents=True, exist_ok=True)
+    with open(cache_dir.with_name(f"{cache_dir.name}.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if (cache_dir / WEIGHTS_FILENAME).exists():
+            return cache_dir
+
+        tmp_dir = cache_dir.with_name(f"{cache_dir.name}.tmp-{os.getpid()}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+        try:
+            model = CLIPModel.from_pretrained(model_id)
+            model.config.save_pretrained(tmp_dir)
+            CLIPProcessor.from_pretrained(model_id).save_pretrained(tmp_dir)
+
+            state_dict = {name: tensor.contiguous() for name, tensor in model.state_dict().items()}
+            buffers = {name: buffer for name, buffer in model.named_buffers() if name not in state_dict}
+            torch.save({"state_dict": state_dict, "buffers": buffers}, tmp_dir / WEIGHTS_FILENAME)
+
+            # Publish atomically so concurrent workers never see a partial cache
+            if cache_dir.exists():
+                print(f"⚠️ {cache_dir} exists without {WEIGHTS_FILENAME}; remove it to rebuild the weight cache")
+            else:
+                os.replace(tmp_dir, cache_dir)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return cache_dir
+
+
+# Per-role model class, config attribute and state dict key prefixes; the
+# prefixes match the full CLIPModel checkpoint, so one cache serves every role
+TOWERS = {
+    "text": (CLIPTextModelWithProjection, "text_config", ("text_model.", "text_projection.")),
+    "vision": (CLIPVisionModelWithProjection, "vision_config", ("vision_model.", "visual_projection.")),
+}
+ROLES = ("both", "text", "vision")
+
+
+def load_mmap_tower(cache_dir: Path, tower: str) -> torch.nn.Module:
+    """Build one CLIP tower without allocating weights, then assign mmap-backed tensors
+
+    Parameters stay backed by the page cache of the weight file: pages are read
+    on first use and shared copy-on-write between every process that maps it.
+    """
+    model_class, config_attribute, prefixes = TOWERS[tower]
+    clip_config = CLIPConfig.from_pretrained(cache_dir)
+    config = getattr(clip_config, config_attribute)
+    config.projection_dim = clip_config.projection_dim
+    with torch.device("meta"):
+        model = model_class(config)
+
+    checkpoint = torch.load(cache_dir / WEIGHTS_FILENAME, mmap=True, weights_only=True)
+    state_dict = {name: tensor for name, tensor in checkpoint["state_dict"].items() if name.startswith(prefixes)}
+    model.load_state_dict(state_dict, assign=True)
+    for name, buffer in checkpoint["buffers"].items():
+        if name.startswith(prefixes):
+            module_name, _, buffer_name = name.rpartition(".")
+            model.get_submodule(module_name).register_buffer(buffer_name, buffer, persistent=False)
+
+    return model.eval()
+
+
+class ClipEmbedder:
+    """CLIP model wrapper producing text and image embeddings in a shared space
+
+    ``role`` selects which towers are loaded: ``both``, ``text`` (text tower and
+    projection only) or ``vision``. Specialized replicas use a fraction of the
+    memory; requests for a missing modality are delegated to the embedding
+    server at CLIP_DELEGATE_SOCKET when configured, and otherwise raise
+    UnsupportedModalityError.
+    """
+
+    def __init__(self, model_id: Optional[str] = None, role: Optional[str] = None):
+        model_id = model_id or settings.CLIP_MODEL_NAME
+        self.model_id = model_id
+        self.role = role or settings.CLIP_MODEL_ROLE
+        if self.role not in ROLES:
+            raise ValueError(f"Unknown CLIP model role {self.role}. Expected one of {ROLES}")
+        start, rss_before = time.perf_counter(), _rss_mb()
+
+        towers = ["text", "vision"] if self.role == "both" else [self.role]
+        loaded = {}
+
+        # Initialize CLIP embeddings for multi-modal
+        if settings.CLIP_MMAP_WEIGHTS:
+            cache_dir = weight_cache_path(model_id)
+            if not (cache_dir / WEIGHTS_FILENAME).exists():
+                print(f"Building memory-mapped weight cache for {model_id} in {cache_dir}")
+                build_weight_cache(model_id)
+            for tower in towers:
+                loaded[tower] = load_mmap_tower(cache_dir, tower)
+            self.clip_processor = CLIPProcessor.from_pretrained(cache_dir)
+            load_mode = "mmap"
+        else:
+            for tower in towers:
+                loaded[tower] = TOWERS[tower][0].from_pretrained(model_id)
+            self.clip_processor = CLIPProcessor.from_pretrained(model_id)
+            load_mode = "from_pretrained"
+
+        self.text_model = loaded.get("text")
+        self.vision_model = loaded.get("vision")
+
+        # Optional delegate for the modality this replica does not serve
+        self.delegate = None
+        if self.role != "both" and settings.CLIP_DELEGATE_SOCKET:
+            from app.rag.embedding_client import EmbeddingClient
+            self.delegate = EmbeddingClient(socket_path=settings.CLIP_DELEGATE_SOCKET)
+
+        rss_after = _rss_mb()
+        rss_note = f", RSS +{rss_after - rss_before:.0f} MB" if rss_before is not None and rss_after is not None else ""
+        print(f"Loaded {model_id} [{self.role}] ({load_mode}) in {time.perf_counter() - start:.1f}s{rss_note}")
+
+    @property
+    def image_size(self) -> int:
+        """Shorter image side the processor resizes to before center-cropping"""
+        size = self.clip_processor.image_processor.size
+        return size.get("shortest_edge") or min(size.values())
+
+    def _unsupported(self, modality: str) -> UnsupportedModalityError:
+        return UnsupportedModalityError(
+            f"This replica loads only the {self.role} tower of {self.model_id} and cannot embed {modality} queries"
+        )
+
+    def get_text_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of texts in one forward pass"""
+        if self.text_model is None:
+            if self.delegate is None:
+                raise self._unsupported("text")
+            return self.delegate.get_text_embeddings(texts)
+
+        inputs = self.clip_processor(text=texts, return_tensors="pt", padding=True, truncation=True)
+        with torch.no_grad():
+            emb = self.text_model(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"]).text_embeds
+        return emb.cpu().numpy()
+
+    def get_image_embeddings(self, images: List[Image.Image]) -> np.ndarray:
+        """Embed a batch of RGB images in one forward pass"""
+        if self.vision_model is None:
+            if self.delegate is None:
+                raise self._unsupported("image")
+            return self.delegate.get_image_embeddings(images)
+
+        inputs = self.clip_processor(images=images, return_tensors="pt")
+        with torch.no_grad():
+            emb = self.vision_model(pixel_values=inputs["pixel_values"]).image_embeds
+        return emb.cpu().numpy()
+
+    def get_image_embeddings_from_paths(self, image_paths: List[str]) -> np.ndarray:
+        """Embed image files; a text-only replica lets its delegate read them"""
+        if self.vision_model is None and self.delegate is not None:
+            return self.delegate.get_image_embeddings_from_paths(image_paths)
+        return self.get_image_embeddings([open_rgb_image(path, self.image_size) for path in image_paths])
+
+    def get_text_embedding(self, text: str) -> np.ndarray:
+        return self.get_text_embeddings([text])[0]
+
+    def get_image_embedding(self, image_path: Optional[str] = '', image: Optional[ImageFile.ImageFile] = None) -> np.ndarray:
+        if(image is None):
+            return self.get_image_embeddings_from_paths([image_path])[0]
+
+        return self.get_image_embeddings([image])[0]
+
+
+if __name__ == "__main__":
+    # Pre-build the weight cache, e.g. at image build time:
+    #     python -m app.rag.embeddings [model_id]
+    import sys
+    model_id = sys.argv[1] if len(sys.argv) > 1 else settings.CLIP_MODEL_NAME
+    print(f"Weight cache written to {build_weight_cache(model_id)}")
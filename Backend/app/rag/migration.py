@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Blue/green re-embedding migration
+Re-embeds the active collection with another model into a new versioned
+collection while the old one keeps serving, then swaps the active
+collection pointer. Progress is checkpointed after every batch, so an
+interrupted migration resumes where it stopped.
+
+Run from the Backend directory (typically in the background):
+    python -m app.rag.migration start --model openai/clip-vit-base-patch32
+    python -m app.rag.migration resume
+    python -m app.rag.migration status
+    python -m app.rag.migration rollback
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from app.config import settings
+from app.rag.active_collection import read_active_collection, versioned_collection_name, write_active_collection
+from app.rag.vector_index import VectorIndex, create_vector_index
+
+
+MIGRATIONS_DIR = "migrations"
+FINISHED_STATUSES = ("done", "failed")
+
+
+class MigrationError(RuntimeError):
+    """Raised when a migration cannot start, resume or roll back"""
+
+
+def migrations_path(persist_directory: str) -> Path:
+    return Path(persist_directory) / MIGRATIONS_DIR
+
+
+def list_migrations(persist_directory: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Every recorded migration, oldest first"""
+    directory = migrations_path(persist_directory or settings.CHROMA_PERSIST_DIR)
+    if not directory.exists():
+        return []
+    migrations = []
+    for path in directory.glob("*.json"):
+        with open(path) as f:
+            migrations.append(json.load(f))
+    return sorted(migrations, key=lambda state: state["version"])
+
+
+def _embed_texts(embedder: Any, texts: List[str]) -> List[np.ndarray]:
+    if hasattr(embedder, "get_text_embeddings"):
+        return list(embedder.get_text_embeddings(texts))
+    return [embedder.get_text_embedding(text) for text in texts]
+
+
+def _embed_images(embedder: Any, images: List[Image.Image]) -> List[np.ndarray]:
+    if hasattr(embedder, "get_image_embeddings"):
+        return list(embedder.get_image_embeddings(images))
+    return [embedder.get_image_embedding(image=image) for image in images]
+
+
+def _image_path(document: str, metadata: Dict[str, Any]) -> Optional[str]:
+    if metadata.get("image_path"):
+        return metadata["image_path"]
+    # Records written before image_path was stored: "Image for product: <id> and path: <path>"
+    _, separator, path = document.partition(" and path: ")
+    return path if separator else None
+
+
+def _fingerprint(document: str, metadata: Dict[str, Any]) -> str:
+    """Digest of a record's content, ignoring the keys the migration itself fills in"""
+    content = {key: value for key, value in metadata.items() if key not in ("modality", "image_path")}
+    return hashlib.sha1(json.dumps([document, content], sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def fingerprint_records(index: VectorIndex) -> Dict[str, str]:
+    """Content fingerprint of every record, by id; updates re-add an id, so ids alone miss them"""
+    page = index.get(include=["documents", "metadatas"])
+    return {
+        record_id: _fingerprint(document, metadata)
+        for record_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"])
+    }
+
+
+def unfinished_migrations(persist_directory: Optional[str] = None) -> List[Dict[str, Any]]:
+    return [state for state in list_migrations(persist_directory) if state["status"] not in FINISHED_STATUSES]
+
+
+def next_collection_version(persist_directory: str) -> int:
+    """Version for a new collection, above the active one and every migration's"""
+    versions = [state["version"] for state in list_migrations(persist_directory)]
+    return max([read_active_collection(persist_directory).get("version", 0)] + versions) + 1
+
+
+class ReembeddingMigration:
+    """Copies the catalog into a new collection, embedding every record with a new model"""
+
+    def __init__(
+        self,
+        state: Dict[str, Any],
+        persist_directory: Optional[str] = None,
+        embedder: Optional[Any] = None,
+        index_backend: Optional[str] = None,
+        batch_size: Optional[int] = None
+    ):
+        self.state = state
+        self.persist_directory = persist_directory or settings.CHROMA_PERSIST_DIR
+        self.index_backend = index_backend
+        self.batch_size = batch_size or settings.MIGRATION_BATCH_SIZE
+        self._embedder = embedder
+
+    @classmethod
+    def start(cls, model_id: str, persist_directory: Optional[str] = None, **kwargs: Any) -> "ReembeddingMigration":
+        persist_directory = persist_directory or settings.CHROMA_PERSIST_DIR
+        unfinished = unfinished_migrations(persist_directory)
+        if unfinished:
+            raise MigrationError(f"Migration to {unfinished[-1]['target']} is unfinished; resume it instead")
+
+        active = read_active_collection(persist_directory)
+        if active["model_id"] == model_id:
+            raise MigrationError(f"The active collection {active['collection']} already uses {model_id}")
+        version = next_collection_version(persist_directory)
+        state = {
+            "source": active["collection"],
+            "source_model_id": active["model_id"],
+            "source_version": active.get("version", 0),
+            "target": versioned_collection_name(version),
+            "model_id": model_id,
+            "version": version,
+            "status": "copying",
+            "offset": 0,
+            "processed": 0,
+            "skipped": 0,
+            "total": None,
+            "started_at": datetime.now().isoformat(),
+        }
+        return cls(state, persist_directory=persist_directory, **kwargs)
+
+    @classmethod
+    def resume(cls, persist_directory: Optional[str] = None, **kwargs: Any) -> "ReembeddingMigration":
+        unfinished = unfinished_migrations(persist_directory)
+        if not unfinished:
+            raise MigrationError("No unfinished migration to resume")
+        return cls(unfinished[-1], persist_directory=persist_directory, **kwargs)
+
+    @property
+    def embedder(self) -> Any:
+        if self._embedder is None:
+            # The migration loads the new model itself; the embedding server keeps serving the old one
+            from app.rag.embeddings import ClipEmbedder
+            self._embedder = ClipEmbedder(self.state["model_id"])
+        return self._embedder
+
+    def _save_state(self, **updates: Any) -> None:
+        self.state.update(updates, updated_at=datetime.now().isoformat())
+        directory = migrations_path(self.persist_directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{self.state['target']}.json"
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def _open(self, name: str, metadata: Dict[str, Any]) -> VectorIndex:
+        return create_vector_index(self.persist_directory, name, metadata, backend=self.index_backend)
+
+    def _copy_records(self, source: VectorIndex, target: VectorIndex, ids: Optional[List[str]] = None, offset: int = 0) -> int:
+        """Embed one batch of source records with the new model and add them to the target"""
+        if ids is not None:
+            page = source.get(ids=ids, include=["documents", "metadatas"])
+        else:
+            page = source.get(limit=self.batch_size, offset=offset, include=["documents", "metadatas"])
+
+        text_records, image_records, images = [], [], []
+        for record_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+            if metadata.get("modality") == "image" or (metadata.get("modality") is None and record_id != metadata.get("product_id")):
+                path = _image_path(document, metadata)
+                try:
+                    images.append(Image.open(path).convert("RGB"))
+                except (OSError, TypeError) as e:
+                    print(f"⚠️  Skipping {record_id}: cannot open image {path}: {e}")
+                    self.state["skipped"] += 1
+                    continue
+                image_records.append((record_id, document, {**metadata, "modality": "image", "image_path": path}))
+            else:
+                text_records.append((record_id, document, {**metadata, "modality": "text"}))
+
+        embeddings = []
+        if text_records:
+            embeddings += _embed_texts(self.embedder, [document for _, document, _ in text_records])
+        if images:
+            embeddings += _embed_images(self.embedder, images)
+        records = text_records + image_records
+        if records:
+            target.add(
+                ids=[record_id for record_id, _, _ in records],
+                embeddings=[np.asarray(embedding, dtype=np.float32).tolist() for embedding in embeddings],
+                documents=[document for _, document, _ in records],
+                metadatas=[metadata for _, _, metadata in records]
+            )
+        return len(page["ids"])
+
+    def _copy_ids(self, source: VectorIndex, target: VectorIndex, ids: List[str]) -> None:
+        for start in range(0, len(ids), self.batch_size):
+            self._copy_records(source, target, ids=ids[start:start + self.batch_size])
+
+    def _replace_ids(self, source: VectorIndex, target: VectorIndex, ids: List[str]) -> None:
+        """Re-copy records the target holds an outdated version of; the index skips ids it already has"""
+        if ids:
+            target.delete(ids=ids)
+            self._copy_ids(source, target, ids)
+
+    def _catch_up(self, source: VectorIndex, target: VectorIndex, rounds: int = 5) -> None:
+        """Apply writes the source received while it was being copied"""
+        for _ in range(rounds):
+            source_prints, target_prints = fingerprint_records(source), fingerprint_records(target)
+            missing = sorted(source_prints.keys() - target_prints.keys())
+            removed = sorted(target_prints.keys() - source_prints.keys())
+            changed = sorted(
+                record_id for record_id in source_prints.keys() & target_prints.keys()
+                if source_prints[record_id] != target_prints[record_id]
+            )
+            if not missing and not removed and not changed:
+                return
+            print(f"🔁 Catching up: {len(missing)} added, {len(changed)} updated and {len(removed)} deleted since copying")
+            self._copy_ids(source, target, missing)
+            self._replace_ids(source, target, changed)
+            if removed:
+                target.delete(ids=removed)
+
+    def _swap_snapshot_path(self) -> Path:
+        # Kept out of the migrations directory itself, where every *.json is a migration state
+        return migrations_path(self.persist_directory) / "swap_snapshots" / f"{self.state['target']}.json"
+
+    def _save_swap_snapshot(self, fingerprints: Dict[str, str]) -> None:
+        path = self._swap_snapshot_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(fingerprints, f)
+        os.replace(tmp_path, path)
+
+    def _late_writes(self, source: VectorIndex, target: VectorIndex) -> List[str]:
+        """Source records added or updated after the swap that the target does not already hold"""
+        path = self._swap_snapshot_path()
+        if path.exists():
+            with open(path) as f:
+                seen = json.load(f)
+        else:
+            # Swapped before snapshots were kept: fall back to comparing with the target alone
+            print(f"⚠️  No swap snapshot at {path}; comparing {self.state['source']} with the target instead")
+            seen = {}
+        source_prints, target_prints = fingerprint_records(source), fingerprint_records(target)
+        late = sorted(
+            record_id for record_id, fingerprint in source_prints.items()
+            if seen.get(record_id) != fingerprint and target_prints.get(record_id) != fingerprint
+        )
+        if not late:
+            return []
+
+        # Workers already on the target may have written a newer version since
+        source_meta = dict(zip(late, source.get(ids=late, include=["metadatas"])["metadatas"]))
+        target_page = target.get(ids=late, include=["metadatas"])
+        target_meta = dict(zip(target_page["ids"], target_page["metadatas"]))
+        return [
+            record_id for record_id in late
+            if (target_meta.get(record_id) or {}).get("updated_at", "") <= (source_meta[record_id].get("updated_at") or "")
+        ]
+
+    def run(self) -> Dict[str, Any]:
+        source = self._open(self.state["source"], {})
+        target = self._open(self.state["target"], {
+            "embedding_compression": "none",
+            "embedding_model": self.state["model_id"],
+            "migrated_from": self.state["source"],
+        })
+
+        try:
+            if self.state["status"] == "copying":
+                total = source.count()
+                self._save_state(total=total)
+                start, copied_at_start = time.perf_counter(), self.state["processed"]
+                while self.state["offset"] < source.count():
+                    count = self._copy_records(source, target, offset=self.state["offset"])
+                    if count == 0:
+                        break
+                    processed = self.state["processed"] + count
+                    rate = (processed - copied_at_start) / max(time.perf_counter() - start, 1e-9)
+                    eta = max(total - processed, 0) / rate if rate else None
+                    self._save_state(
+                        offset=self.state["offset"] + count,
+                        processed=processed,
+                        records_per_s=round(rate, 1),
+                        eta_s=round(eta) if eta is not None else None,
+                    )
+                    print(f"📦 {processed}/{total} records ({processed / max(total, 1):.0%}), "
+                          f"{rate:.1f}/s, ETA {self.state['eta_s']}s")
+                self._save_state(status="catching_up")
+
+            if self.state["status"] == "catching_up":
+                self._catch_up(source, target)
+                # What the old collection holds at the swap, kept on disk so a resumed migration
+                # still copies the writes that arrive there afterwards
+                self._save_swap_snapshot(fingerprint_records(source))
+                write_active_collection(self.persist_directory, self.state["target"], self.state["model_id"], self.state["version"])
+                self._save_state(status="swapped", swapped_at=datetime.now().isoformat())
+                print(f"🔀 Active collection is now {self.state['target']} ({self.state['model_id']})")
+
+            if self.state["status"] == "swapped":
+                # Workers switch within ACTIVE_COLLECTION_CHECK_SECONDS; until then they still write
+                # to the old collection, so copy any product that arrives there in the meantime
+                time.sleep(2 * settings.ACTIVE_COLLECTION_CHECK_SECONDS)
+                late = self._late_writes(source, target)
+                if late:
+                    print(f"🔁 Copying {len(late)} records written to {self.state['source']} after the swap")
+                    self._replace_ids(source, target, late)
+                self._save_state(status="done", finished_at=datetime.now().isoformat())
+                print(f"✅ Migration to {self.state['target']} complete; {self.state['source']} is kept for rollback")
+        except Exception as e:
+            self._save_state(last_error=f"{type(e).__name__}: {e}")
+            raise
+        return self.state
+
+
+def rollback(persist_directory: Optional[str] = None) -> Dict[str, Any]:
+    """Point traffic back at the collection the last migration replaced"""
+    persist_directory = persist_directory or settings.CHROMA_PERSIST_DIR
+    active = read_active_collection(persist_directory)
+    swapped = [state for state in list_migrations(persist_directory) if state["target"] == active["collection"]]
+    if not swapped:
+        raise MigrationError(f"The active collection {active['collection']} was not created by a migration")
+    state = swapped[-1]
+    return write_active_collection(persist_directory, state["source"], state["source_model_id"], state["source_version"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Blue/green re-embedding migration")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    start_parser = subparsers.add_parser("start", help="Re-embed the catalog with a new model")
+    start_parser.add_argument("--model", default=settings.CLIP_MODEL_NAME, help="Target model (default: CLIP_MODEL_NAME)")
+    start_parser.add_argument("--batch-size", type=int, default=settings.MIGRATION_BATCH_SIZE)
+    resume_parser = subparsers.add_parser("resume", help="Resume an interrupted migration")
+    resume_parser.add_argument("--batch-size", type=int, default=settings.MIGRATION_BATCH_SIZE)
+    subparsers.add_parser("status", help="Show the active collection and recorded migrations")
+    subparsers.add_parser("rollback", help="Serve the collection the last migration replaced")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        print(json.dumps({"active": read_active_collection(settings.CHROMA_PERSIST_DIR), "migrations": list_migrations()}, indent=2))
+        return
+    if args.command == "rollback":
+        active = rollback()
+        print(f"↩️  Active collection is now {active['collection']} ({active['model_id']})")
+        return
+
+    if args.command == "start":
+        migration = ReembeddingMigration.start(args.model, batch_size=args.batch_size)
+        print(f"🚚 Migrating {migration.state['source']} -> {migration.state['target']} with {args.model}")
+    else:
+        migration = ReembeddingMigration.resume(batch_size=args.batch_size)
+        print(f"🚚 Resuming migration to {migration.state['target']} at record {migration.state['offset']}")
+    migration.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import numpy as np
+from typing import List
+
+
+def maximal_marginal_relevance(
+    relevance: np.ndarray,
+    embeddings: np.ndarray,
+    k: int,
+    lambda_mult: float
+) -> List[int]:
+    """Greedily pick k candidates balancing query relevance against redundancy
+
+    Each step selects the candidate maximising
+    ``lambda * relevance - (1 - lambda) * max_similarity_to_selected``.
+    The candidate similarity matrix is computed once with a single matmul, and
+    the running max similarity is updated with one vector op per pick.
+    Returns indices into ``relevance`` in selection order.
+    """
+    count = len(relevance)
+    k = min(k, count)
+    if k == 0:
+        return []
+
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1.0, norms)
+    similarity = vectors @ vectors.T
+
+    relevance = np.asarray(relevance, dtype=np.float32)
+    max_similarity = np.full(count, -np.inf, dtype=np.float32)
+    available = np.ones(count, dtype=bool)
+    selected: List[int] = []
+    for _ in range(k):
+        # Nothing selected yet means no redundancy penalty
+        redundancy = np.where(np.isfinite(max_similarity), max_similarity, 0.0)
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        choice = int(np.argmax(scores))
+        selected.append(choice)
+        available[choice] = False
+        max_similarity = np.maximum(max_similarity, similarity[choice])
+    return selected
@@ -0,0 +1,269 @@
+import fcntl
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import re
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.config import settings
+from app.rag.vector_index import INCLUDE_DEFAULT, VectorIndex, create_vector_index
+
+
+SHARDING_MODES = ("none", "category", "hash")
+SHARDS_DIR = "shards"
+UNCATEGORIZED = "uncategorized"
+
+_fanout_pool: Optional[ThreadPoolExecutor] = None
+_fanout_pool_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    """Thread pool shared by every sharded index; backends release the GIL while searching"""
+    global _fanout_pool
+    with _fanout_pool_lock:
+        if _fanout_pool is None:
+            _fanout_pool = ThreadPoolExecutor(max_workers=settings.VECTOR_INDEX_FANOUT_WORKERS, thread_name_prefix="shard-fanout")
+        return _fanout_pool
+
+
+def normalize_category(category: Optional[str]) -> str:
+    """Category as used for shard routing and category filters"""
+    return (category or "").strip().lower() or UNCATEGORIZED
+
+
+def category_shard_key(category: Optional[str]) -> str:
+    # Collection names allow few characters, so keep a readable slug plus a hash against collisions
+    normalized = normalize_category(category)
+    slug = re.sub(r"[^a-z0-9]+", "-", normalized).strip("-")[:24] or "x"
+    return f"c-{slug}-{hashlib.sha1(normalized.encode()).hexdigest()[:8]}"
+
+
+def hash_shard_key(product_id: str, shards: int) -> str:
+    return _bucket_key(zlib.crc32(product_id.encode()) % shards)
+
+
+def _bucket_key(bucket: int) -> str:
+    return f"h{bucket:03d}"
+
+
+class ShardedVectorIndex(VectorIndex):
+    """VectorIndex partitioned into one backend index per category or per hash bucket
+
+    Records are routed by their ``category`` metadata (``category`` mode) or by
+    a hash of their ``product_id`` (``hash`` mode), so a product's text and
+    image documents share a shard. Queries fan out to every shard in parallel
+    and the per-shard top-k lists are merged by distance; ``scoped`` narrows a
+    category search to the single shard holding that category.
+
+    The shards of an index are listed in ``<persist>/shards/<name>.json``,
+    which every process rereads when it changes, so a category shard created
+    by one worker is searched by the others.
+    """
+
+    def __init__(
+        self,
+        persist_directory: str,
+        name: str,
+        metadata: Dict[str, Any],
+        backend: Optional[str] = None,
+        mode: Optional[str] = None,
+        hash_shards: Optional[int] = None
+    ):
+        self.persist_directory = persist_directory
+        self.name = name
+        self.backend = backend
+        self.mode = mode or settings.VECTOR_INDEX_SHARDING
+        if self.mode not in ("category", "hash"):
+            raise ValueError(f"Unknown sharding mode {self.mode}. Expected 'category' or 'hash'")
+
+        self._lock = threading.Lock()
+        self._shards: Dict[str, VectorIndex] = {}
+        self._manifest_path = Path(persist_directory) / SHARDS_DIR / f"{name}.json"
+        self._manifest_mtime: Optional[float] = None
+        self._storage: Optional[Any] = None
+
+        with self._update_manifest() as manifest:
+            if not manifest:
+                manifest.update({
+                    "mode": self.mode,
+                    "hash_shards": hash_shards or settings.VECTOR_INDEX_HASH_SHARDS,
+                    "metadata": metadata,
+                    "shards": {},
+                })
+                if self.mode == "hash":
+                    manifest["shards"] = {_bucket_key(bucket): None for bucket in range(manifest["hash_shards"])}
+            elif manifest["mode"] != self.mode:
+                raise ValueError(
+                    f"Index {name} is sharded by {manifest['mode']}, not {self.mode}; "
+                    f"snapshot it and restore into a fresh index to change sharding"
+                )
+        self._reload()
+
+    @contextmanager
+    def _update_manifest(self) -> Iterator[Dict[str, Any]]:
+        """Read-modify-write the manifest under an exclusive file lock shared with other processes"""
+        self._manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._manifest_path.with_suffix(".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            manifest = {}
+            if self._manifest_path.exists():
+                with open(self._manifest_path) as f:
+                    manifest = json.load(f)
+            before = json.dumps(manifest, sort_keys=True)
+            yield manifest
+            if json.dumps(manifest, sort_keys=True) != before:
+                tmp_path = self._manifest_path.with_name(f"{self._manifest_path.name}.tmp-{os.getpid()}")
+                with open(tmp_path, "w") as f:
+                    json.dump(manifest, f, indent=2)
+                os.replace(tmp_path, self._manifest_path)
+
+    def _reload(self) -> None:
+        """Open shards added since the manifest was last read"""
+        mtime = self._manifest_path.stat().st_mtime
+        if mtime == self._manifest_mtime:
+            return
+        with self._lock:
+            with open(self._manifest_path) as f:
+                self._manifest = json.load(f)
+            for key in self._manifest["shards"]:
+                if key not in self._shards:
+                    self._shards[key] = self._open_shard(key)
+            self._manifest_mtime = mtime
+
+    def _open_shard(self, key: str) -> VectorIndex:
+        shard = create_vector_index(
+            self.persist_directory, f"{self.name}__{key}", self._manifest["metadata"], backend=self.backend, sharding="none"
+        )
+        shard.configure_storage(self._storage)
+        return shard
+
+    def _shard_key(self, record_id: str, metadata: Dict[str, Any]) -> str:
+        if self.mode == "category":
+            return category_shard_key(metadata.get("category"))
+        return hash_shard_key(metadata.get("product_id") or record_id, self._manifest["hash_shards"])
+
+    def _ordered_shards(self) -> List[VectorIndex]:
+        self._reload()
+        return [self._shards[key] for key in sorted(self._shards)]
+
+    def _fan_out(self, shards: List[VectorIndex], call) -> List[Any]:
+        if len(shards) == 1:
+            return [call(shards[0])]
+        return list(_pool().map(call, shards))
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        self._reload()
+        return self._manifest["metadata"]
+
+    @property
+    def shard_count(self) -> int:
+        self._reload()
+        return len(self._shards)
+
+    def scoped(self, category: Optional[str]) -> VectorIndex:
+        if self.mode != "category" or not category:
+            return self
+        self._reload()
+        # No shard means no product has the category; the full fan-out then finds nothing either
+        return self._shards.get(category_shard_key(category), self)
+
+    def add(self, ids, embeddings, documents, metadatas) -> None:
+        # An existing id may live in another shard than its new metadata routes to
+        existing = set(self.get(ids=list(ids), include=())["ids"])
+        groups: Dict[str, List[int]] = {}
+        for i, (record_id, metadata) in enumerate(zip(ids, metadatas)):
+            if record_id in existing:
+                continue
+            groups.setdefault(self._shard_key(record_id, metadata), []).append(i)
+
+        new_keys = [key for key in groups if key not in self._shards]
+        if new_keys:
+            with self._update_manifest() as manifest:
+                for key in new_keys:
+                    manifest["shards"].setdefault(key, metadatas[groups[key][0]].get("category"))
+            self._reload()
+
+        for key, rows in groups.items():
+            self._shards[key].add(
+                ids=[ids[i] for i in rows],
+                embeddings=[embeddings[i] for i in rows],
+                documents=[documents[i] for i in rows],
+                metadatas=[metadatas[i] for i in rows]
+            )
+
+    def delete(self, ids: List[str]) -> None:
+        self._fan_out(self._ordered_shards(), lambda shard: shard.delete(ids=ids))
+
+    def get(self, ids=None, limit=None, include=("metadatas", "documents"), offset=None, where=None) -> Dict[str, Any]:
+        shards = self._ordered_shards()
+        if ids is not None:
+            pages = self._fan_out(shards, lambda shard: shard.get(ids=ids, include=include, where=where))
+        else:
+            # Page through the shards in key order, which is stable across calls
+            pages, skip, remaining = [], offset or 0, limit
+            for shard in shards:
+                if remaining is not None and remaining <= 0:
+                    break
+                shard_count = shard.count(where)
+                if skip >= shard_count:
+                    skip -= shard_count
+                    continue
+                page = shard.get(limit=remaining, offset=skip, include=include, where=where)
+                pages.append(page)
+                skip = 0
+                if remaining is not None:
+                    remaining -= len(page["ids"])
+
+        merged: Dict[str, Any] = {"ids": [record_id for page in pages for record_id in page["ids"]]}
+        for field in ("documents", "metadatas", "embeddings"):
+            merged[field] = [value for page in pages for value in page[field]] if field in include else None
+        return merged
+
+    def query(self, query_embeddings, n_results, include=INCLUDE_DEFAULT) -> Dict[str, Any]:
+        shard_include = tuple(set(include) | {"distances"})
+        results = self._fan_out(
+            self._ordered_shards(),
+            lambda shard: shard.query(query_embeddings=query_embeddings, n_results=n_results, include=shard_include)
+        )
+
+        fields = [field for field in ("documents", "metadatas", "embeddings", "distances") if field in include]
+        merged: Dict[str, Any] = {"ids": []}
+        merged.update({field: [] for field in fields})
+        for q in range(len(query_embeddings)):
+            # Each shard's hits are sorted by distance; merge them lazily and stop at n_results
+            streams = [
+                [(distance, s, position) for position, distance in enumerate(result["distances"][q])]
+                for s, result in enumerate(results)
+            ]
+            top = list(itertools.islice(heapq.merge(*streams), n_results))
+            merged["ids"].append([results[s]["ids"][q][position] for _, s, position in top])
+            for field in fields:
+                merged[field].append([results[s][field][q][position] for _, s, position in top])
+        for field in ("documents", "metadatas", "embeddings", "distances"):
+            merged.setdefault(field, None)
+        return merged
+
+    def count(self, where: Optional[Dict[str, Any]] = None) -> int:
+        return sum(self._fan_out(self._ordered_shards(), lambda shard: shard.count(where)))
+
+    def configure_storage(self, compressor: Optional[Any]) -> None:
+        # Shards created later, by this or another process, pick it up in _open_shard
+        with self._lock:
+            self._storage = compressor
+        self._fan_out(self._ordered_shards(), lambda shard: shard.configure_storage(compressor))
+
+    def reset(self, metadata: Optional[Dict[str, Any]] = None) -> None:
+        # Shards stay listed, emptied, so no process can keep writing to one the others no longer search
+        if metadata is not None:
+            with self._update_manifest() as manifest:
+                manifest["metadata"] = metadata
+        for shard in self._ordered_shards():
+            shard.reset(metadata)
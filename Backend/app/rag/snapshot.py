@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Vector store snapshot and restore
+Exports ids, embeddings, documents and metadata so an index can be rebuilt
+with bulk loads and no model inference.
+
+A snapshot directory holds:
+- ``embeddings.npy``: float32 matrix, one row per record
+- ``records.jsonl``: ``{"id", "document", "metadata"}`` per row, same order
+- ``embedding_compression.npz``: the fitted compressor, when one is in use
+- ``manifest.json``: counts, dimension, index metadata and file checksums
+
+Run from the Backend directory:
+    python -m app.rag.snapshot create ./snapshots/catalog-2026-01-01
+    python -m app.rag.snapshot restore ./snapshots/catalog-2026-01-01 --force
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+
+from app.rag.catalog_version import bump_catalog_version
+from app.rag.compression import EmbeddingCompressor, collection_compressor_path, compressor_path, effective_compressor_path
+from app.rag.vector_index import VectorIndex
+
+
+FORMAT_VERSION = 1
+EMBEDDINGS_FILE = "embeddings.npy"
+RECORDS_FILE = "records.jsonl"
+COMPRESSOR_FILE = "embedding_compression.npz"
+MANIFEST_FILE = "manifest.json"
+
+
+class SnapshotError(RuntimeError):
+    """Raised when a snapshot cannot be written or fails verification"""
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def create_snapshot(index: VectorIndex, output_dir: Path, batch_size: int = 5000) -> Dict[str, Any]:
+    """Export every record of the index, paging through it in batches
+
+    Writes into a temporary directory that is renamed into place once
+    complete, so a partial snapshot is never mistaken for a good one.
+    """
+    output_dir = Path(output_dir)
+    if output_dir.exists():
+        raise SnapshotError(f"Snapshot directory {output_dir} already exists")
+    tmp_dir = output_dir.with_name(f".{output_dir.name}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    try:
+        count = index.count()
+        embeddings = None
+        written = 0
+        with open(tmp_dir / RECORDS_FILE, "w") as records:
+            while written < count:
+                page = index.get(limit=batch_size, offset=written, include=["embeddings", "documents", "metadatas"])
+                if not page["ids"]:
+                    break
+                page_embeddings = np.asarray(page["embeddings"], dtype=np.float32)
+                if embeddings is None:
+                    embeddings = np.lib.format.open_memmap(
+                        tmp_dir / EMBEDDINGS_FILE, mode="w+", dtype=np.float32, shape=(count, page_embeddings.shape[1])
+                    )
+                take = min(len(page["ids"]), count - written)
+                embeddings[written:written + take] = page_embeddings[:take]
+                for i in range(take):
+                    records.write(json.dumps({
+                        "id": page["ids"][i],
+                        "document": page["documents"][i],
+                        "metadata": page["metadatas"][i]
+                    }) + "\n")
+                written += take
+
+        if written != count:
+            raise SnapshotError(f"Index changed during the snapshot ({written} of {count} records read); retry")
+        if embeddings is not None:
+            embeddings.flush()
+            dim = embeddings.shape[1]
+            del embeddings
+        else:
+            np.save(tmp_dir / EMBEDDINGS_FILE, np.zeros((0, 0), dtype=np.float32))
+            dim = 0
+
+        if effective_compressor_path(index.name).exists():
+            shutil.copyfile(effective_compressor_path(index.name), tmp_dir / COMPRESSOR_FILE)
+
+        files = [name for name in (EMBEDDINGS_FILE, RECORDS_FILE, COMPRESSOR_FILE) if (tmp_dir / name).exists()]
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "created_at": datetime.now().isoformat(),
+            "index_name": index.name,
+            "index_metadata": {k: v for k, v in index.metadata.items() if not k.startswith("hnsw:")},
+            "count": count,
+            "dim": dim,
+            "dtype": "float32",
+            "files": {name: _sha256(tmp_dir / name) for name in files},
+        }
+        with open(tmp_dir / MANIFEST_FILE, "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        os.replace(tmp_dir, output_dir)
+        return manifest
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def load_manifest(snapshot_dir: Path, verify: bool = True) -> Dict[str, Any]:
+    snapshot_dir = Path(snapshot_dir)
+    manifest_path = snapshot_dir / MANIFEST_FILE
+    if not manifest_path.exists():
+        raise SnapshotError(f"{snapshot_dir} is not a snapshot (no {MANIFEST_FILE})")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot format version {manifest.get('format_version')}")
+    if verify:
+        for name, checksum in manifest["files"].items():
+            if _sha256(snapshot_dir / name) != checksum:
+                raise SnapshotError(f"Checksum mismatch for {name}")
+    return manifest
+
+
+def restore_snapshot(index: VectorIndex, snapshot_dir: Path, batch_size: int = 5000, verify: bool = True) -> int:
+    """Replace the contents of the index with a snapshot using bulk adds"""
+    snapshot_dir = Path(snapshot_dir)
+    manifest = load_manifest(snapshot_dir, verify=verify)
+
+    embeddings = np.load(snapshot_dir / EMBEDDINGS_FILE, mmap_mode="r")
+    if len(embeddings) != manifest["count"]:
+        raise SnapshotError(f"Snapshot has {len(embeddings)} embeddings but the manifest lists {manifest['count']}")
+
+    index.reset(manifest["index_metadata"])
+    if COMPRESSOR_FILE in manifest["files"]:
+        compressor = EmbeddingCompressor.load(snapshot_dir / COMPRESSOR_FILE)
+        index.configure_storage(None if compressor.is_identity else compressor)
+    restored = 0
+    with open(snapshot_dir / RECORDS_FILE) as records:
+        while restored < manifest["count"]:
+            batch = [json.loads(records.readline()) for _ in range(min(batch_size, manifest["count"] - restored))]
+            index.add(
+                ids=[record["id"] for record in batch],
+                embeddings=np.asarray(embeddings[restored:restored + len(batch)]).tolist(),
+                documents=[record["document"] for record in batch],
+                metadatas=[record["metadata"] for record in batch]
+            )
+            restored += len(batch)
+    return restored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector store snapshot and restore")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    create_parser = subparsers.add_parser("create", help="Export the vector store to a snapshot directory")
+    create_parser.add_argument("path", help="Snapshot directory to create")
+    create_parser.add_argument("--batch-size", type=int, default=5000)
+
+    restore_parser = subparsers.add_parser("restore", help="Replace the vector store with a snapshot")
+    restore_parser.add_argument("path", help="Snapshot directory to restore")
+    restore_parser.add_argument("--batch-size", type=int, default=5000)
+    restore_parser.add_argument("--force", action="store_true", help="Overwrite a non-empty vector store")
+    restore_parser.add_argument("--no-verify", action="store_true", help="Skip checksum verification")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "create":
+        from app.rag.vector_store import ProductVectorStore
+        store = ProductVectorStore(load_embedder=False)
+        manifest = create_snapshot(store.product_collection, Path(args.path), batch_size=args.batch_size)
+        print(f"✅ Snapshot of {manifest['count']} records written to {args.path} in {time.perf_counter() - start:.1f}s")
+        return
+
+    snapshot_dir = Path(args.path)
+    manifest = load_manifest(snapshot_dir, verify=not args.no_verify)
+
+    from app.rag.vector_store import ProductVectorStore
+    store = ProductVectorStore(load_embedder=False)
+    if store.product_collection.count() and not args.force:
+        raise SystemExit(f"❌ The vector store holds {store.product_collection.count()} records; pass --force to replace them")
+
+    # The compressor must match the restored embeddings for queries to land in the same space
+    collection_path = collection_compressor_path(store.product_collection_name, store.persist_directory)
+    if COMPRESSOR_FILE in manifest["files"]:
+        collection_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(snapshot_dir / COMPRESSOR_FILE, collection_path)
+    else:
+        collection_path.unlink(missing_ok=True)
+        if compressor_path().exists():
+            os.unlink(compressor_path())
+
+    # Checksums were verified above
+    restored = restore_snapshot(store.product_collection, snapshot_dir, batch_size=args.batch_size, verify=False)
+    bump_catalog_version(store.persist_directory)
+    print(f"✅ Restored {restored} records from {args.path} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
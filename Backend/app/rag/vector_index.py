@@ -0,0 +1,633 @@
+import fcntl
+import json
+import os
+import threading
+import time
+import numpy as np
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.config import settings
+
+
+INCLUDE_DEFAULT = ("metadatas", "documents", "distances")
+
+
+class VectorIndex(ABC):
+    """Storage and nearest-neighbour search for embeddings with documents and metadata
+
+    Results use ChromaDB's shapes: ``get`` returns flat lists keyed by
+    ``ids``/``documents``/``metadatas``/``embeddings``, and ``query`` returns
+    one list per query embedding with cosine ``distances`` (1 - similarity).
+    """
+
+    name: str
+    # Embedding dtypes stored natively; the others are kept as float32 carrying their precision loss
+    STORED_DTYPES: Tuple[str, ...] = ("float32",)
+
+    @property
+    @abstractmethod
+    def metadata(self) -> Dict[str, Any]:
+        """Index-level metadata, e.g. the embedding compression in use"""
+
+    @abstractmethod
+    def add(
+        self,
+        ids: List[str],
+        embeddings: List[List[float]],
+        documents: List[str],
+        metadatas: List[Dict[str, Any]]
+    ) -> None:
+        """Add records; ids that already exist are skipped"""
+
+    @abstractmethod
+    def delete(self, ids: List[str]) -> None:
+        pass
+
+    @abstractmethod
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        limit: Optional[int] = None,
+        include: Sequence[str] = ("metadatas", "documents"),
+        offset: Optional[int] = None,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Records by id, or a page of all records in a stable order; ``where`` keeps those whose metadata equals it"""
+
+    @abstractmethod
+    def query(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int,
+        include: Sequence[str] = INCLUDE_DEFAULT
+    ) -> Dict[str, Any]:
+        pass
+
+    @abstractmethod
+    def count(self, where: Optional[Dict[str, Any]] = None) -> int:
+        """Number of records, or of those whose metadata equals every key/value in ``where``"""
+
+    @abstractmethod
+    def reset(self, metadata: Optional[Dict[str, Any]] = None) -> None:
+        """Delete every record, optionally replacing the index metadata"""
+
+    def scoped(self, category: Optional[str]) -> "VectorIndex":
+        """The smallest index holding every record of a category; a sharded index narrows to one shard"""
+        return self
+
+    def configure_storage(self, compressor: Optional[Any]) -> None:
+        """Store embeddings in an EmbeddingCompressor's compact dtype, if this backend can
+
+        Takes effect only while the index is empty; rows already written keep
+        the dtype they were written in. A reset returns to float32. Backends
+        holding only float32 ignore it.
+        """
+
+
+_chroma_clients: Dict[tuple, Any] = {}
+_chroma_clients_lock = threading.Lock()
+
+
+def _configure_http_session(client: Any) -> None:
+    """Apply CHROMA_HTTP_* pool limits and timeout to the HTTP client's session
+
+    Chroma's HTTP client keeps one httpx session with keep-alive connections
+    but creates it without a timeout and, before chromadb 1.x, without pool
+    settings. The session is replaced with a configured one.
+    """
+    import httpx
+
+    server = getattr(client, "_server", None)
+    if not isinstance(getattr(server, "_session", None), httpx.Client):
+        print("⚠️  This chromadb version does not use an httpx session; CHROMA_HTTP_* pool and timeout settings are not applied")
+        return
+    verify = server._settings.chroma_server_ssl_verify
+    server._session.close()
+    server._session = httpx.Client(
+        timeout=httpx.Timeout(settings.CHROMA_HTTP_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=settings.CHROMA_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.CHROMA_HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=settings.CHROMA_HTTP_KEEPALIVE_SECONDS
+        ),
+        **({"verify": verify} if verify is not None else {})
+    )
+
+
+def chroma_client(persist_directory: str) -> Any:
+    """The process-wide Chroma client for CHROMA_MODE, shared by every collection"""
+    import chromadb
+    from chromadb.config import Settings
+
+    key = (settings.CHROMA_MODE, persist_directory if settings.CHROMA_MODE == "embedded" else f"{settings.CHROMA_SERVER_HOST}:{settings.CHROMA_SERVER_PORT}")
+    with _chroma_clients_lock:
+        if key not in _chroma_clients:
+            if settings.CHROMA_MODE == "http":
+                client = chromadb.HttpClient(
+                    host=settings.CHROMA_SERVER_HOST,
+                    port=settings.CHROMA_SERVER_PORT,
+                    ssl=settings.CHROMA_SERVER_SSL,
+                    settings=Settings(anonymized_telemetry=False, allow_reset=True)
+                )
+                _configure_http_session(client)
+            elif settings.CHROMA_MODE == "embedded":
+                client = chromadb.PersistentClient(
+                    path=persist_directory,
+                    settings=Settings(
+                        anonymized_telemetry=False,
+                        allow_reset=True
+                    )
+                )
+            else:
+                raise ValueError(f"Unknown CHROMA_MODE {settings.CHROMA_MODE}. Expected 'embedded' or 'http'")
+            _chroma_clients[key] = client
+        return _chroma_clients[key]
+
+
+def _is_transient(error: Exception) -> bool:
+    """Connection failures and timeouts talking to a Chroma server"""
+    try:
+        import httpx
+        if isinstance(error, httpx.TransportError):
+            return True
+    except ImportError:
+        pass
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+class ChromaVectorIndex(VectorIndex):
+    """VectorIndex backed by a ChromaDB collection (HNSW, cosine space)
+
+    CHROMA_MODE selects an embedded persistent client under the persist
+    directory or a standalone Chroma server over HTTP. Against a server, calls
+    failing with a connection error or timeout are retried CHROMA_HTTP_RETRIES
+    times with exponential backoff; every operation is safe to repeat since
+    adds skip existing ids.
+    """
+
+    def __init__(self, persist_directory: str, name: str, metadata: Dict[str, Any]):
+        self.name = name
+        self.client = chroma_client(persist_directory)
+        self.retries = settings.CHROMA_HTTP_RETRIES if settings.CHROMA_MODE == "http" else 0
+        self.collection = self._call(
+            self.client.get_or_create_collection,
+            name=name,
+            metadata={"hnsw:space": "cosine", **metadata}
+        )
+
+    def _call(self, fn, *args, **kwargs):
+        for attempt in range(self.retries + 1):
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.retries or not _is_transient(e):
+                    raise
+                delay = settings.CHROMA_HTTP_RETRY_BACKOFF_SECONDS * (2 ** attempt)
+                print(f"⚠️  Chroma call {getattr(fn, '__name__', fn)} failed ({e}); retrying in {delay:.2f}s")
+                time.sleep(delay)
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return self.collection.metadata or {}
+
+    def add(self, ids, embeddings, documents, metadatas) -> None:
+        self._call(self.collection.add, ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def delete(self, ids: List[str]) -> None:
+        self._call(self.collection.delete, ids=ids)
+
+    def get(self, ids=None, limit=None, include=("metadatas", "documents"), offset=None, where=None) -> Dict[str, Any]:
+        return self._call(self.collection.get, ids=ids, limit=limit, offset=offset, where=where, include=list(include))
+
+    def query(self, query_embeddings, n_results, include=INCLUDE_DEFAULT) -> Dict[str, Any]:
+        return self._call(self.collection.query, query_embeddings=query_embeddings, n_results=n_results, include=list(include))
+
+    def count(self, where: Optional[Dict[str, Any]] = None) -> int:
+        if where is None:
+            return self._call(self.collection.count)
+        # Chroma has no filtered count; an id-only get filters in its metadata table
+        return len(self._call(self.collection.get, where=where, include=[])["ids"])
+
+    def reset(self, metadata: Optional[Dict[str, Any]] = None) -> None:
+        metadata = {k: v for k, v in self.metadata.items() if not k.startswith("hnsw:")} if metadata is None else metadata
+        self._call(self.client.delete_collection, name=self.name)
+        self.collection = self._call(
+            self.client.get_or_create_collection,
+            name=self.name,
+            metadata={"hnsw:space": "cosine", **metadata}
+        )
+
+
+class NumpyVectorIndex(VectorIndex):
+    """Exact cosine search over a memory-mapped matrix of L2-normalized vectors
+
+    Files under ``<persist_directory>/numpy_index/<name>/``:
+    - ``vectors.f32`` (or ``.f16`` / ``.i8``): append-only rows of vectors
+    - ``log.jsonl``: append-only record log; "add" lines hold the row, id,
+      document and metadata, "delete" lines tombstone an id
+    - ``meta.json``: dimension, storage dtype, int8 scales, index metadata
+      and a generation bumped whenever the files are rewritten
+    - ``index.lock``: flock serialising writers across processes
+
+    Several processes may share an index. Writers hold the lock exclusively,
+    catch up with the log first and number new rows from the vector file's
+    size. Readers stat the log and meta files before each call and, when
+    they changed, replay only the new log lines under a shared lock, or
+    reload everything after a compaction or reset.
+
+    Rows are float32 unless configure_storage selects the compressor's
+    float16 or int8 form; queries then dequantize QUERY_BLOCK_ROWS rows at a
+    time, so memory stays at the compact size.
+
+    Deletes only write a tombstone. Once tombstones make up
+    ``NUMPY_INDEX_COMPACT_RATIO`` of the rows, the files are rewritten
+    without them.
+    """
+
+    STORED_DTYPES = ("float32", "float16", "int8")
+    VECTOR_FILES = {"float32": "vectors.f32", "float16": "vectors.f16", "int8": "vectors.i8"}
+    LOG_FILE = "log.jsonl"
+    META_FILE = "meta.json"
+    LOCK_FILE = "index.lock"
+    QUERY_BLOCK_ROWS = 65536
+
+    def __init__(self, persist_directory: str, name: str, metadata: Dict[str, Any]):
+        self.name = name
+        self.directory = Path(persist_directory) / "numpy_index" / name
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.compact_ratio = settings.NUMPY_INDEX_COMPACT_RATIO
+        self._lock = threading.RLock()
+
+        self._lock_depth = 0
+        self._vectors: Optional[np.ndarray] = None
+        self._meta_key: Optional[tuple] = None
+        self._loaded_generation: Optional[int] = None
+        self._synced_state: Optional[tuple] = None
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            if not (self.directory / self.META_FILE).exists():
+                self.dim, self._metadata, self.generation = None, dict(metadata), 0
+                self.dtype, self.int8_scale = "float32", None
+                self._write_meta()
+            self._refresh()
+            # Only here and in writers, with the lock held, can a partial tail be a crash rather than a write in progress
+            self._drop_torn_tail()
+
+    @contextmanager
+    def _file_lock(self, mode: int) -> Iterator[None]:
+        """flock shared with other processes; callers hold self._lock, so nesting is by this thread"""
+        if self._lock_depth:
+            # A second flock from this process would wait on its own first one
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+            return
+        with open(self.directory / self.LOCK_FILE, "a") as lock_file:
+            fcntl.flock(lock_file, mode)
+            self._lock_depth = 1
+            try:
+                yield
+            finally:
+                self._lock_depth = 0
+
+    def _write_meta(self) -> None:
+        tmp_path = self.directory / f"{self.META_FILE}.tmp-{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "dim": self.dim,
+                "dtype": self.dtype,
+                "int8_scale": self.int8_scale.tolist() if self.int8_scale is not None else None,
+                "generation": self.generation,
+                "metadata": self._metadata
+            }, f)
+        os.replace(tmp_path, self.directory / self.META_FILE)
+
+    def _read_meta(self) -> None:
+        meta_path = self.directory / self.META_FILE
+        stat = meta_path.stat()
+        if (stat.st_ino, stat.st_mtime_ns) == self._meta_key:
+            return
+        with open(meta_path) as f:
+            meta = json.load(f)
+        self.dim: Optional[int] = meta["dim"]
+        self._metadata: Dict[str, Any] = meta["metadata"]
+        self.dtype: str = meta.get("dtype", "float32")
+        self.int8_scale: Optional[np.ndarray] = (
+            np.asarray(meta["int8_scale"], dtype=np.float32) if meta.get("int8_scale") is not None else None
+        )
+        self.generation: int = meta.get("generation", 0)
+        self._meta_key = (stat.st_ino, stat.st_mtime_ns)
+
+    def _disk_state(self) -> tuple:
+        meta = (self.directory / self.META_FILE).stat()
+        try:
+            log_size = (self.directory / self.LOG_FILE).stat().st_size
+        except FileNotFoundError:
+            log_size = -1
+        return meta.st_ino, meta.st_mtime_ns, log_size
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.directory / self.VECTOR_FILES[self.dtype]
+
+    @property
+    def _row_bytes(self) -> int:
+        return (self.dim or 0) * np.dtype(self.dtype).itemsize
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Normalized float32 rows in the stored dtype"""
+        if self.dtype == "float16":
+            return vectors.astype(np.float16)
+        if self.dtype == "int8":
+            return np.clip(np.rint(vectors / self.int8_scale), -127, 127).astype(np.int8)
+        return vectors
+
+    @staticmethod
+    def _decode(stored: np.ndarray, int8_scale: Optional[np.ndarray]) -> np.ndarray:
+        vectors = np.asarray(stored, dtype=np.float32)
+        return vectors * int8_scale if int8_scale is not None else vectors
+
+    def configure_storage(self, compressor: Optional[Any]) -> None:
+        dtype = compressor.dtype if compressor is not None else "float32"
+        int8_scale = np.asarray(compressor.int8_scale, dtype=np.float32) if dtype == "int8" else None
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._refresh()
+            if self._ids or (dtype == self.dtype and np.array_equal(int8_scale, self.int8_scale)):
+                return
+            self._vectors = None
+            for filename in self.VECTOR_FILES.values():
+                (self.directory / filename).unlink(missing_ok=True)
+            self.dtype, self.int8_scale = dtype, int8_scale
+            self.generation += 1
+            self._write_meta()
+            self._refresh()
+
+    def _refresh(self) -> None:
+        """Catch up with the files; callers hold the file lock, shared or exclusive"""
+        self._read_meta()
+        reloaded = self.generation != self._loaded_generation
+        if reloaded:
+            # Compacted, reset or restored: every row number may have changed
+            self._ids: List[str] = []
+            self._documents: List[str] = []
+            self._metadatas: List[Dict[str, Any]] = []
+            self._rows: Dict[str, int] = {}
+            self._alive = np.zeros(0, dtype=bool)
+            self._log_offset = 0
+            self._loaded_generation = self.generation
+
+        added, deleted = 0, []
+        log_path = self.directory / self.LOG_FILE
+        if log_path.exists():
+            with open(log_path, "rb") as f:
+                f.seek(self._log_offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # being written, or torn by a crash
+                    self._log_offset += len(line)
+                    entry = json.loads(line)
+                    if entry["op"] == "add":
+                        self._rows[entry["id"]] = len(self._ids)
+                        self._ids.append(entry["id"])
+                        self._documents.append(entry["document"])
+                        self._metadatas.append(entry["metadata"])
+                        added += 1
+                    elif entry["id"] in self._rows:
+                        deleted.append(self._rows.pop(entry["id"]))
+
+        if reloaded or added or deleted or self._vectors is None:
+            # A new array rather than an in-place update, so snapshots taken by readers stay consistent
+            alive = np.concatenate([self._alive, np.ones(added, dtype=bool)])
+            alive[deleted] = False
+            self._alive = alive
+            self._map_vectors()
+        self._synced_state = self._disk_state()
+
+    def _sync(self) -> None:
+        """Pick up writes from other processes; a stat of two files when nothing changed"""
+        if self._disk_state() != self._synced_state:
+            with self._lock, self._file_lock(fcntl.LOCK_SH):
+                self._refresh()
+
+    def _drop_torn_tail(self) -> None:
+        """Cut a partial log line and vector rows no log line references; needs the exclusive lock"""
+        log_path = self.directory / self.LOG_FILE
+        if log_path.exists() and log_path.stat().st_size > self._log_offset:
+            os.truncate(log_path, self._log_offset)
+        vectors_path = self._vectors_path
+        rows_bytes = len(self._ids) * self._row_bytes
+        if self.dim is not None and vectors_path.exists() and vectors_path.stat().st_size > rows_bytes:
+            os.truncate(vectors_path, rows_bytes)
+        self._synced_state = self._disk_state()
+
+    def _map_vectors(self) -> None:
+        rows = len(self._ids)
+        if rows == 0 or self.dim is None:
+            self._vectors = np.zeros((0, self.dim or 0), dtype=self.dtype)
+            return
+        # The file may already hold rows another process appended; map only those the log lists
+        self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode="r", shape=(rows, self.dim))
+
+    def _snapshot(self) -> tuple:
+        """Consistent view for readers; writers replace or append to these, never reorder them"""
+        self._sync()
+        with self._lock:
+            return self._vectors, self._alive, self._ids, self._documents, self._metadatas, self.int8_scale
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        self._sync()
+        return dict(self._metadata)
+
+    def add(self, ids, embeddings, documents, metadatas) -> None:
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._refresh()
+            keep, seen = [], set()
+            for i, record_id in enumerate(ids):
+                # Skip existing ids and repeats within the batch, keeping the first
+                if record_id not in self._rows and record_id not in seen:
+                    seen.add(record_id)
+                    keep.append(i)
+            if not keep:
+                return
+
+            vectors = np.asarray([embeddings[i] for i in keep], dtype=np.float32)
+            expected_dim = self.dim if self.dim is not None else (len(self.int8_scale) if self.int8_scale is not None else None)
+            if expected_dim is not None and vectors.shape[1] != expected_dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {expected_dim}")
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._write_meta()
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors /= np.where(norms == 0, 1.0, norms)
+
+            # Vectors first, then the log: a log line only ever references written rows
+            self._drop_torn_tail()
+            vectors_path = self._vectors_path
+            first_row = vectors_path.stat().st_size // self._row_bytes if vectors_path.exists() else 0
+            with open(vectors_path, "ab") as f:
+                f.write(self._encode(vectors).tobytes())
+            lines = [
+                json.dumps({
+                    "op": "add", "row": first_row + n, "id": ids[i],
+                    "document": documents[i], "metadata": metadatas[i]
+                })
+                for n, i in enumerate(keep)
+            ]
+            with open(self.directory / self.LOG_FILE, "a") as f:
+                f.write("\n".join(lines) + "\n")
+            self._refresh()
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._refresh()
+            lines = [json.dumps({"op": "delete", "id": record_id}) for record_id in dict.fromkeys(ids) if record_id in self._rows]
+            if not lines:
+                return
+            self._drop_torn_tail()
+            with open(self.directory / self.LOG_FILE, "a") as f:
+                f.write("\n".join(lines) + "\n")
+            self._refresh()
+
+            if len(self._ids) and 1 - self._alive.mean() >= self.compact_ratio:
+                self.compact()
+
+    def compact(self) -> None:
+        """Rewrite the vector file and log without tombstoned rows"""
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._refresh()
+            rows = np.flatnonzero(self._alive)
+            tmp_vectors = self._vectors_path.with_name(f"{self._vectors_path.name}.tmp")
+            tmp_log = self.directory / f"{self.LOG_FILE}.tmp"
+            with open(tmp_vectors, "wb") as f:
+                f.write(np.ascontiguousarray(self._vectors[rows]).tobytes())
+            with open(tmp_log, "w") as f:
+                for new_row, row in enumerate(rows):
+                    f.write(json.dumps({
+                        "op": "add", "row": new_row, "id": self._ids[row],
+                        "document": self._documents[row], "metadata": self._metadatas[row]
+                    }) + "\n")
+            # Release the old mapping before replacing the file underneath it
+            self._vectors = None
+            os.replace(tmp_vectors, self._vectors_path)
+            os.replace(tmp_log, self.directory / self.LOG_FILE)
+            # Readers holding the old generation reload from scratch
+            self.generation += 1
+            self._write_meta()
+            self._refresh()
+
+    @staticmethod
+    def _records(snapshot: tuple, rows: Sequence[int], include: Sequence[str]) -> Dict[str, Any]:
+        vectors, _, ids, documents, metadatas, int8_scale = snapshot
+        rows = list(rows)
+        return {
+            "ids": [ids[row] for row in rows],
+            "documents": [documents[row] for row in rows] if "documents" in include else None,
+            "metadatas": [metadatas[row] for row in rows] if "metadatas" in include else None,
+            "embeddings": NumpyVectorIndex._decode(vectors[rows], int8_scale) if "embeddings" in include else None,
+        }
+
+    def get(self, ids=None, limit=None, include=("metadatas", "documents"), offset=None, where=None) -> Dict[str, Any]:
+        self._sync()
+        with self._lock:
+            if ids is not None:
+                rows = [self._rows[record_id] for record_id in ids if record_id in self._rows]
+            else:
+                rows = np.flatnonzero(self._alive)
+            if where:
+                rows = [row for row in rows if self._matches(row, where)]
+            start = offset or 0
+            rows = rows[start:start + limit] if limit is not None else rows[start:]
+            return self._records(self._snapshot(), rows, include)
+
+    def query(self, query_embeddings, n_results, include=INCLUDE_DEFAULT) -> Dict[str, Any]:
+        snapshot = self._snapshot()
+        vectors, alive, int8_scale = snapshot[0], snapshot[1], snapshot[5]
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries /= np.where(norms == 0, 1.0, norms)
+
+        result: Dict[str, List[Any]] = {"ids": [], "distances": [], "documents": [], "metadatas": [], "embeddings": []}
+        n = min(n_results, int(alive.sum()))
+        if n == 0:
+            for _ in queries:
+                for key in result:
+                    result[key].append([])
+            return result
+
+        if vectors.dtype == np.float32:
+            # One matmul scores every query against every row
+            similarities = queries @ vectors.T
+        else:
+            # q . (codes * scale) == (q * scale) . codes, so int8 rows only need a cast per block
+            scaled = queries * int8_scale if int8_scale is not None else queries
+            similarities = np.empty((len(queries), len(vectors)), dtype=np.float32)
+            for start in range(0, len(vectors), self.QUERY_BLOCK_ROWS):
+                block = np.asarray(vectors[start:start + self.QUERY_BLOCK_ROWS], dtype=np.float32)
+                similarities[:, start:start + len(block)] = scaled @ block.T
+        similarities[:, ~alive] = -np.inf
+        top = np.argpartition(-similarities, n - 1, axis=1)[:, :n]
+        for query_index, candidates in enumerate(top):
+            rows = candidates[np.argsort(-similarities[query_index, candidates])]
+            records = self._records(snapshot, rows, include)
+            for key in ("ids", "documents", "metadatas", "embeddings"):
+                result[key].append(records[key])
+            result["distances"].append((1.0 - similarities[query_index, rows]).tolist())
+        return result
+
+    def count(self, where: Optional[Dict[str, Any]] = None) -> int:
+        self._sync()
+        with self._lock:
+            if where is None:
+                return int(self._alive.sum())
+            return sum(1 for row in np.flatnonzero(self._alive) if self._matches(row, where))
+
+    def _matches(self, row: int, where: Dict[str, Any]) -> bool:
+        metadata = self._metadatas[row]
+        return all(metadata.get(key) == value for key, value in where.items())
+
+    def reset(self, metadata: Optional[Dict[str, Any]] = None) -> None:
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._refresh()
+            self._vectors = None
+            for filename in (*self.VECTOR_FILES.values(), self.LOG_FILE):
+                path = self.directory / filename
+                if path.exists():
+                    path.unlink()
+            self.dim = None
+            self.dtype, self.int8_scale = "float32", None
+            if metadata is not None:
+                self._metadata = dict(metadata)
+            self.generation += 1
+            self._write_meta()
+            self._refresh()
+
+
+VECTOR_INDEX_BACKENDS = {
+    "chroma": ChromaVectorIndex,
+    "numpy": NumpyVectorIndex,
+}
+
+
+def create_vector_index(
+    persist_directory: str,
+    name: str,
+    metadata: Dict[str, Any],
+    backend: Optional[str] = None,
+    sharding: Optional[str] = None
+) -> VectorIndex:
+    """Create the index selected by VECTOR_INDEX_BACKEND, sharded as VECTOR_INDEX_SHARDING says"""
+    sharding = sharding or settings.VECTOR_INDEX_SHARDING
+    if sharding != "none":
+        # Imported lazily: the sharded index builds its shards through this function
+        from app.rag.sharded_index import ShardedVectorIndex
+        return ShardedVectorIndex(persist_directory, name, metadata, backend=backend, mode=sharding)
+    backend = backend or settings.VECTOR_INDEX_BACKEND
+    if backend not in VECTOR_INDEX_BACKENDS:
+        raise ValueError(f"Unknown vector index backend {backend}. Expected one of {list(VECTOR_INDEX_BACKENDS)}")
+    return VECTOR_INDEX_BACKENDS[backend](persist_directory, name, metadata)
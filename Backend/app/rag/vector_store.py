@@ -1,115 +1,328 @@
+import threading
+import time
 import uuid
-import chromadb
+from datetime import datetime
+from pathlib import Path
 import numpy as np
-import torch
 from typing import List, Dict, Any, Optional, Union
-from chromadb.config import Settings
-from transformers import CLIPProcessor, CLIPModel
 from PIL import Image, ImageFile
 
 
 from app.models import Product, ProductImage
 from app.config import settings
-from chromadb.utils.embedding_functions import OpenCLIPEmbeddingFunction
+from app.metrics import EMBEDDING_SECONDS, RERANK_SECONDS, VECTOR_DB_SECONDS, timed
+from app.rag.active_collection import (
+    initialize_active_collection, read_active_collection, versioned_collection_name, write_active_collection
+)
+from app.rag.compression import (
+    EmbeddingCompressor, collection_compressor_path, compression_label, load_configured_compressor
+)
+from app.rag.migration import fingerprint_records, next_collection_version, unfinished_migrations
+from app.rag.rerank import maximal_marginal_relevance
+from app.rag.sharded_index import ShardedVectorIndex, normalize_category
+from app.rag.vector_index import VectorIndex, create_vector_index
+from app.tracing import traced
+
+
+def create_embedder(model_id: Optional[str] = None) -> Any:
+    """Create the embedder selected by EMBEDDING_BACKEND for a model"""
+    # Imported lazily so server-backed workers never load torch or CLIP
+    if settings.EMBEDDING_BACKEND == "server":
+        from app.rag.embedding_client import EmbeddingClient
+        client = EmbeddingClient()
+        if model_id and client.model_id != model_id:
+            raise ValueError(f"The embedding server serves {client.model_id}, not {model_id}; restart it with that model")
+        return client
+
+    from app.rag.embeddings import ClipEmbedder
+    return ClipEmbedder(model_id)
+
+
+class _ServingState:
+    """The collection serving traffic together with the embedder and compressor matching it
+
+    Replaced as a whole when the active collection changes, so a request
+    never pairs one model's query embedding with another model's index.
+    """
+
+    def __init__(
+        self,
+        collection_name: str,
+        model_id: str,
+        index: VectorIndex,
+        embedder: Optional[Any],
+        compressor: Optional[EmbeddingCompressor]
+    ):
+        self.collection_name = collection_name
+        self.model_id = model_id
+        self.index = index
+        self.embedder = embedder
+        self.compressor = compressor
 
 
 class ProductVectorStore:
-    """ChromaDB-based vector store for product search and RAG"""
+    """Vector store for product search and RAG over a pluggable VectorIndex
+
+    Serves the collection named by the active collection pointer (see
+    app.rag.active_collection). When a migration swaps the pointer, the store
+    loads the new model in the background and switches over once it is ready.
+    """
     
-    def __init__(self):
-        # Initialize ChromaDB client
-        self.client = chromadb.PersistentClient(
-            path="./chroma_db",
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True
-            )
-        )
-        
-        model_id = "openai/clip-vit-large-patch14-336"
-        # Initialize CLIP embeddings for multi-modal
-        self.clip_model = CLIPModel.from_pretrained(model_id)
-        self.clip_processor = CLIPProcessor.from_pretrained(model_id)
-        
-        # Create or get collections
-        self.product_collection_name = "products_multimodal"
+    def __init__(
+        self,
+        embedder: Optional[Any] = None,
+        persist_directory: Optional[str] = None,
+        load_embedder: bool = True,
+        index_backend: Optional[str] = None,
+        index_sharding: Optional[str] = None
+    ):
+        self.persist_directory = persist_directory or settings.CHROMA_PERSIST_DIR
+        self.index_backend = index_backend
+        self.index_sharding = index_sharding
         
-        self.product_collection = self.client.get_or_create_collection(
-            name=self.product_collection_name,
-            metadata={"hnsw:space": "cosine"}
+        # Any object exposing get_text_embedding / get_image_embedding works,
+        # which lets benchmarks swap CLIP for a deterministic fake. Admin tools
+        # that never embed pass load_embedder=False to skip loading the model.
+        self._fixed_embedder = embedder
+        self._load_embedder = load_embedder
+        self._switch_lock = threading.Lock()
+        self._next_active_check = time.monotonic() + settings.ACTIVE_COLLECTION_CHECK_SECONDS
+        # Stats too slow for the request path: (bytes on disk, measured at, image records, collection)
+        self._index_size: Optional[tuple] = None
+        self._index_size_lock = threading.Lock()
+
+        # A new, empty store starts on the configured model (or the injected embedder's)
+        model_id = getattr(embedder, "model_id", None) or settings.CLIP_MODEL_NAME
+        active = initialize_active_collection(
+            self.persist_directory, model_id, backend=index_backend, sharding=index_sharding
         )
+        if model_id != active["model_id"]:
+            print(f"⚠️  The configured model is {model_id} but the active collection {active['collection']} "
+                  f"was embedded with {active['model_id']}; serving {active['model_id']} until "
+                  f"`python -m app.rag.migration start` migrates it")
+        self._serving = self._open_serving(active)
 
-    def get_text_embedding(self, text):
-        inputs = self.clip_processor(text=[text], return_tensors="pt", padding=True, truncation=True)
-        with torch.no_grad():
-            emb = self.clip_model.get_text_features(**inputs)
-        return emb[0].cpu().numpy()
+    def _open_serving(self, active: Dict[str, Any], current: Optional[_ServingState] = None) -> _ServingState:
+        """Open a collection and prepare the embedder and compressor that match it"""
+        model_id = active["model_id"]
+        if current is not None and current.model_id == model_id and current.embedder is not None:
+            embedder = current.embedder
+        elif self._fixed_embedder is not None:
+            fixed_model = getattr(self._fixed_embedder, "model_id", model_id)
+            if fixed_model != model_id:
+                raise ValueError(f"Collection {active['collection']} needs {model_id} but the store was given {fixed_model}")
+            embedder = self._fixed_embedder
+        elif self._load_embedder:
+            embedder = create_embedder(model_id)
+        else:
+            embedder = None
 
-    def get_image_embedding(self, image_path:Optional[str] = '', image: Optional[ImageFile.ImageFile] = None):
-        if(image is None):
-            image = Image.open(image_path).convert("RGB")
-        
-        inputs = self.clip_processor(images=image, return_tensors="pt")
-        with torch.no_grad():
-            emb = self.clip_model.get_image_features(**inputs)
-        return emb[0].cpu().numpy()
+        # Create or open the index (VECTOR_INDEX_BACKEND: "chroma" or "numpy", VECTOR_INDEX_SHARDING)
+        configured = load_configured_compressor(active["collection"], self.persist_directory)
+        index = create_vector_index(
+            self.persist_directory,
+            active["collection"],
+            {"embedding_compression": compression_label(configured), "embedding_model": model_id},
+            backend=self.index_backend,
+            sharding=self.index_sharding
+        )
+
+        # Applied identically to stored and query embeddings
+        compressor = configured
+        stored = index.metadata.get("embedding_compression", "none")
+        if index.count() and stored != compression_label(configured):
+            print(f"⚠️  Collection {active['collection']} embeddings use compression '{stored}' but "
+                  f"'{compression_label(configured)}' is configured; run `python -m app.rag.compression fit --apply` to re-index")
+            if stored == "none":
+                compressor = None
+        # An empty index (numpy backend) then stores rows in the compressor's float16/int8 form
+        index.configure_storage(compressor)
+
+        return _ServingState(active["collection"], model_id, index, embedder, compressor)
+
+    def _refresh_active_collection(self) -> None:
+        """Pick up a collection swap; checked at most every ACTIVE_COLLECTION_CHECK_SECONDS"""
+        now = time.monotonic()
+        if now < self._next_active_check:
+            return
+        self._next_active_check = now + settings.ACTIVE_COLLECTION_CHECK_SECONDS
+
+        active = read_active_collection(self.persist_directory)
+        if active["collection"] == self._serving.collection_name or not self._switch_lock.acquire(blocking=False):
+            return
+        # Loading a new model takes a while; keep serving the old collection meanwhile
+        threading.Thread(target=self._switch_to, args=(active,), name="collection-switch", daemon=True).start()
+
+    def _switch_to(self, active: Dict[str, Any]) -> None:
+        try:
+            self._serving = self._open_serving(active, current=self._serving)
+            print(f"🔀 Now serving collection {active['collection']} ({active['model_id']})")
+        except Exception as e:
+            # Retried at the next check
+            print(f"⚠️  Could not switch to collection {active['collection']}: {e}")
+        finally:
+            self._switch_lock.release()
+
+    @property
+    def product_collection(self) -> VectorIndex:
+        return self._serving.index
+
+    @property
+    def product_collection_name(self) -> str:
+        return self._serving.collection_name
+
+    @property
+    def model_id(self) -> str:
+        return self._serving.model_id
+
+    @property
+    def compressor(self) -> Optional[EmbeddingCompressor]:
+        return self._serving.compressor
+
+    @property
+    def embedder(self) -> Any:
+        return self._embedder_for(self._serving)
+
+    def _embedder_for(self, serving: _ServingState) -> Any:
+        if serving.embedder is None:
+            serving.embedder = create_embedder(serving.model_id)
+        return serving.embedder
+
+    def _compression_label(self) -> str:
+        return compression_label(self.compressor)
+
+    def _collection_metadata(self, serving: Optional[_ServingState] = None) -> Dict[str, Any]:
+        serving = serving or self._serving
+        return {"embedding_compression": compression_label(serving.compressor), "embedding_model": serving.model_id}
+
+    def _prepare_embeddings(self, embeddings: List[np.ndarray], serving: Optional[_ServingState] = None) -> List[List[float]]:
+        """Apply the serving collection's compression so stored and query vectors match"""
+        compressor = (serving or self._serving).compressor
+        if compressor is None:
+            return [np.asarray(embedding, dtype=np.float32).tolist() for embedding in embeddings]
+        return compressor.transform(np.stack(embeddings)).tolist()
+
+    @traced("vector_store.text_embedding")
+    @timed(EMBEDDING_SECONDS.labels(modality="text"), error_stage="text_embedding")
+    def get_text_embedding(self, text, serving: Optional[_ServingState] = None):
+        return self._embedder_for(serving or self._serving).get_text_embedding(text)
+
+    @traced("vector_store.image_embedding")
+    @timed(EMBEDDING_SECONDS.labels(modality="image"), error_stage="image_embedding")
+    def get_image_embedding(
+        self,
+        image_path: Optional[str] = '',
+        image: Optional[ImageFile.ImageFile] = None,
+        serving: Optional[_ServingState] = None
+    ):
+        return self._embedder_for(serving or self._serving).get_image_embedding(image_path=image_path, image=image)
     
+    @traced("vector_store.text_embeddings")
+    @timed(EMBEDDING_SECONDS.labels(modality="text_batch"), error_stage="text_embedding")
+    def get_text_embeddings(self, texts: List[str], serving: Optional[_ServingState] = None) -> List[np.ndarray]:
+        embedder = self._embedder_for(serving or self._serving)
+        if hasattr(embedder, "get_text_embeddings"):
+            return list(embedder.get_text_embeddings(texts))
+        return [embedder.get_text_embedding(text) for text in texts]
+
+    @traced("vector_store.image_embeddings")
+    @timed(EMBEDDING_SECONDS.labels(modality="image_batch"), error_stage="image_embedding")
+    def get_image_embeddings(
+        self,
+        image_paths: Optional[List[str]] = None,
+        images: Optional[List[Image.Image]] = None,
+        serving: Optional[_ServingState] = None
+    ) -> List[np.ndarray]:
+        embedder = self._embedder_for(serving or self._serving)
+        if images is None and hasattr(embedder, "get_image_embeddings_from_paths"):
+            # Lets the embedding server decode the files instead of receiving full-size pixels
+            return list(embedder.get_image_embeddings_from_paths(image_paths))
+        if not hasattr(embedder, "get_image_embeddings"):
+            if images is not None:
+                return [embedder.get_image_embedding(image=image) for image in images]
+            return [embedder.get_image_embedding(image_path=image_path) for image_path in image_paths]
+        if images is None:
+            images = [Image.open(image_path).convert("RGB") for image_path in image_paths]
+        return list(embedder.get_image_embeddings(images))
+
+    @traced("vector_store.add_product")
     def add_product(self, product: Product) -> str:
         """Add a product to the vector store with multi-modal support"""
-        # Generate product ID if not provided
-        if not product.id:
-            product.id = str(uuid.uuid4())
+        return self.add_products([product])[0]
 
-        ids=[product.id]
-        documents= []
-        embeddings= []
-        metadatas= []
-        
-        # Create document embeddings for text search
-        content = f"Title: {product.title}\nDescription: {product.description}"
-        if product.category:
-            content += f"\nCategory: {product.category}"
-        if product.tags:
-            content += f"\nTags: {', '.join(product.tags)}"
-        content += f"\nPrice: ${product.price}"
-
-        documents.append(content)
-        embeddings.append(self.get_text_embedding(content).tolist())
-
-        # Create metadata
-        metadata = {
-            "product_id": product.id,
-            "title": product.title,
-            "description": product.description,
-            "price": str(product.price),
-            "category": product.category or "",
-            "images": ",".join([image.file_path for image in product.images]) if product.images else "",
-            "tags": ",".join(product.tags) if product.tags else "",
-            "created_at": product.created_at.isoformat() if product.created_at else "",
-            "updated_at": product.updated_at.isoformat() if product.updated_at else ""
-        }
-
-        metadatas.append(metadata)
-
-        #  Create image embeddings for image search
-        for image in product.images:
-            image_embedding = self.get_image_embedding(image.file_path)
-            ids.append(f"{product.id}_{image.id}")
-            documents.append(f"Image for product: {product.id} and path: {image.file_path}")
-            embeddings.append(image_embedding.tolist())
-            metadatas.append(metadata)
-        
-        # Add text content to text collection
-        self.product_collection.add(
-            embeddings=embeddings,
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
-        )
+    @traced("vector_store.add_products")
+    def add_products(self, products: List[Product]) -> List[str]:
+        """Add several products, embedding all their texts and all their images in one batch each"""
+        self._refresh_active_collection()
+        serving = self._serving
 
-        print(f"Added product {product.id} to vector store")
-        
-        return product.id
+        ids = []
+        text_documents = []
+        text_metadatas = []
+        image_ids = []
+        image_documents = []
+        image_metadatas = []
+        image_paths = []
+        for product in products:
+            # Generate product ID if not provided
+            if not product.id:
+                product.id = str(uuid.uuid4())
+
+            # Create document embeddings for text search
+            content = f"Title: {product.title}\nDescription: {product.description}"
+            if product.category:
+                content += f"\nCategory: {product.category}"
+            if product.tags:
+                content += f"\nTags: {', '.join(product.tags)}"
+            content += f"\nPrice: ${product.price}"
+
+            # Create metadata
+            metadata = {
+                "product_id": product.id,
+                "title": product.title,
+                "description": product.description,
+                "price": str(product.price),
+                "category": product.category or "",
+                "images": ",".join([image.file_path for image in product.images]) if product.images else "",
+                "tags": ",".join(product.tags) if product.tags else "",
+                "created_at": product.created_at.isoformat() if product.created_at else "",
+                "updated_at": product.updated_at.isoformat() if product.updated_at else ""
+            }
+
+            ids.append(product.id)
+            text_documents.append(content)
+            text_metadatas.append({**metadata, "modality": "text"})
+
+            #  Create image embeddings for image search
+            seen_image_ids = set()
+            for image in product.images:
+                # Content-addressed uploads share ids, so embed each image once
+                if image.id in seen_image_ids:
+                    continue
+                seen_image_ids.add(image.id)
+                image_ids.append(f"{product.id}_{image.id}")
+                image_documents.append(f"Image for product: {product.id} and path: {image.file_path}")
+                # The image path lets migrations re-embed the image without parsing the document
+                image_metadatas.append({**metadata, "modality": "image", "image_path": image.file_path})
+                image_paths.append(image.file_path)
+
+        embeddings = self.get_text_embeddings(text_documents, serving=serving)
+        if image_paths:
+            embeddings += self.get_image_embeddings(image_paths=image_paths, serving=serving)
+
+        # Add text and image documents in one write
+        with VECTOR_DB_SECONDS.labels(operation="add").time():
+            serving.index.add(
+                embeddings=self._prepare_embeddings(embeddings, serving=serving),
+                documents=text_documents + image_documents,
+                metadatas=text_metadatas + image_metadatas,
+                ids=ids + image_ids
+            )
+
+        for product_id in ids:
+            print(f"Added product {product_id} to vector store")
+
+        return ids
     
     def update_product(self, product: Product) -> bool:
         """Update a product in the vector store"""
@@ -124,95 +337,253 @@ class ProductVectorStore:
         return True
     
     def delete_product(self, product_id: str) -> bool:
-        """Delete a product from the vector store"""
+        """Delete a product's text record and all of its image records from the vector store"""
         success = True
+        self._refresh_active_collection()
         
         try:            # Delete from product collection
-            self.product_collection.delete(ids=[product_id])
+            with VECTOR_DB_SECONDS.labels(operation="delete").time():
+                # Image records are "<product_id>_<image_id>"; find them by their product_id metadata
+                image_ids = self.product_collection.get(where={"product_id": product_id}, include=())["ids"]
+                self.product_collection.delete(ids=list(dict.fromkeys([product_id, *image_ids])))
 
             return success
         except Exception as e:
             print(f"Error deleting product {product_id}: {e}")
             return False
     
+    @traced("vector_store.search_products")
     def search_products(
         self, 
         query: Optional[str] = None,
         image_query_path: Optional[str] = None,
+        image_query: Optional[Image.Image] = None,
         category: Optional[str] = None,
         max_price: Optional[float] = None,
         min_price: Optional[float] = None,
-        limit: int = 10
+        limit: int = 10,
+        mmr_lambda: Optional[float] = None,
+        mmr_pool_size: Optional[int] = None
     ) -> List[Dict[str, Any]]:
-        """Search products using semantic similarity with multi-modal support"""
+        """Search products using semantic similarity with multi-modal support
+
+        Results are diversified with Maximal Marginal Relevance over a pool of
+        the ``mmr_pool_size`` closest products; ``mmr_lambda=1`` keeps pure
+        relevance order.
+        """
+        self._refresh_active_collection()
+        serving = self._serving
 
         embeddings= []
 
         if(query):
-            embeddings.append(self.get_text_embedding(query).tolist())
+            embeddings.append(self.get_text_embedding(query, serving=serving))
         
         if(image_query_path):
-            embeddings.append(self.get_image_embedding(image_query_path).tolist())
+            embeddings.append(self.get_image_embedding(image_query_path, serving=serving))
+
+        if(image_query is not None):
+            embeddings.append(self.get_image_embedding(image=image_query, serving=serving))
         
         if not embeddings:
             return [];
 
+        pool_size = self._pool_size(limit, mmr_pool_size)
 
-        results = self.product_collection.query(
-            query_embeddings=embeddings,
-            n_results=limit * 2
+        # Over-fetch: each product has a text and an image document, and MMR needs a pool to choose from.
+        # A category-sharded index answers a category search from that category's shard alone.
+        with VECTOR_DB_SECONDS.labels(operation="query").time():
+            results = serving.index.scoped(category).query(
+                query_embeddings=self._prepare_embeddings(embeddings, serving=serving),
+                n_results=pool_size * 2
+            )
+
+        return self._rank_hits(
+            serving, results['distances'], results['metadatas'], limit, pool_size,
+            category=category, max_price=max_price, min_price=min_price, mmr_lambda=mmr_lambda
         )
 
-        product_metadatas = []
-        # if(len(results['distances']) > 0):
-        #     for query_dist, query_meta in zip(results['distances'], results['metadatas'][0]):
-        #         if(np.mean(query_dist) < settings.AGENT_SIMILARITY_DISTANCE):
-        #             product_metadatas.append(query_meta)
+    @traced("vector_store.search_products_batch")
+    def search_products_batch(self, searches: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Run many searches with one text pass, one image pass and one index query
 
-        for query_dist, query_meta in zip(results['distances'], results['metadatas']):
-            for dist, meta in zip(query_dist, query_meta):
-                if dist < settings.AGENT_SIMILARITY_DISTANCE:
-                    product_metadatas.append(meta)
+        With a category-sharded index, searches are grouped by the shard their
+        category scopes them to, with one query per group.
 
+        Each search is a dict with the keyword arguments of ``search_products``:
+        ``query``, ``image_query`` (a PIL image), ``category``, ``max_price``,
+        ``min_price``, ``limit``, ``mmr_lambda`` and ``mmr_pool_size``. Results
+        are returned in the same order; a search without a query or image gets
+        an empty list.
+        """
+        self._refresh_active_collection()
+        serving = self._serving
 
-        products = []
+        texts, images = [], []
+        # Rows of the combined query each search owns, as ("text" | "image", position)
+        owned_rows: List[List[tuple]] = []
+        for search in searches:
+            rows = []
+            if search.get("query"):
+                rows.append(("text", len(texts)))
+                texts.append(search["query"])
+            if search.get("image_query") is not None:
+                rows.append(("image", len(images)))
+                images.append(search["image_query"])
+            owned_rows.append(rows)
 
-        for metadata in product_metadatas:                            
-                # Convert price back to float for filtering
-                try:
-                    price = float(metadata.get("price", "0"))
-                except ValueError:
-                    price = 0.0
-                
-                # Apply price filters
-                if max_price is not None and price > max_price:
-                    continue
-                if min_price is not None and price < min_price:
+        text_embeddings = self.get_text_embeddings(texts, serving=serving) if texts else []
+        image_embeddings = self.get_image_embeddings(images=images, serving=serving) if images else []
+        if not text_embeddings and not image_embeddings:
+            return [[] for _ in searches]
+
+        prepared = self._prepare_embeddings(text_embeddings + image_embeddings, serving=serving)
+        pool_sizes = [self._pool_size(search.get("limit") or 10, search.get("mmr_pool_size")) for search in searches]
+        positions = [
+            [position if kind == "text" else len(texts) + position for kind, position in rows]
+            for rows in owned_rows
+        ]
+
+        # Searches scoped to the same index share one query
+        groups: Dict[int, tuple] = {}
+        for i, search in enumerate(searches):
+            if positions[i]:
+                index = serving.index.scoped(search.get("category"))
+                groups.setdefault(id(index), (index, []))[1].append(i)
+
+        # Distances and metadatas of every query embedding, by its row in prepared
+        hits: Dict[int, tuple] = {}
+        for index, members in groups.values():
+            group_rows = [row for i in members for row in positions[i]]
+            # Every search gets the pool its own limit needs, so query for the largest
+            with VECTOR_DB_SECONDS.labels(operation="query").time():
+                results = index.query(
+                    query_embeddings=[prepared[row] for row in group_rows],
+                    n_results=max(pool_sizes[i] for i in members) * 2
+                )
+            for j, row in enumerate(group_rows):
+                hits[row] = (results['distances'][j], results['metadatas'][j])
+
+        ranked = []
+        for i, search in enumerate(searches):
+            if not positions[i]:
+                ranked.append([])
+                continue
+            pool_size = pool_sizes[i]
+            ranked.append(self._rank_hits(
+                serving,
+                [hits[row][0][:pool_size * 2] for row in positions[i]],
+                [hits[row][1][:pool_size * 2] for row in positions[i]],
+                search.get("limit") or 10,
+                pool_size,
+                category=search.get("category"),
+                max_price=search.get("max_price"),
+                min_price=search.get("min_price"),
+                mmr_lambda=search.get("mmr_lambda")
+            ))
+        return ranked
+
+    @staticmethod
+    def _pool_size(limit: int, mmr_pool_size: Optional[int]) -> int:
+        return max(limit, settings.SEARCH_MMR_POOL_SIZE if mmr_pool_size is None else mmr_pool_size)
+
+    def _rank_hits(
+        self,
+        serving: _ServingState,
+        distances: List[List[float]],
+        metadatas: List[List[Dict[str, Any]]],
+        limit: int,
+        pool_size: int,
+        category: Optional[str] = None,
+        max_price: Optional[float] = None,
+        min_price: Optional[float] = None,
+        mmr_lambda: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Turn the index hits of one search's query embeddings into its product results"""
+        mmr_lambda = settings.SEARCH_MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+        wanted_category = normalize_category(category) if category else None
+
+        # Collapse text and image hits to one candidate per product, keeping the closest
+        best: Dict[str, Any] = {}
+        for query_dist, query_meta in zip(distances, metadatas):
+            for dist, meta in zip(query_dist, query_meta):
+                if dist >= settings.AGENT_SIMILARITY_DISTANCE:
                     continue
-                
-                # Convert back to Product-like structure
-                product_data = {
-                    "id": metadata.get("product_id"),
-                    "title": metadata.get("title"),
-                    "description": metadata.get("description"),
-                    "price": price,
-                    "category": metadata.get("category"),
-                    "tags": metadata.get("tags", "").split(",") if metadata.get("tags") else [],
-                    "created_at": metadata.get("created_at"),
-                    "updated_at": metadata.get("updated_at")
-                }
-                
-                products.append(product_data)
+                product_id = meta.get("product_id")
+                if product_id not in best or dist < best[product_id][0]:
+                    best[product_id] = (dist, meta)
+
+        candidates = []
+        for dist, metadata in sorted(best.values(), key=lambda item: item[0]):
+            # Convert price back to float for filtering
+            try:
+                price = float(metadata.get("price", "0"))
+            except ValueError:
+                price = 0.0
+            
+            # Apply category and price filters
+            if wanted_category and normalize_category(metadata.get("category")) != wanted_category:
+                continue
+            if max_price is not None and price > max_price:
+                continue
+            if min_price is not None and price < min_price:
+                continue
+            candidates.append((dist, price, metadata))
+        candidates = candidates[:pool_size]
+
+        if mmr_lambda < 1.0 and len(candidates) > limit:
+            candidates = self._rerank_mmr(serving.index, candidates, limit, mmr_lambda)
+
+        products = []
+        for _, price, metadata in candidates[:limit]:
+            # Convert back to Product-like structure
+            products.append({
+                "id": metadata.get("product_id"),
+                "title": metadata.get("title"),
+                "description": metadata.get("description"),
+                "price": price,
+                "category": metadata.get("category"),
+                "tags": metadata.get("tags", "").split(",") if metadata.get("tags") else [],
+                "created_at": metadata.get("created_at"),
+                "updated_at": metadata.get("updated_at")
+            })
         
-        return products[:limit]
+        return products
+
+    @traced("vector_store.mmr_rerank")
+    def _rerank_mmr(self, index: VectorIndex, candidates: List[tuple], limit: int, mmr_lambda: float) -> List[tuple]:
+        """Reorder (distance, price, metadata) candidates with Maximal Marginal Relevance
+
+        Redundancy is measured between the products' stored text embeddings, so
+        a text hit and an image hit are compared in the same space.
+        """
+        with VECTOR_DB_SECONDS.labels(operation="get").time():
+            stored = index.get(
+                ids=[metadata.get("product_id") for _, _, metadata in candidates],
+                include=["embeddings"]
+            )
+        with RERANK_SECONDS.labels(method="mmr").time():
+            vectors = dict(zip(stored["ids"], stored["embeddings"]))
+            # Products without a stored text embedding cannot be compared; keep them in relevance order
+            comparable = [c for c in candidates if c[2].get("product_id") in vectors]
+            if len(comparable) <= limit:
+                return candidates
+
+            relevance = np.array([1.0 - dist for dist, _, _ in comparable], dtype=np.float32)
+            matrix = np.stack([np.asarray(vectors[c[2].get("product_id")], dtype=np.float32) for c in comparable])
+            order = maximal_marginal_relevance(relevance, matrix, limit, mmr_lambda)
+            return [comparable[i] for i in order]
         
     
+    @traced("vector_store.get_product_by_id")
     def get_product_by_id(self, product_id: str) -> Optional[Dict[str, Any]]:
         """Get a specific product by ID"""
+        self._refresh_active_collection()
         try:
-            results = self.product_collection.get(
-                ids=[product_id]
-            )
+            with VECTOR_DB_SECONDS.labels(operation="get").time():
+                results = self.product_collection.get(
+                    ids=[product_id]
+                )
             
             if results['metadatas'] and results['metadatas'][0]:
                 metadata = results['metadatas'][0]
@@ -233,13 +604,18 @@ class ProductVectorStore:
             print(f"Error getting product by id: {e}")
             return None
     
+    @traced("vector_store.get_all_products")
     def get_all_products(self, limit: int = 100) -> List[Dict[str, Any]]:
         """Get all products from the vector store"""
+        self._refresh_active_collection()
         try:
-            results = self.product_collection.get(
-                limit=limit,
-                include=["metadatas"]
-            )
+            with VECTOR_DB_SECONDS.labels(operation="get").time():
+                # One text record per product; its image records carry the same metadata
+                results = self.product_collection.get(
+                    limit=limit,
+                    include=["metadatas"],
+                    where={"modality": "text"}
+                )
             
             products = []
             for metadata in results['metadatas']:
@@ -264,13 +640,8 @@ class ProductVectorStore:
     def reset_vector_store(self) -> bool:
         """Reset the entire vector store by deleting all collections"""
         try:
-            # Delete text collection
-            self.client.delete_collection(name=self.product_collection_name)
-
-            self.product_collection = self.client.get_or_create_collection(
-                name=self.product_collection_name,
-                metadata={"hnsw:space": "cosine"}
-            )
+            self.product_collection.reset(self._collection_metadata())
+            self.product_collection.configure_storage(self.compressor)
             
             print(f"Successfully reset vector store: {self.product_collection_name}")
             return True
@@ -279,15 +650,171 @@ class ProductVectorStore:
             print(f"Error resetting vector store: {e}")
             return False
     
+    def get_full_precision_records(self, reembed: bool = False, batch_size: int = 256) -> Dict[str, Any]:
+        """Every record with its embedding as a float32 matrix, in collection order
+
+        Stored embeddings are only full precision on an uncompressed
+        collection; ``reembed`` recomputes them from each record's text or
+        image file with the collection's model instead.
+        """
+        if not reembed:
+            results = self.product_collection.get(include=["embeddings", "documents", "metadatas"])
+            embeddings = results["embeddings"]
+            has_embeddings = embeddings is not None and len(embeddings) > 0
+            results["embeddings"] = np.asarray(embeddings, dtype=np.float32) if has_embeddings else np.zeros((0, 0), dtype=np.float32)
+            return results
+
+        return self._reembed(self.product_collection.get(include=["documents", "metadatas"]), batch_size)
+
+    def _reembed(self, results: Dict[str, Any], batch_size: int = 256) -> Dict[str, Any]:
+        """Add full-precision ``embeddings`` computed from each record's text or image file"""
+        texts, images = [], []
+        for row, (record_id, document, metadata) in enumerate(zip(results["ids"], results["documents"], results["metadatas"])):
+            # Records written before the modality field: image records are "<product_id>_<image_id>"
+            modality = metadata.get("modality") or ("text" if record_id == metadata.get("product_id") else "image")
+            if modality == "image":
+                images.append((row, metadata.get("image_path") or document.partition(" and path: ")[2]))
+            else:
+                texts.append((row, document))
+
+        embeddings: List[Optional[np.ndarray]] = [None] * len(results["ids"])
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            for (row, _), embedding in zip(batch, self.get_text_embeddings([document for _, document in batch])):
+                embeddings[row] = embedding
+        for start in range(0, len(images), batch_size):
+            batch = images[start:start + batch_size]
+            for (row, _), embedding in zip(batch, self.get_image_embeddings(image_paths=[path for _, path in batch])):
+                embeddings[row] = embedding
+        results["embeddings"] = np.asarray(embeddings, dtype=np.float32) if embeddings else np.zeros((0, 0), dtype=np.float32)
+        return results
+
+    def reindex_embeddings(
+        self,
+        compressor: EmbeddingCompressor,
+        records: Optional[Dict[str, Any]] = None,
+        batch_size: int = 1000
+    ) -> Dict[str, Any]:
+        """Write every embedding, compressed with ``compressor``, to a new versioned collection and activate it
+
+        ``records`` are full-precision records from get_full_precision_records;
+        by default they are read back from the index, which is only right for
+        an uncompressed collection. The serving collection is only read, so an
+        interrupted run leaves it serving. The compressor is saved with the new
+        collection before the pointer swap, so every worker switches index and
+        compressor together. Writes that reach the old collection meanwhile
+        are re-embedded and copied over, as a migration does.
+        """
+        if unfinished_migrations(self.persist_directory):
+            raise ValueError("A migration is unfinished; resume or finish it before re-indexing")
+
+        source = self._serving
+        results = records if records is not None else self.get_full_precision_records()
+        compressor = None if compressor.is_identity else compressor
+        version = next_collection_version(self.persist_directory)
+        name = versioned_collection_name(version)
+
+        # Saved even when it is the identity, so the configured default cannot apply to this collection
+        (compressor or EmbeddingCompressor()).save(collection_compressor_path(name, self.persist_directory))
+        target = create_vector_index(
+            self.persist_directory,
+            name,
+            {"embedding_compression": compression_label(compressor), "embedding_model": source.model_id},
+            backend=self.index_backend,
+            sharding=self.index_sharding
+        )
+        # Left over from an interrupted run
+        target.reset({"embedding_compression": compression_label(compressor), "embedding_model": source.model_id})
+        target.configure_storage(compressor)
+        target_state = _ServingState(name, source.model_id, target, source.embedder, compressor)
+
+        def copy(records: Dict[str, Any]) -> None:
+            ids = records["ids"]
+            embeddings = records["embeddings"]
+            for start in range(0, len(ids), batch_size):
+                end = start + batch_size
+                target.add(
+                    ids=ids[start:end],
+                    embeddings=self._prepare_embeddings(list(embeddings[start:end]), serving=target_state),
+                    documents=records["documents"][start:end],
+                    metadatas=records["metadatas"][start:end]
+                )
+
+        def copy_changed(since: Dict[str, str]) -> int:
+            """Re-embed source records whose content differs from ``since``; returns how many"""
+            changed = [record_id for record_id, fingerprint in fingerprint_records(source.index).items() if since.get(record_id) != fingerprint]
+            if changed:
+                target.delete(ids=changed)
+                copy(self._reembed(source.index.get(ids=changed, include=["documents", "metadatas"])))
+            return len(changed)
+
+        copy(results)
+        # Catch up with writes made while copying, then delete what was removed meanwhile
+        copied = fingerprint_records(target)
+        copy_changed(copied)
+        removed = sorted(copied.keys() - fingerprint_records(source.index).keys())
+        if removed:
+            target.delete(ids=removed)
+
+        at_swap = fingerprint_records(source.index)
+        active = write_active_collection(self.persist_directory, name, source.model_id, version)
+        self._serving = self._open_serving(active, current=source)
+        # Workers switch within ACTIVE_COLLECTION_CHECK_SECONDS and write to the old collection until then
+        time.sleep(2 * settings.ACTIVE_COLLECTION_CHECK_SECONDS)
+        late = copy_changed(at_swap)
+        if late:
+            print(f"🔁 Copied {late} records written to {source.collection_name} after the swap")
+        return {"collection": name, "previous": source.collection_name, "count": target.count()}
+
+    def _measure_index_size(self) -> None:
+        try:
+            collection_name = self.product_collection_name
+            # A filtered count lists the matching ids, so it is taken here rather than per request
+            image_count = self.product_collection.count(where={"modality": "image"})
+            size = sum(f.stat().st_size for f in Path(self.persist_directory).rglob('*') if f.is_file())
+            self._index_size = (size, time.time(), image_count, collection_name)
+        except Exception as e:
+            print(f"⚠️  Could not measure vector store size: {e}")
+        finally:
+            self._index_size_lock.release()
+
+    def _cached_index_size(self) -> Optional[tuple]:
+        """Last measured (bytes, timestamp, image records, collection); a stale or missing value starts a background re-measure"""
+        cached = self._index_size
+        stale = (
+            cached is None
+            or time.time() - cached[1] >= settings.VECTOR_STATS_SIZE_TTL_SECONDS
+            or cached[3] != self.product_collection_name
+        )
+        if stale and self._index_size_lock.acquire(blocking=False):
+            threading.Thread(target=self._measure_index_size, name="index-size", daemon=True).start()
+        return cached
+
     def get_vector_store_stats(self) -> dict:
         """Get statistics about the vector store"""
         try:
             # Get product collection stats
             product_count = self.product_collection.count()
+            # Walking the persist directory and counting by modality are O(n); report cached values (None until first measured)
+            measured = self._cached_index_size()
+            index_size = measured[0] if measured else None
+            image_count = measured[2] if measured else None
             
             return {
                 "product_collection_name": self.product_collection_name,
+                "index_backend": type(self.product_collection).__name__,
+                "embedding_model": self.model_id,
                 "product_documents_count": product_count,            
+                "documents_by_modality": {
+                    "text": product_count - image_count if image_count is not None else None,
+                    "image": image_count
+                },
+                "index_size_bytes": index_size,
+                "index_size_mb": round(index_size / (1024 * 1024), 2) if index_size is not None else None,
+                "index_size_measured_at": datetime.fromtimestamp(measured[1]).isoformat() if measured else None,
+                "embedding_compression": self._compression_label(),
+                "index_sharding": self.product_collection.mode if isinstance(self.product_collection, ShardedVectorIndex) else "none",
+                "index_shards": self.product_collection.shard_count if isinstance(self.product_collection, ShardedVectorIndex) else 1,
                 "status": "active"
             }
         except Exception as e:
@@ -3,16 +3,20 @@ from typing import Dict, Any, List, Optional
 from datetime import datetime
 
 from app.agent.chatbot_agent import ChatbotAgent
-from app.models import ChatRequest, ChatResponse, ThreadInfo, ThreadHistory, ChatMessage
+from app.models import ChatRequest, ChatResponse, ThreadHistory, ChatMessage, ThreadList
 from fastapi import UploadFile
 from app.services.file_service import FileService
+from app.services.thread_registry import ThreadRegistry
+from app.tracing import trace_request
+from app.config import settings
+from app.deadlines import deadline_scope
 
 class ChatService:
     """Service layer for chat operations"""
     
     def __init__(self):
         self.agent = ChatbotAgent()
-        self._threads: Dict[str, ThreadInfo] = {}
+        self.threads = ThreadRegistry()
         self.file_service = FileService()
     
     async def process_chat(self, request: ChatRequest) -> ChatResponse:
@@ -21,56 +25,72 @@ class ChatService:
         # Generate message ID
         message_id = str(uuid.uuid4())
 
-        saved_images = await self.file_service.save_multiple_images([request.query_image]) if request.query_image else None
-        
-        # Process with agent
-        result = await self.agent.chat(
-            message=request.message,
-            query_image_path=saved_images[0].file_path if saved_images else None,
-            thread_id=request.thread_id,
-            user_id=request.user_id,
-            context=request.context
-        )
-        
-        # Update thread info
-        thread_id = result["thread_id"]
-        await self._update_thread_info(thread_id, request.user_id)
+        # The message id doubles as the request id in traces; every external call
+        # made for this request draws its timeout from the one deadline
+        with trace_request("chat_service.process_chat", request_id=message_id), \
+                deadline_scope(settings.CHAT_REQUEST_TIMEOUT_SECONDS):
+            saved_images = await self.file_service.save_multiple_images([request.query_image]) if request.query_image else None
+            
+            # Process with agent
+            result = await self.agent.chat(
+                message=request.message,
+                query_image_path=saved_images[0].file_path if saved_images else None,
+                thread_id=request.thread_id,
+                user_id=request.user_id,
+                context=request.context,
+                message_id=message_id
+            )
+            
+            # Update thread info
+            thread_id = result["thread_id"]
+            await self._update_thread_info(thread_id, request.user_id)
         
         return ChatResponse(
             response=result["response"],
             thread_id=thread_id,
             message_id=message_id,
-            timestamp=datetime.now(),
+            timestamp=datetime.fromisoformat(result["timestamp"]),
             metadata=result.get("metadata", {})
         )
     
-    async def get_thread_history(self, thread_id: str) -> ThreadHistory:
-        """Get conversation history for a thread"""
+    async def get_thread_history(
+        self,
+        thread_id: str,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        after_message_id: Optional[str] = None
+    ) -> ThreadHistory:
+        """Get a page of conversation history for a thread"""
         
         # Get messages from agent
-        messages_data = await self.agent.get_thread_history(thread_id)
+        page = await self.agent.get_thread_history(
+            thread_id, limit=limit, cursor=cursor, after_message_id=after_message_id
+        )
         
         # Convert to ChatMessage objects
         messages = [
             ChatMessage(
+                id=msg["id"],
                 role=msg["role"],
                 content=msg["content"],
                 timestamp=datetime.fromisoformat(msg["timestamp"])
             )
-            for msg in messages_data
+            for msg in page["messages"]
         ]
         
         # Get thread info
-        thread_info = self._threads.get(thread_id)
+        thread_info = self.threads.get(thread_id)
         metadata = {
             "user_id": thread_info.user_id if thread_info else None,
-            "message_count": len(messages)
+            "message_count": page["total"]
         }
         
         return ThreadHistory(
             thread_id=thread_id,
             messages=messages,
-            metadata=metadata
+            metadata=metadata,
+            has_more=page["has_more"],
+            next_cursor=page["next_cursor"]
         )
     
     async def delete_thread(self, thread_id: str) -> bool:
@@ -79,41 +99,23 @@ class ChatService:
         # Delete from agent memory
         success = await self.agent.delete_thread(thread_id)
         
-        # Remove from local thread tracking
-        if thread_id in self._threads:
-            del self._threads[thread_id]
+        # Remove from thread registry
+        self.threads.delete(thread_id)
         
         return success
     
-    async def list_threads(self, user_id: Optional[str] = None) -> List[ThreadInfo]:
-        """List all threads, optionally filtered by user"""
-        
-        threads = list(self._threads.values())
-        
-        if user_id:
-            threads = [t for t in threads if t.user_id == user_id]
-        
-        # Sort by last updated
-        threads.sort(key=lambda x: x.last_updated, reverse=True)
-        
-        return threads
+    async def list_threads(
+        self,
+        user_id: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> ThreadList:
+        """List threads, most recently updated first, optionally filtered by user"""
+        
+        threads, next_cursor = self.threads.list(user_id=user_id, limit=limit, cursor=cursor)
+        return ThreadList(threads=threads, next_cursor=next_cursor)
     
     async def _update_thread_info(self, thread_id: str, user_id: Optional[str] = None) -> None:
         """Update thread information"""
         
-        if thread_id not in self._threads:
-            # Create new thread
-            self._threads[thread_id] = ThreadInfo(
-                thread_id=thread_id,
-                user_id=user_id,
-                created_at=datetime.now(),
-                last_updated=datetime.now(),
-                message_count=1
-            )
-        else:
-            # Update existing thread
-            thread = self._threads[thread_id]
-            thread.last_updated = datetime.now()
-            thread.message_count += 1
-            if user_id and not thread.user_id:
-                thread.user_id = user_id 
\ No newline at end of file
+        self.threads.record_message(thread_id, user_id) 
\ No newline at end of file
@@ -1,7 +1,11 @@
 import os
 import uuid
-import shutil
-from typing import List, Optional
+import binascii
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
 from datetime import datetime
 from pathlib import Path
 from fastapi import UploadFile, HTTPException
@@ -10,83 +14,185 @@ import io
 
 from app.models import ProductImage
 from app.config import settings
+from app.metrics import IMAGE_SECONDS, CACHE_EVENTS, timed
+from app.tracing import traced
+
+
+# Number of two-hex-character directory levels used to shard stored images
+SHARD_DEPTH = 2
 
 
 class FileService:
-    """Service for handling file uploads and storage"""
-    
+    """Service for handling file uploads and storage
+
+    Images are stored content-addressed: the SHA-256 of the uploaded bytes is
+    the image id, and the file lives under a sharded path such as
+    ``images/ab/cd/abcd....jpg``. A small SQLite index next to the uploads keeps
+    a reference count per image plus running totals, so identical uploads are
+    stored once, deletes are direct lookups and storage stats are O(1).
+
+    Reference changes run in ``BEGIN IMMEDIATE`` transactions, which also
+    serialize workers in other processes sharing the uploads directory; a file
+    is only unlinked inside the transaction that drops its last reference.
+    """
+
     def __init__(self):
         self.upload_dir = Path(settings.MEDIA_UPLOAD_DIR)
         self.upload_dir.mkdir(parents=True, exist_ok=True)
-        
+
         # Create subdirectories
         self.images_dir = self.upload_dir / "images"
         self.images_dir.mkdir(exist_ok=True)
-    
+
+        # Reference-count index shared by every FileService instance
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.upload_dir / "storage_index.sqlite3"), check_same_thread=False)
+        self._init_index()
+
+    def _init_index(self) -> None:
+        """Create the storage index and register pre-existing uploads once"""
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS images ("
+                "id TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL, refs INTEGER NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS storage_stats ("
+                "key INTEGER PRIMARY KEY CHECK (key = 0), file_count INTEGER NOT NULL, total_size INTEGER NOT NULL)"
+            )
+            if self._db.execute("SELECT 1 FROM storage_stats").fetchone():
+                return
+
+            # First run against this upload directory: adopt legacy flat files
+            # (uuid-named) so they can still be deleted and are counted
+            file_count, total_size = 0, 0
+            for file_path in self.images_dir.iterdir():
+                if not file_path.is_file():
+                    continue
+                size = file_path.stat().st_size
+                self._db.execute(
+                    "INSERT OR IGNORE INTO images (id, path, size, refs) VALUES (?, ?, ?, 1)",
+                    (file_path.stem, str(file_path.relative_to(self.images_dir)), size)
+                )
+                file_count += 1
+                total_size += size
+            self._db.execute(
+                "INSERT INTO storage_stats (key, file_count, total_size) VALUES (0, ?, ?)",
+                (file_count, total_size)
+            )
+
+    @contextmanager
+    def _write_transaction(self) -> Iterator[None]:
+        """Hold the index write lock across threads and processes until commit"""
+        with self._lock, self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            yield
+
+    def _relative_path(self, content_hash: str) -> Path:
+        """Sharded relative path for a content hash"""
+        shards = [content_hash[i * 2:i * 2 + 2] for i in range(SHARD_DEPTH)]
+        return Path(*shards) / f"{content_hash}.jpg"
+
+    @timed(IMAGE_SECONDS.labels(operation="save"), error_stage="image_save")
+    def _write_image(self, contents: bytes, file_path: Path) -> None:
+        """Normalize an uploaded image to JPEG and write it atomically"""
+        buffer = io.BytesIO()
+        # Open with PIL to validate and potentially convert
+        with Image.open(io.BytesIO(contents)) as img:
+            # Convert to RGB if necessary
+            if img.mode in ('RGBA', 'LA', 'P'):
+                img = img.convert('RGB')
+
+            # Encode optimized image
+            img.save(buffer, 'JPEG', quality=85, optimize=True)
+
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = file_path.with_name(f".{file_path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(buffer.getbuffer())
+            os.replace(tmp_path, file_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def _add_reference(self, content_hash: str, relative_path: Path, file_path: Path, contents: bytes) -> int:
+        """Increment the reference count for an image, registering it if new; returns its size"""
+        with self._write_transaction():
+            row = self._db.execute("SELECT size FROM images WHERE id = ?", (content_hash,)).fetchone()
+            if not file_path.exists():
+                # A concurrent delete released the last reference after save_image saw the file
+                self._write_image(contents, file_path)
+            if row:
+                self._db.execute("UPDATE images SET refs = refs + 1 WHERE id = ?", (content_hash,))
+                return row[0]
+
+            size = file_path.stat().st_size
+            self._db.execute(
+                "INSERT INTO images (id, path, size, refs) VALUES (?, ?, ?, 1)",
+                (content_hash, str(relative_path), size)
+            )
+            self._db.execute(
+                "UPDATE storage_stats SET file_count = file_count + 1, total_size = total_size + ? WHERE key = 0",
+                (size,)
+            )
+            return size
+
+    @traced("file_service.save_image")
     async def save_image(self, file: UploadFile) -> ProductImage:
-        """Save an uploaded image file"""
-        
+        """Save an uploaded image file, deduplicated by content hash"""
+
         # Validate file type
         if file.content_type not in settings.ALLOWED_IMAGE_TYPES:
             raise HTTPException(
-                status_code=400, 
+                status_code=400,
                 detail=f"File type {file.content_type} not allowed. Allowed types: {settings.ALLOWED_IMAGE_TYPES}"
             )
-        
+
         # Validate file size
         if file.size and file.size > settings.MAX_FILE_SIZE:
             raise HTTPException(
                 status_code=400,
                 detail=f"File size {file.size} exceeds maximum allowed size of {settings.MAX_FILE_SIZE}"
             )
-        
-        # Generate unique filename
-        file_id = str(uuid.uuid4())
-        file_extension = Path(file.filename).suffix if file.filename else ".jpg"
-        filename = f"{file_id}{file_extension}"
-        
-        # Create file path
-        file_path = self.images_dir / filename
-        
+
         try:
-            # Read and validate image
             contents = await file.read()
-            
-            # Open with PIL to validate and potentially convert
-            with Image.open(io.BytesIO(contents)) as img:
-                # Convert to RGB if necessary
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    img = img.convert('RGB')
-                
-                # Save optimized image
-                img.save(file_path, 'JPEG', quality=85, optimize=True)
-            
-            # Get file size
-            file_size = file_path.stat().st_size
-            
+
+            # Identical uploads map to the same id and path
+            content_hash = hashlib.sha256(contents).hexdigest()
+            relative_path = self._relative_path(content_hash)
+            file_path = self.images_dir / relative_path
+
+            # Only decode and encode images we have not stored before
+            if file_path.exists():
+                CACHE_EVENTS.labels(cache="image_store", result="hit").inc()
+            else:
+                CACHE_EVENTS.labels(cache="image_store", result="miss").inc()
+                self._write_image(contents, file_path)
+
+            file_size = self._add_reference(content_hash, relative_path, file_path, contents)
+
             # Create ProductImage object
             product_image = ProductImage(
-                id=file_id,
-                filename=file.filename or filename,
+                id=content_hash,
+                filename=file.filename or file_path.name,
                 file_path=str(file_path),
-                file_url=f"/uploads/images/{filename}",
+                file_url=self.get_image_url(relative_path.as_posix()),
                 file_size=file_size,
                 mime_type="image/jpeg",
                 created_at=datetime.now()
             )
-            
+
             return product_image
-            
+
         except Exception as e:
-            # Clean up if something goes wrong
-            if file_path.exists():
-                file_path.unlink()
             raise HTTPException(status_code=500, detail=f"Error saving image: {str(e)}")
-    
+
     async def save_multiple_images(self, files: List[UploadFile]) -> List[ProductImage]:
         """Save multiple uploaded image files"""
         images = []
-        
+
         for file in files:
             try:
                 image = await self.save_image(file)
@@ -95,21 +201,34 @@ class FileService:
                 # Continue with other files if one fails
                 print(f"Error saving image {file.filename}: {e}")
                 continue
-        
+
         return images
-    
+
     async def delete_image(self, image_id: str) -> bool:
-        """Delete an image file"""
+        """Release one reference to an image, removing the file when unused"""
         try:
-            # Find image file
-            for file_path in self.images_dir.glob(f"{image_id}.*"):
-                file_path.unlink()
-                return True
-            return False
+            with self._write_transaction():
+                row = self._db.execute("SELECT path, size, refs FROM images WHERE id = ?", (image_id,)).fetchone()
+                if not row:
+                    return False
+
+                relative_path, size, refs = row
+                if refs > 1:
+                    self._db.execute("UPDATE images SET refs = refs - 1 WHERE id = ?", (image_id,))
+                    return True
+
+                self._db.execute("DELETE FROM images WHERE id = ?", (image_id,))
+                self._db.execute(
+                    "UPDATE storage_stats SET file_count = file_count - 1, total_size = total_size - ? WHERE key = 0",
+                    (size,)
+                )
+                # Unlink before commit so no save can re-reference the image in between
+                (self.images_dir / relative_path).unlink(missing_ok=True)
+            return True
         except Exception as e:
             print(f"Error deleting image {image_id}: {e}")
             return False
-    
+
     async def delete_product_images(self, images: List[ProductImage]) -> bool:
         """Delete multiple product images"""
         success = True
@@ -117,16 +236,56 @@ class FileService:
             if not await self.delete_image(image.id):
                 success = False
         return success
-    
+
     def get_image_path(self, filename: str) -> Optional[Path]:
         """Get the full path to an image file"""
         file_path = self.images_dir / filename
         return file_path if file_path.exists() else None
-    
+
     def get_image_url(self, filename: str) -> str:
         """Get the public URL for an image"""
         return f"/uploads/images/{filename}"
-    
+
+    @traced("file_service.load_image")
+    @timed(IMAGE_SECONDS.labels(operation="decode"), error_stage="image_decode")
+    def load_image(self, contents: bytes) -> Image.Image:
+        """Decode image bytes into an in-memory RGB image without touching disk"""
+        if len(contents) > settings.MAX_FILE_SIZE:
+            raise HTTPException(
+                status_code=400,
+                detail=f"File size {len(contents)} exceeds maximum allowed size of {settings.MAX_FILE_SIZE}"
+            )
+
+        try:
+            # BytesIO over bytes shares the buffer instead of copying it
+            img = Image.open(io.BytesIO(contents))
+            # Let the JPEG decoder downscale while decoding; CLIP resizes anyway
+            size = settings.QUERY_IMAGE_DRAFT_SIZE
+            img.draft("RGB", (size, size))
+            return img.convert("RGB")
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Invalid image: {str(e)}")
+
+    def load_base64_image(self, encoded: str) -> Image.Image:
+        """Decode a base64 (optionally data URL) image into an in-memory RGB image"""
+        # Strip a "data:image/...;base64," prefix if present
+        if encoded.startswith("data:"):
+            encoded = encoded[encoded.find(",") + 1:]
+
+        # Reject oversized payloads before decoding them
+        if len(encoded) * 3 // 4 > settings.MAX_FILE_SIZE + 3:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Image exceeds maximum allowed size of {settings.MAX_FILE_SIZE}"
+            )
+
+        try:
+            contents = binascii.a2b_base64(encoded)
+        except (binascii.Error, ValueError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid base64 image: {str(e)}")
+
+        return self.load_image(contents)
+
     async def validate_image(self, file: UploadFile) -> bool:
         """Validate an image file without saving it"""
         try:
@@ -137,15 +296,17 @@ class FileService:
             return True
         except Exception:
             return False
-    
+
     def get_storage_info(self) -> dict:
-        """Get storage information"""
-        total_size = sum(f.stat().st_size for f in self.images_dir.rglob('*') if f.is_file())
-        file_count = len(list(self.images_dir.rglob('*')))
-        
+        """Get storage information from the incrementally maintained counters"""
+        with self._lock:
+            file_count, total_size = self._db.execute(
+                "SELECT file_count, total_size FROM storage_stats WHERE key = 0"
+            ).fetchone()
+
         return {
             "total_size_bytes": total_size,
             "total_size_mb": round(total_size / (1024 * 1024), 2),
             "file_count": file_count,
             "upload_directory": str(self.upload_dir)
-        } 
\ No newline at end of file
+        }
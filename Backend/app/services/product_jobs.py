@@ -0,0 +1,218 @@
+import asyncio
+import functools
+import itertools
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.config import settings
+from app.metrics import PRODUCT_JOB_QUEUE_DEPTH, PRODUCT_JOB_SECONDS, PRODUCT_JOBS
+from app.models import Product
+
+
+FINISHED_STATUSES = ("done", "failed")
+
+# Pause before replacing a worker that exited, so one failing at start cannot spin the event loop
+WORKER_RESTART_DELAY_SECONDS = 1.0
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the product job queue is at PRODUCT_JOB_QUEUE_SIZE"""
+
+
+class ProductJob:
+    """One product waiting for, or going through, embedding and indexing"""
+
+    def __init__(self, product: Product, sequence: int):
+        self.id = str(uuid.uuid4())
+        self.sequence = sequence
+        self.product = product
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.enqueued = time.perf_counter()
+
+    def to_dict(self, queue_position: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "product_id": self.product.id,
+            "queue_position": queue_position,
+            "images": len(self.product.images),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ProductJobQueue:
+    """Bounded queue of product creations processed by background workers
+
+    Images are saved while the request is open; the queue only embeds and
+    indexes. Each worker takes the next job plus whatever else is already
+    waiting, up to PRODUCT_JOB_BATCH_SIZE, and embeds the batch's texts and
+    images in one pass each. ``on_change`` is awaited after a batch indexes
+    at least one product; its errors are logged and do not fail the jobs. A
+    worker that exits unexpectedly is logged and replaced. Jobs live in
+    memory, so a restart drops the ones still queued.
+    """
+
+    def __init__(
+        self,
+        vector_store: Any,
+        max_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        on_change: Optional[Callable[[], Awaitable[None]]] = None
+    ):
+        self.vector_store = vector_store
+        self.on_change = on_change
+        self.max_size = max_size or settings.PRODUCT_JOB_QUEUE_SIZE
+        self.worker_count = workers or settings.PRODUCT_JOB_WORKERS
+        self.batch_size = batch_size or settings.PRODUCT_JOB_BATCH_SIZE
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._jobs: Dict[str, ProductJob] = {}
+        self._sequence = itertools.count()
+
+    def _ensure_started(self) -> None:
+        # Started on first use so the queue and workers belong to the serving event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+            self._workers = [self._start_worker(i) for i in range(self.worker_count)]
+
+    def _start_worker(self, index: int, delay: float = 0.0) -> asyncio.Task:
+        worker = asyncio.create_task(self._work(delay), name=f"product-job-worker-{index}")
+        worker.add_done_callback(functools.partial(self._worker_exited, index))
+        return worker
+
+    def _worker_exited(self, index: int, worker: asyncio.Task) -> None:
+        # Workers only stop when cancelled by stop(); anything else would silently shrink the pool
+        if worker.cancelled() or self._queue is None:
+            return
+        error = worker.exception()
+        reason = f"{type(error).__name__}: {error}" if error else "returned"
+        print(f"❌ Product job worker {index} exited ({reason}); restarting it")
+        self._workers[index] = self._start_worker(index, delay=WORKER_RESTART_DELAY_SECONDS)
+
+    async def stop(self) -> None:
+        """Cancel the workers; jobs still queued are dropped"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        pending = sum(1 for job in self._jobs.values() if job.status not in FINISHED_STATUSES)
+        if pending:
+            print(f"⚠️  Dropping {pending} unfinished product jobs")
+        self._workers = []
+        self._queue = None
+
+    def check_capacity(self) -> None:
+        self._ensure_started()
+        if self._queue.full():
+            PRODUCT_JOBS.labels(status="rejected").inc()
+            raise QueueFullError(f"Product job queue is full ({self.max_size} jobs)")
+
+    def submit(self, product: Product) -> ProductJob:
+        self.check_capacity()
+        self._prune()
+        job = ProductJob(product, next(self._sequence))
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job)
+        PRODUCT_JOBS.labels(status="queued").inc()
+        PRODUCT_JOB_QUEUE_DEPTH.set(self._queue.qsize())
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        position = None
+        if job.status == "queued":
+            position = sum(1 for other in self._jobs.values() if other.status == "queued" and other.sequence < job.sequence)
+        return job.to_dict(queue_position=position)
+
+    def stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "max_size": self.max_size,
+            "workers": self.worker_count,
+            "workers_alive": sum(1 for worker in self._workers if not worker.done()),
+            "jobs": counts,
+        }
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than PRODUCT_JOB_RETENTION_SECONDS"""
+        now = datetime.now()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at and (now - job.finished_at).total_seconds() > settings.PRODUCT_JOB_RETENTION_SECONDS
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def _work(self, delay: float = 0.0) -> None:
+        if delay:
+            await asyncio.sleep(delay)
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            PRODUCT_JOB_QUEUE_DEPTH.set(self._queue.qsize())
+            try:
+                await self._process(batch)
+            except Exception as e:
+                # _process fails jobs itself; this only guards the worker against anything it missed
+                print(f"❌ Product job batch failed unexpectedly: {type(e).__name__}: {e}")
+                self._finish([job for job in batch if job.status not in FINISHED_STATUSES], error=e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _process(self, batch: List[ProductJob]) -> None:
+        started = time.perf_counter()
+        for job in batch:
+            job.status = "running"
+            job.started_at = datetime.now()
+            PRODUCT_JOB_SECONDS.labels(stage="queued").observe(started - job.enqueued)
+
+        try:
+            # Embedding is CPU-bound; keep it off the event loop
+            await asyncio.to_thread(self.vector_store.add_products, [job.product for job in batch])
+            self._finish(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                self._finish(batch, error=e)
+            else:
+                # Retry one by one so a single bad image fails only its own product
+                for job in batch:
+                    try:
+                        await asyncio.to_thread(self.vector_store.add_products, [job.product])
+                        self._finish([job])
+                    except Exception as job_error:
+                        self._finish([job], error=job_error)
+        if self.on_change and any(job.status == "done" for job in batch):
+            try:
+                await self.on_change()
+            except Exception as e:
+                # The products are indexed; a failed notification must not fail them or stop the worker
+                print(f"⚠️  Product job change hook failed: {type(e).__name__}: {e}")
+        PRODUCT_JOB_SECONDS.labels(stage="processing").observe(time.perf_counter() - started)
+
+    def _finish(self, jobs: List[ProductJob], error: Optional[Exception] = None) -> None:
+        for job in jobs:
+            job.finished_at = datetime.now()
+            job.status = "failed" if error else "done"
+            job.error = f"{type(error).__name__}: {error}" if error else None
+            PRODUCT_JOBS.labels(status=job.status).inc()
+            if error:
+                print(f"❌ Product job {job.id} failed: {job.error}")
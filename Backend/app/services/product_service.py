@@ -1,11 +1,21 @@
+import asyncio
+import hashlib
 import uuid
 from typing import List, Dict, Any, Optional, Union
 from datetime import datetime
 from fastapi import UploadFile
+from PIL import Image
 
+from app.metrics import SEARCH_FLIGHTS
+from app.rag.catalog_version import bump_catalog_version, read_catalog_version
 from app.rag.vector_store import ProductVectorStore
 from app.services.file_service import FileService
-from app.models import Product, ProductCreate, ProductUpdate, ProductResponse, ProductSearchRequest, ProductSearchResponse, ProductImage
+from app.services.product_jobs import ProductJobQueue, QueueFullError
+from app.tracing import trace_request
+from app.models import (
+    Product, ProductCreate, ProductUpdate, ProductResponse, ProductSearchRequest, ProductSearchResponse, ProductImage,
+    BatchSearchRequest, BatchSearchResponse
+)
 
 
 class ProductService:
@@ -14,17 +24,28 @@ class ProductService:
     def __init__(self):
         self.vector_store = ProductVectorStore()
         self.file_service = FileService()
+        self.jobs = ProductJobQueue(self.vector_store, on_change=self._bump_catalog_version)
+        # In-flight searches by request key, shared by identical concurrent requests
+        self._search_flights: Dict[tuple, asyncio.Future] = {}
+        self._search_flight_counts = {"leader": 0, "coalesced": 0}
     
-    async def create_product(self, product_data: ProductCreate) -> ProductResponse:
-        """Create a new product with optional image uploads"""
+    def catalog_version(self) -> Dict[str, Any]:
+        """Catalog id and version; the version advances whenever the products served change"""
+        
+        return read_catalog_version(self.vector_store.persist_directory)
+    
+    async def _bump_catalog_version(self) -> None:
+        await asyncio.to_thread(bump_catalog_version, self.vector_store.persist_directory)
+    
+    async def _build_product(self, product_data: ProductCreate) -> Product:
+        """Save uploaded images and create the Product object"""
         
         # Save uploaded images if provided
         product_images = []
         if product_data.images:
             product_images = await self.file_service.save_multiple_images(product_data.images)
         
-        # Create Product object
-        product = Product(
+        return Product(
             id=str(uuid.uuid4()),
             title=product_data.title,
             description=product_data.description,
@@ -35,22 +56,50 @@ class ProductService:
             created_at=datetime.now(),
             updated_at=datetime.now()
         )
+    
+    async def create_product(self, product_data: ProductCreate) -> ProductResponse:
+        """Create a new product with optional image uploads"""
+        
+        with trace_request("product_service.create_product"):
+            product = await self._build_product(product_data)
         
-        # Add to vector store
-        product_id = self.vector_store.add_product(product)
+            # Add to vector store
+            product_id = await asyncio.to_thread(self.vector_store.add_product, product)
+            await self._bump_catalog_version()
         
-        # Get the created product
-        created_product = self.vector_store.get_product_by_id(product_id)
+            # Get the created product
+            created_product = await asyncio.to_thread(self.vector_store.get_product_by_id, product_id)
         
-        if not created_product:
-            raise ValueError("Failed to create product")
+            if not created_product:
+                raise ValueError("Failed to create product")
         
         return ProductResponse(**created_product)
     
+    async def submit_product(self, product_data: ProductCreate) -> dict:
+        """Save the images and queue the product for background embedding; returns the job status"""
+        
+        with trace_request("product_service.submit_product"):
+            # Refuse before saving anything when there is no room
+            self.jobs.check_capacity()
+            # Uploads are only readable while the request is open, so images are saved now
+            product = await self._build_product(product_data)
+            try:
+                job = self.jobs.submit(product)
+            except QueueFullError:
+                await self.file_service.delete_product_images(product.images)
+                raise
+        
+        return self.jobs.get(job.id)
+    
+    async def get_product_job(self, job_id: str) -> Optional[dict]:
+        """Get the status of a background product job"""
+        
+        return self.jobs.get(job_id)
+    
     async def get_product(self, product_id: str) -> Optional[ProductResponse]:
         """Get a product by ID"""
         
-        product_data = self.vector_store.get_product_by_id(product_id)
+        product_data = await asyncio.to_thread(self.vector_store.get_product_by_id, product_id)
         
         if not product_data:
             return None
@@ -61,7 +110,7 @@ class ProductService:
         """Update an existing product"""
         
         # Get existing product
-        existing_product = self.vector_store.get_product_by_id(product_id)
+        existing_product = await asyncio.to_thread(self.vector_store.get_product_by_id, product_id)
         
         if not existing_product:
             return None
@@ -80,13 +129,14 @@ class ProductService:
         )
         
         # Update in vector store
-        success = self.vector_store.update_product(updated_product)
+        success = await asyncio.to_thread(self.vector_store.update_product, updated_product)
         
         if not success:
             raise ValueError("Failed to update product")
+        await self._bump_catalog_version()
         
         # Get the updated product
-        updated_product_data = self.vector_store.get_product_by_id(product_id)
+        updated_product_data = await asyncio.to_thread(self.vector_store.get_product_by_id, product_id)
         
         if not updated_product_data:
             raise ValueError("Failed to retrieve updated product")
@@ -96,20 +146,67 @@ class ProductService:
     async def delete_product(self, product_id: str) -> bool:
         """Delete a product"""
         
-        return self.vector_store.delete_product(product_id)
+        deleted = await asyncio.to_thread(self.vector_store.delete_product, product_id)
+        if deleted:
+            await self._bump_catalog_version()
+        return deleted
     
-    async def search_products(self, search_request: Dict[str, Any]) -> ProductSearchResponse:
+    @staticmethod
+    def _search_key(search_request: Any, query_image: Optional[Image.Image]) -> tuple:
+        """Identity of a search: its query, image content, filters and limit"""
+        image_hash = None
+        if query_image is not None:
+            digest = hashlib.sha256(query_image.tobytes())
+            digest.update(f"{query_image.mode}{query_image.size}".encode())
+            image_hash = digest.hexdigest()
+        return (
+            search_request.query,
+            search_request.image_query_path,
+            image_hash,
+            search_request.category,
+            search_request.max_price,
+            search_request.min_price,
+            search_request.limit,
+            search_request.mmr_lambda,
+            search_request.mmr_pool_size,
+        )
+    
+    async def _search_single_flight(self, key: tuple, **search_kwargs: Any) -> List[Dict[str, Any]]:
+        """Run a vector store search, or join an identical one already in flight
+        
+        The search runs in a worker thread as a shared task, so a caller that
+        disconnects does not cancel it for the others. Results are not cached
+        once the search finishes.
+        """
+        flight = self._search_flights.get(key)
+        if flight is None:
+            result = "leader"
+            flight = asyncio.ensure_future(asyncio.to_thread(self.vector_store.search_products, **search_kwargs))
+            self._search_flights[key] = flight
+            flight.add_done_callback(lambda _: self._search_flights.pop(key, None))
+        else:
+            result = "coalesced"
+        self._search_flight_counts[result] += 1
+        SEARCH_FLIGHTS.labels(result=result).inc()
+        return await asyncio.shield(flight)
+    
+    async def search_products(self, search_request: Dict[str, Any], query_image: Optional[Image.Image] = None) -> ProductSearchResponse:
         """Search products using semantic similarity with multi-modal support"""
         
         # Perform search
-        products_data = self.vector_store.search_products(
-            query=search_request.query,
-            image_query_path=search_request.image_query_path,
-            category=search_request.category,
-            max_price=search_request.max_price,
-            min_price=search_request.min_price,
-            limit=search_request.limit
-        )
+        with trace_request("product_service.search_products"):
+            products_data = await self._search_single_flight(
+                self._search_key(search_request, query_image),
+                query=search_request.query,
+                image_query_path=search_request.image_query_path,
+                image_query=query_image,
+                category=search_request.category,
+                max_price=search_request.max_price,
+                min_price=search_request.min_price,
+                limit=search_request.limit,
+                mmr_lambda=search_request.mmr_lambda,
+                mmr_pool_size=search_request.mmr_pool_size
+            )
         
         print(f"Found #{len(products_data)} product")
 
@@ -122,17 +219,46 @@ class ProductService:
             query=search_request.query
         )
     
+    async def search_products_batch(self, batch_request: BatchSearchRequest, query_images: List[Optional[Image.Image]]) -> BatchSearchResponse:
+        """Run many searches with one embedding pass per modality and one vector store query"""
+        
+        searches = [
+            {
+                "query": search.query,
+                "image_query": query_image,
+                "category": search.category,
+                "max_price": search.max_price,
+                "min_price": search.min_price,
+                "limit": search.limit,
+                "mmr_lambda": search.mmr_lambda,
+                "mmr_pool_size": search.mmr_pool_size,
+            }
+            for search, query_image in zip(batch_request.queries, query_images)
+        ]
+        with trace_request("product_service.search_products_batch"):
+            results = await asyncio.to_thread(self.vector_store.search_products_batch, searches)
+        
+        return BatchSearchResponse(results=[
+            ProductSearchResponse(
+                products=[ProductResponse(**product_data) for product_data in products_data],
+                total_count=len(products_data),
+                query=search.query
+            )
+            for search, products_data in zip(batch_request.queries, results)
+        ])
+    
     async def get_all_products(self, limit: int = 100) -> List[ProductResponse]:
         """Get all products"""
         
-        products_data = self.vector_store.get_all_products(limit=limit)
+        products_data = await asyncio.to_thread(self.vector_store.get_all_products, limit=limit)
         
         return [ProductResponse(**product_data) for product_data in products_data]
     
     async def get_products_by_category(self, category: str, limit: int = 50) -> List[ProductResponse]:
         """Get products by category"""
         
-        products_data = self.vector_store.search_products(
+        products_data = await asyncio.to_thread(
+            self.vector_store.search_products,
             query=category,
             category=category,
             limit=limit
@@ -143,14 +269,19 @@ class ProductService:
     async def get_relevant_context(self, query: str, limit: int = 3) -> str:
         """Get relevant product context for RAG"""
         
-        return self.vector_store.get_relevant_context(query, limit)
+        return await asyncio.to_thread(self.vector_store.get_relevant_context, query, limit)
     
     async def reset_vector_store(self) -> bool:
         """Reset the entire vector store"""
         
-        return self.vector_store.reset_vector_store()
+        reset = await asyncio.to_thread(self.vector_store.reset_vector_store)
+        await self._bump_catalog_version()
+        return reset
     
     async def get_vector_store_stats(self) -> dict:
         """Get vector store statistics"""
         
-        return self.vector_store.get_vector_store_stats() 
\ No newline at end of file
+        stats = await asyncio.to_thread(self.vector_store.get_vector_store_stats)
+        stats["search_coalescing"] = dict(self._search_flight_counts)
+        stats["catalog_version"] = self.catalog_version()["version"]
+        return stats 
\ No newline at end of file
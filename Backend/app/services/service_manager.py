@@ -29,6 +29,11 @@ class ServiceManager:
         if self._file_service is None:
             self._file_service = FileService()
         return self._file_service
+    
+    async def shutdown(self) -> None:
+        """Stop background workers of the services created so far"""
+        if self._product_service is not None:
+            await self._product_service.jobs.stop()
 
 
 # Global service manager instance
@@ -47,4 +52,9 @@ def get_product_service() -> ProductService:
 
 def get_file_service() -> FileService:
     """Get file service instance"""
-    return _service_manager.get_file_service()
\ No newline at end of file
+    return _service_manager.get_file_service()
+
+
+async def shutdown_services() -> None:
+    """Stop service background workers"""
+    await _service_manager.shutdown()
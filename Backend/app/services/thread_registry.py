@@ -0,0 +1,111 @@
+import sqlite3
+import threading
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from app.config import settings
+from app.models import ThreadInfo
+
+
+class ThreadRegistry:
+    """Thread metadata indexed by user and recency
+
+    Threads live in a SQLite table with indexes on ``(user_id, last_updated,
+    thread_id)`` and ``(last_updated, thread_id)``. Recording a message is an
+    upsert touching a few B-tree entries. Listing reads only the rows of the
+    page it returns, however many threads exist. Pages continue from a keyset
+    cursor (the last row's ``last_updated`` and ``thread_id``), so a thread
+    updated between two requests cannot shift rows into the page boundary.
+
+    Conversation state is held by the agent's in-process checkpointer, so by
+    default the registry is an in-memory database with the same lifetime.
+    Set THREAD_REGISTRY_PATH to keep it on disk along with a persistent
+    checkpointer.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path or settings.THREAD_REGISTRY_PATH or ":memory:", check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS threads ("
+                "thread_id TEXT PRIMARY KEY, user_id TEXT, created_at REAL NOT NULL, "
+                "last_updated REAL NOT NULL, message_count INTEGER NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS threads_by_user ON threads (user_id, last_updated, thread_id)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS threads_by_recency ON threads (last_updated, thread_id)"
+            )
+
+    @staticmethod
+    def _to_info(row: Tuple) -> ThreadInfo:
+        thread_id, user_id, created_at, last_updated, message_count = row
+        return ThreadInfo(
+            thread_id=thread_id,
+            user_id=user_id,
+            created_at=datetime.fromtimestamp(created_at),
+            last_updated=datetime.fromtimestamp(last_updated),
+            message_count=message_count
+        )
+
+    def record_message(self, thread_id: str, user_id: Optional[str] = None) -> None:
+        """Create the thread or bump its message count and last update; a missing user is filled in"""
+        now = datetime.now().timestamp()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO threads (thread_id, user_id, created_at, last_updated, message_count) "
+                "VALUES (?, ?, ?, ?, 1) "
+                "ON CONFLICT (thread_id) DO UPDATE SET "
+                "last_updated = excluded.last_updated, "
+                "message_count = threads.message_count + 1, "
+                "user_id = COALESCE(threads.user_id, excluded.user_id)",
+                (thread_id, user_id, now, now)
+            )
+
+    def get(self, thread_id: str) -> Optional[ThreadInfo]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT thread_id, user_id, created_at, last_updated, message_count FROM threads WHERE thread_id = ?",
+                (thread_id,)
+            ).fetchone()
+        return self._to_info(row) if row else None
+
+    def delete(self, thread_id: str) -> bool:
+        with self._lock, self._db:
+            return self._db.execute("DELETE FROM threads WHERE thread_id = ?", (thread_id,)).rowcount > 0
+
+    def list(
+        self,
+        user_id: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[ThreadInfo], Optional[str]]:
+        """Most recently updated threads first, optionally for one user; returns the page and the next cursor"""
+        conditions, params = [], []
+        if user_id:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        if cursor:
+            last_updated, _, thread_id = cursor.partition(":")
+            try:
+                params.extend([float(last_updated), thread_id])
+            except ValueError:
+                raise ValueError(f"Invalid cursor {cursor!r}")
+            conditions.append("(last_updated, thread_id) < (?, ?)")
+
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        with self._lock:
+            # Fetch one extra row to learn whether another page follows
+            rows = self._db.execute(
+                "SELECT thread_id, user_id, created_at, last_updated, message_count FROM threads "
+                f"{where}ORDER BY last_updated DESC, thread_id DESC LIMIT ?",
+                (*params, limit + 1)
+            ).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = f"{rows[-1][3]!r}:{rows[-1][0]}"
+        return [self._to_info(row) for row in rows], next_cursor
@@ -0,0 +1,194 @@
+import cProfile
+import contextlib
+import contextvars
+import functools
+import inspect
+import io
+import json
+import pstats
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.config import settings
+
+
+class Trace:
+    """Spans recorded for one sampled request"""
+
+    def __init__(self, request_id: str, name: str):
+        self.request_id = request_id
+        self.name = name
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.spans: List[Dict[str, Any]] = []
+        self.profile: Optional[Dict[str, Any]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "name": self.name,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": self.duration_ms,
+            "spans": self.spans,
+            "profile": self.profile,
+        }
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+_current_span_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_span_id", default=None)
+# Request id of an enclosing request that was not sampled, so nested trace_request calls do not sample again
+_unsampled_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("unsampled_request_id", default=None)
+
+
+class TraceRecorder:
+    """Writes finished traces to a JSONL file and keeps the most recent ones in memory"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._recent: deque = deque(maxlen=settings.TRACE_RECENT_LIMIT)
+        # Only one cProfile profiler can be active per interpreter
+        self._profile_lock = threading.Lock()
+
+    def record(self, trace: Trace) -> None:
+        data = trace.to_dict()
+        line = json.dumps(data, default=str)
+        with self._lock:
+            self._recent.append(data)
+            trace_file = Path(settings.TRACE_FILE)
+            trace_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(trace_file, "a") as f:
+                f.write(line + "\n")
+
+    def slowest(self, limit: int = 10) -> List[Dict[str, Any]]:
+        with self._lock:
+            traces = list(self._recent)
+        return sorted(traces, key=lambda t: t["duration_ms"] or 0, reverse=True)[:limit]
+
+    @contextlib.contextmanager
+    def maybe_profile(self, trace: Trace) -> Iterator[None]:
+        """Run cProfile around a request and keep the result only if it was slow
+
+        The profiler sees every coroutine sharing the event loop thread, so a
+        profile can include work from concurrent requests.
+        """
+        if not settings.TRACE_PROFILE or not self._profile_lock.acquire(blocking=False):
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+
+            elapsed_ms = (time.perf_counter() - trace.start) * 1000.0
+            if elapsed_ms >= settings.TRACE_PROFILE_THRESHOLD_MS:
+                profile_dir = Path(settings.TRACE_PROFILE_DIR)
+                profile_dir.mkdir(parents=True, exist_ok=True)
+                profile_path = profile_dir / f"{trace.request_id}.prof"
+                profiler.dump_stats(str(profile_path))
+
+                summary = io.StringIO()
+                pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(15)
+                trace.profile = {"path": str(profile_path), "top_cumulative": summary.getvalue()}
+        finally:
+            self._profile_lock.release()
+
+
+recorder = TraceRecorder()
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes: Any) -> Iterator[None]:
+    """Record a timed span in the current trace; a no-op when the request is not sampled"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+
+    span_id = uuid.uuid4().hex[:16]
+    parent_id = _current_span_id.get()
+    token = _current_span_id.set(span_id)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span_id.reset(token)
+        trace.spans.append({
+            "span_id": span_id,
+            "parent_id": parent_id,
+            "name": name,
+            "start_ms": round((start - trace.start) * 1000.0, 3),
+            "duration_ms": round((time.perf_counter() - start) * 1000.0, 3),
+            "error": error,
+            **({"attributes": attributes} if attributes else {}),
+        })
+
+
+@contextlib.contextmanager
+def trace_request(name: str, request_id: Optional[str] = None) -> Iterator[Optional[str]]:
+    """Start a sampled trace for a request, or a child span if one is already active
+
+    Yields the request id of the active trace (or the given id when unsampled).
+    The sampling decision is made once per request: calls nested in an
+    unsampled request yield its id and record nothing.
+    """
+    active = _current_trace.get()
+    if active is not None:
+        with span(name):
+            yield active.request_id
+        return
+    unsampled = _unsampled_request_id.get()
+    if unsampled is not None:
+        yield unsampled
+        return
+
+    request_id = request_id or str(uuid.uuid4())
+    if random.random() >= settings.TRACE_SAMPLE_RATE:
+        unsampled_token = _unsampled_request_id.set(request_id)
+        try:
+            yield request_id
+        finally:
+            _unsampled_request_id.reset(unsampled_token)
+        return
+
+    trace = Trace(request_id, name)
+    trace_token = _current_trace.set(trace)
+    try:
+        with recorder.maybe_profile(trace), span(name):
+            yield request_id
+    finally:
+        trace.duration_ms = round((time.perf_counter() - trace.start) * 1000.0, 3)
+        _current_trace.reset(trace_token)
+        recorder.record(trace)
+
+
+def traced(name: str) -> Callable:
+    """Decorator wrapping a sync or async callable in a span"""
+    def decorator(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
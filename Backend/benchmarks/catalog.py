@@ -0,0 +1,70 @@
+import random
+from pathlib import Path
+from typing import List, Optional
+from datetime import datetime
+from PIL import Image
+
+from app.models import Product, ProductImage
+
+
+CATEGORIES = ["Electronics", "Audio", "Computers", "Cameras", "Gaming", "Home", "Wearables", "Accessories"]
+BRANDS = ["Sony", "Samsung", "LG", "Apple", "Bose", "Dell", "Canon", "Logitech", "Anker", "Garmin"]
+NOUNS = ["headphones", "speaker", "laptop", "monitor", "camera", "tv", "keyboard", "mouse", "charger", "watch", "tablet", "earbuds"]
+ADJECTIVES = ["wireless", "portable", "4k", "oled", "noise cancelling", "gaming", "compact", "smart", "ultra slim", "waterproof"]
+
+
+def generate_catalog(size: int, images_per_product: int = 1, image_dir: Optional[Path] = None, seed: int = 42) -> List[Product]:
+    """Generate a deterministic synthetic product catalog
+
+    Image files are only written when ``image_dir`` is given (needed by the real
+    CLIP embedder); otherwise images carry synthetic paths that the fake
+    embedder hashes without opening.
+    """
+    rng = random.Random(seed)
+    if image_dir is not None:
+        image_dir.mkdir(parents=True, exist_ok=True)
+
+    products = []
+    for i in range(size):
+        brand = rng.choice(BRANDS)
+        noun = rng.choice(NOUNS)
+        adjective = rng.choice(ADJECTIVES)
+        product_id = f"bench-{i:07d}"
+
+        images = []
+        for j in range(images_per_product):
+            image_id = f"{product_id}-img{j}"
+            file_path = f"synthetic/{image_id}.jpg"
+            if image_dir is not None:
+                file_path = str(image_dir / f"{image_id}.jpg")
+                color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+                Image.new("RGB", (336, 336), color).save(file_path, "JPEG")
+            images.append(ProductImage(
+                id=image_id,
+                filename=f"{image_id}.jpg",
+                file_path=file_path,
+                file_url=f"/uploads/images/{image_id}.jpg",
+                file_size=0,
+                mime_type="image/jpeg",
+                created_at=datetime(2024, 1, 1)
+            ))
+
+        products.append(Product(
+            id=product_id,
+            title=f"{brand} {adjective} {noun} {i}",
+            description=f"The {brand} {noun} is a {adjective} {noun} for everyday use, model {i}.",
+            price=round(rng.uniform(9.99, 2999.99), 2),
+            images=images,
+            category=rng.choice(CATEGORIES),
+            tags=[noun, adjective, brand.lower()],
+            created_at=datetime(2024, 1, 1),
+            updated_at=datetime(2024, 1, 1)
+        ))
+
+    return products
+
+
+def generate_queries(count: int, seed: int = 7) -> List[str]:
+    """Generate shopper-style text queries over the synthetic vocabulary"""
+    rng = random.Random(seed)
+    return [f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} from {rng.choice(BRANDS)}" for _ in range(count)]
@@ -0,0 +1,41 @@
+import hashlib
+import re
+import numpy as np
+from typing import Dict, Optional
+from PIL import ImageFile
+
+
+class FakeEmbedder:
+    """Deterministic stand-in for ClipEmbedder with no model cost
+
+    Text embeddings are the normalized sum of a fixed random vector per token,
+    so texts sharing words land near each other and searches return realistic
+    hits. Image embeddings are derived from the image path (or pixel bytes for
+    in-memory images). Results are identical across runs and processes.
+    """
+
+    def __init__(self, dim: int = 768):
+        self.model_id = f"fake-embedder-{dim}"
+        self.dim = dim
+        self._token_vectors: Dict[str, np.ndarray] = {}
+
+    def _seeded_vector(self, key: bytes) -> np.ndarray:
+        seed = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+        return np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+
+    def _token_vector(self, token: str) -> np.ndarray:
+        vector = self._token_vectors.get(token)
+        if vector is None:
+            vector = self._seeded_vector(token.encode("utf-8"))
+            self._token_vectors[token] = vector
+        return vector
+
+    def get_text_embedding(self, text: str) -> np.ndarray:
+        tokens = re.findall(r"\w+", text.lower()) or [""]
+        emb = np.sum([self._token_vector(token) for token in tokens], axis=0)
+        return emb / (np.linalg.norm(emb) or 1.0)
+
+    def get_image_embedding(self, image_path: Optional[str] = '', image: Optional[ImageFile.ImageFile] = None) -> np.ndarray:
+        key = image.tobytes() if image is not None else str(image_path).encode("utf-8")
+        emb = self._seeded_vector(b"image:" + key)
+        return emb / np.linalg.norm(emb)
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+VectorIndex conformance checks
+Runs the same behavioural checks against every index backend, so a backend
+can be swapped in behind ProductVectorStore without changing results.
+
+Run from the Backend directory:
+    python -m benchmarks.index_conformance
+    python -m benchmarks.index_conformance --backends numpy
+    python -m benchmarks.index_conformance --backends numpy --sharding none,category,hash
+"""
+
+import argparse
+import itertools
+import shutil
+import sys
+import tempfile
+import traceback
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from app.rag.compression import EmbeddingCompressor
+from app.rag.vector_index import VECTOR_INDEX_BACKENDS, VectorIndex, create_vector_index
+
+
+DIM = 16
+NAME = "conformance"
+
+
+def _vectors(count: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _populate(index: VectorIndex, count: int = 20) -> np.ndarray:
+    vectors = _vectors(count)
+    index.add(
+        ids=[f"doc-{i}" for i in range(count)],
+        embeddings=vectors.tolist(),
+        documents=[f"document {i}" for i in range(count)],
+        metadatas=[{"product_id": f"doc-{i}", "position": i} for i in range(count)]
+    )
+    return vectors
+
+
+def check_add_and_count(index: VectorIndex, reopen: Callable[[], VectorIndex]) -> None:
+    assert index.count() == 0
+    _populate(index)
+    assert index.count() == 20
+
+
+def check_count_where(index: VectorIndex, reopen: Callable[[], VectorIndex]) -> None:
+    vectors = _vectors(12)
+    index.add(
+        ids=[f"doc-{i}" for i in range(12)],
+        embeddings=vectors.tolist(),
+        documents=[f"document {i}" for i in range(12)],
+        metadatas=[{"product_id": f"doc-{i}", "modality": "image" if i % 3 == 0 else "text"} for i in range(12)]
+    )
+    index.delete(ids=["doc-0", "doc-1"])
+    assert index.count(where={"modality": "image"}) == 3
+    assert index.count(where={"modality": "text"}) == 7
+    assert index.count(where={"modality": "audio"}) == 0
+
+
+def check_get_where(index: VectorIndex, reopen: Callable[[], VectorIndex]) -> None:
+    vectors = _vectors(12)
+    index.add(
+        ids=[f"p{i // 3}" if i % 3 == 0 else f"p{i // 3}_img{i % 3}" for i in range(12)],
+        embeddings=vectors.tolist(),
+        documents=[f"document {i}" for i in range(12)],
+        metadatas=[{"product_id": f"p{i // 3}", "modality": "text" if i % 3 == 0 else "image"} for i in range(12)]
+    )
+    assert sorted(index.get(where={"product_id": "p1"}, include=())["ids"]) == ["p1", "p1_img1", "p1_img2"]
+    texts = index.get(where={"modality": "text"}, include=["metadatas"])
+    assert sorted(texts["ids"]) == ["p0", "p1", "p2", "p3"]
+    assert len(index.get(where={"modality": "text"}, limit=2, offset=1, include=())["ids"]) == 2
+    assert index.get(ids=["p1", "p1_img1"], where={"modality": "image"}, include=())["ids"] == ["p1_img1"]
+
+
+def check_duplicate_ids_are_skipped(index: VectorIndex, reopen: Callable[[], VectorIndex]) -> None:
+    _populate(index)
+    index.add(ids=["doc-0"], embeddings=_vectors(1, seed=9).tolist(), documents=["replacement"], metadatas=[{"product_id": "x"}])
+    assert index.count() == 20
+    assert index.get(ids=["doc-0"])["documents"] == ["document 0"]
+
+
+def check_get_by_id_and_limit(index: VectorIndex, reopen: Callable[[], VectorIndex]) -> None:
+    _populate(index)
+    result = index.get(ids=["doc-3", "missing"])
+    assert result["ids"] == ["doc-3"]
+    assert result["metadatas"][0]["position"] == 3
+    assert result["documents"][0] == "document 3"
+    assert len(index.get(limit=5)["ids"]) == 5
+    assert len(index.get()["ids"]) == 20
+    # Pages cover every record exactly once
+    pages = [index.get(limit=6, offset=offset)["ids"] for offset in range(0, 20, 6)]
+    assert sorted(sum(pages, [])) == sorted(f"doc-{i}" for i in range(20))
+
+
+def check_get_embeddings(index: VectorIndex, reopen: Callable[[], VectorIndex]) -> None:
+    vectors = _populate(index)
+    result = index.get(ids=["doc-7"], include=["embeddings"])
+    assert np.allclose(np.asarray(result["embeddings"][0]), vectors[7], atol=1e-5)
+
+
+def check_query_exact_match_first(index: VectorIndex, reopen: Callable[[], VectorIndex]) -> None:
+    vectors = _populate(index)
+    result = index.query(query_embeddings=vectors[[4, 11]].tolist(), n_results=5)
+    assert [ids[0] for ids in result["ids"]] == ["doc-4", "doc-11"]
+    assert all(abs(distances[0]) < 1e-4 for distances in result["distances"])
+    assert all(distances == sorted(distances) for distances in result["distances"])
+    assert result["metadatas"][0][0]["product_id"] == "doc-4"
+
+
+def check_query_matches_brute_force(index: VectorIndex, reopen: Callable[[], VectorIndex]) -> None:
+    vectors = _populate(index)
+    query = _vectors(1, seed=5)
+    expected = np.argsort(-(vectors @ query[0]))[:5]
+    result = index.query(query_embeddings=query.tolist(), n_results=5)
+    assert result["ids"][0] == [f"doc-{i}" for i in expected]
+    assert np.allclose(result["distances"][0], 1 - (vectors @ query[0])[expected], atol=1e-4)
+
+
+def check_delete(index: VectorIndex, reopen: Callable[[], VectorIndex]) -> None:
+    vectors = _populate(index)
+    index.delete(ids=["doc-4", "missing"])
+    assert index.count() == 19
+    assert index.get(ids=["doc-4"])["ids"] == []
+    result = index.query(query_embeddings=vectors[[4]].tolist(), n_results=19)
+    assert "doc-4" not in result["ids"][0]
+    # A deleted id can be added again
+    index.add(ids=["doc-4"], embeddings=vectors[[4]].tolist(), documents=["again"], metadatas=[{"product_id": "doc-4"}])
+    assert index.get(ids=["doc-4"])["documents"] == ["again"]
+
+
+def check_many_deletes(index: VectorIndex, reopen: Callable[[], VectorIndex]) -> None:
+    vectors = _populate(index)
+    index.delete(ids=[f"doc-{i}" for i in range(0, 20, 2)])
+    assert index.count() == 10
+    result = index.query(query_embeddings=vectors[[3]].tolist(), n_results=3)
+    assert result["ids"][0][0] == "doc-3"
+    assert all(int(record_id.split("-")[1]) % 2 == 1 for record_id in result["ids"][0])
+
+
+def check_n_results_larger_than_count(index: VectorIndex, reopen: Callable[[], VectorIndex]) -> None:
+    vectors = _populate(index, count=3)
+    result = index.query(query_embeddings=vectors[[0]].tolist(), n_results=10)
+    assert len(result["ids"][0]) == 3
+
+
+def check_persistence(index: VectorIndex, reopen: Callable[[], VectorIndex]) -> None:
+    vectors = _populate(index)
+    index.delete(ids=["doc-1"])
+    reopened = reopen()
+    assert reopened.count() == 19
+    assert reopened.get(ids=["doc-1"])["ids"] == []
+    assert reopened.query(query_embeddings=vectors[[2]].tolist(), n_results=1)["ids"][0] == ["doc-2"]
+
+
+def check_reset_and_metadata(index: VectorIndex, reopen: Callable[[], VectorIndex]) -> None:
+    assert index.metadata.get("embedding_compression") == "none"
+    _populate(index)
+    index.reset({"embedding_compression": "pca8-float16"})
+    assert index.count() == 0
+    assert index.metadata.get("embedding_compression") == "pca8-float16"
+    # A reset index accepts a new dimension
+    index.add(ids=["small"], embeddings=[[1.0] * 8], documents=["small"], metadatas=[{"product_id": "small"}])
+    assert index.count() == 1
+
+
+def check_scoped_holds_category(index: VectorIndex, reopen: Callable[[], VectorIndex]) -> None:
+    vectors = _vectors(30)
+    categories = ["Shoes", "Bags", ""]
+    index.add(
+        ids=[f"doc-{i}" for i in range(30)],
+        embeddings=vectors.tolist(),
+        documents=[f"document {i}" for i in range(30)],
+        metadatas=[{"product_id": f"doc-{i}", "category": categories[i % 3]} for i in range(30)]
+    )
+    # The scoped index may hold more than the category, never less
+    result = index.scoped("shoes").query(query_embeddings=vectors[[0]].tolist(), n_results=30)
+    assert {f"doc-{i}" for i in range(0, 30, 3)} <= set(result["ids"][0])
+    assert result["ids"][0][0] == "doc-0"
+    assert index.scoped(None).count() == 30
+
+
+def check_shared_between_instances(index: VectorIndex, reopen: Callable[[], VectorIndex]) -> None:
+    # Stands in for two worker processes sharing the store: each sees the other's writes
+    other = reopen()
+    vectors = _vectors(4)
+    index.add(ids=["a"], embeddings=vectors[[0]].tolist(), documents=["a"], metadatas=[{"product_id": "a"}])
+    other.add(ids=["b"], embeddings=vectors[[1]].tolist(), documents=["b"], metadatas=[{"product_id": "b"}])
+    assert reopen().count() == 2
+    assert index.query(query_embeddings=vectors[[1]].tolist(), n_results=1)["ids"][0] == ["b"]
+    other.delete(ids=["a"])
+    assert index.get(ids=["a"])["ids"] == []
+    index.add(ids=["c"], embeddings=vectors[[2]].tolist(), documents=["c"], metadatas=[{"product_id": "c"}])
+    assert other.get(ids=["b", "c"], include=["embeddings"])["ids"] == ["b", "c"]
+    assert np.allclose(np.asarray(reopen().get(ids=["c"], include=["embeddings"])["embeddings"][0]), vectors[2], atol=1e-5)
+
+
+def check_compressed_storage(index: VectorIndex, reopen: Callable[[], VectorIndex]) -> None:
+    # Backends that only store float32 ignore configure_storage, so every backend passes
+    vectors = _vectors(20)
+    for dtype in ("float16", "int8"):
+        index.reset({"embedding_compression": f"full-{dtype}"})
+        index.configure_storage(EmbeddingCompressor(dtype=dtype).fit(vectors))
+        _populate(index)
+        for current in (index, reopen()):
+            result = current.query(query_embeddings=vectors[[4, 11]].tolist(), n_results=5)
+            assert [ids[0] for ids in result["ids"]] == ["doc-4", "doc-11"]
+            assert all(abs(distances[0]) < 0.01 for distances in result["distances"])
+            stored = np.asarray(current.get(ids=["doc-7"], include=["embeddings"])["embeddings"][0])
+            assert np.allclose(stored, vectors[7], atol=0.02)
+    # A reset returns to full precision
+    index.reset({"embedding_compression": "none"})
+    _populate(index)
+    stored = np.asarray(index.get(ids=["doc-7"], include=["embeddings"])["embeddings"][0])
+    assert np.allclose(stored, _vectors(20)[7], atol=1e-5)
+
+
+CHECKS: List[Callable[[VectorIndex, Callable[[], VectorIndex]], None]] = [
+    check_add_and_count,
+    check_count_where,
+    check_get_where,
+    check_duplicate_ids_are_skipped,
+    check_get_by_id_and_limit,
+    check_get_embeddings,
+    check_query_exact_match_first,
+    check_query_matches_brute_force,
+    check_delete,
+    check_many_deletes,
+    check_n_results_larger_than_count,
+    check_persistence,
+    check_reset_and_metadata,
+    check_scoped_holds_category,
+    check_compressed_storage,
+    check_shared_between_instances,
+]
+
+
+def run_backend(backend: str, sharding: str = "none") -> List[Tuple[str, bool, str]]:
+    results = []
+    for check in CHECKS:
+        work_dir = Path(tempfile.mkdtemp(prefix=f"index-conformance-{backend}-{sharding}-"))
+        try:
+            def reopen() -> VectorIndex:
+                return create_vector_index(
+                    str(work_dir), NAME, {"embedding_compression": "none"}, backend=backend, sharding=sharding
+                )
+
+            check(reopen(), reopen)
+            results.append((check.__name__, True, ""))
+        except Exception:
+            results.append((check.__name__, False, traceback.format_exc(limit=3)))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VectorIndex backend conformance checks")
+    parser.add_argument("--backends", default=",".join(VECTOR_INDEX_BACKENDS), help="Comma-separated backends to check")
+    parser.add_argument("--sharding", default="none", help="Comma-separated sharding modes: none, category, hash")
+    args = parser.parse_args()
+
+    failed = 0
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    modes = [m.strip() for m in args.sharding.split(",") if m.strip()]
+    for backend, sharding in itertools.product(backends, modes):
+        print(f"🔍 {backend} (sharding: {sharding})")
+        for name, passed, error in run_backend(backend, sharding):
+            print(f"  {'✅' if passed else '❌'} {name}")
+            if not passed:
+                failed += 1
+                print("     " + error.replace("\n", "\n     "))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
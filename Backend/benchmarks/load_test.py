@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Concurrent load generator for the Chatbot API, built on ChatbotAPITester
+Sends a weighted mix of chat, text-search, image-search and catalog-listing
+traffic and reports per-endpoint latency histograms and error rates.
+
+Start the server with local stand-ins for Gemini and Tavily to measure the
+server's own limits without the network:
+    LLM_PROVIDER=stub STUB_LLM_LATENCY_MS=400 STUB_WEB_SEARCH_LATENCY_MS=200 python main.py
+
+Then, from the Backend directory:
+    python -m benchmarks.load_test --mode closed --concurrency 32 --duration 60
+    python -m benchmarks.load_test --mode open --rate 50 --concurrency 200 --duration 60 --output load.json
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import random
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import aiohttp
+
+from benchmarks.stats import summarize_latencies
+from test_api import ChatbotAPITester
+
+
+# Histogram bucket upper bounds in milliseconds
+HISTOGRAM_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf")]
+
+CHAT_MESSAGES = [
+    "Do you have wireless headphones under $200?",
+    "I'm looking for a 4k oled tv",
+    "Recommend a laptop for travel",
+    "How do I cook quinoa?",
+    "What's the weather like in Paris?",
+    "Show me a cheap bluetooth speaker",
+]
+SEARCH_QUERIES = ["headphones", "oled tv", "gaming laptop", "portable speaker", "smart watch", "camera"]
+
+
+def _default_image_bytes() -> bytes:
+    """Small synthetic JPEG used when no --image is given"""
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", (512, 512), (40, 90, 160)).save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+class EndpointStats:
+    """Latency samples, histogram and error count for one endpoint"""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.buckets = [0] * len(HISTOGRAM_BUCKETS_MS)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, latency_s: float, error: Optional[str] = None) -> None:
+        self.latencies.append(latency_s)
+        latency_ms = latency_s * 1000.0
+        for i, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+            if latency_ms <= bound:
+                self.buckets[i] += 1
+                break
+        if error:
+            self.errors[error] += 1
+
+    def summary(self, wall_time: float) -> Dict[str, Any]:
+        error_count = sum(self.errors.values())
+        return {
+            **summarize_latencies(self.latencies, wall_time),
+            "errors": error_count,
+            "error_rate": round(error_count / len(self.latencies), 4) if self.latencies else 0.0,
+            "error_types": dict(self.errors),
+            "histogram_ms": {
+                ("+Inf" if bound == float("inf") else str(bound)): count
+                for bound, count in zip(HISTOGRAM_BUCKETS_MS, self.buckets)
+            },
+        }
+
+
+class LoadGenerator:
+    """Drives a ChatbotAPITester with a weighted traffic mix in open- or closed-loop mode"""
+
+    def __init__(self, tester: ChatbotAPITester, mix: Dict[str, float], image_bytes: bytes, seed: int = 1):
+        self.tester = tester
+        self.rng = random.Random(seed)
+        self.image_bytes = image_bytes
+        self.stats: Dict[str, EndpointStats] = defaultdict(EndpointStats)
+        self.dropped = 0
+        self.thread_ids: List[str] = []
+
+        self.operations: Dict[str, Callable[[], Awaitable[Any]]] = {
+            "chat": self._chat,
+            "text_search": lambda: self.tester.text_search(self.rng.choice(SEARCH_QUERIES)),
+            "image_search": lambda: self.tester.image_search(self.image_bytes),
+            "list_products": lambda: self.tester.list_products(limit=100),
+        }
+        self.mix_names = [name for name, weight in mix.items() if weight > 0]
+        self.mix_weights = [mix[name] for name in self.mix_names]
+
+    async def _chat(self) -> Any:
+        # Continue an existing conversation half of the time
+        thread_id = self.rng.choice(self.thread_ids) if self.thread_ids and self.rng.random() < 0.5 else None
+        result = await self.tester.send_message(self.rng.choice(CHAT_MESSAGES), thread_id=thread_id, user_id="load-test")
+        if not thread_id and result.get("thread_id") and len(self.thread_ids) < 1000:
+            self.thread_ids.append(result["thread_id"])
+        return result
+
+    async def _issue_one(self) -> None:
+        name = self.rng.choices(self.mix_names, weights=self.mix_weights)[0]
+        start = time.perf_counter()
+        error = None
+        try:
+            await self.operations[name]()
+        except aiohttp.ClientResponseError as e:
+            error = f"HTTP {e.status}"
+        except Exception as e:
+            error = type(e).__name__
+        self.stats[name].record(time.perf_counter() - start, error)
+
+    async def run_closed_loop(self, concurrency: int, duration: float, think_time: float = 0.0) -> None:
+        """Fixed number of workers, each sending its next request when the previous one completes"""
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                await self._issue_one()
+                if think_time:
+                    await asyncio.sleep(think_time)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    async def run_open_loop(self, rate: float, duration: float, max_in_flight: int) -> None:
+        """Poisson arrivals at a fixed rate regardless of response times
+
+        Arrivals beyond max_in_flight outstanding requests are dropped and
+        counted, so an overloaded server shows up as drops rather than the
+        generator silently slowing down.
+        """
+        deadline = time.perf_counter() + duration
+        in_flight: set = set()
+
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(self.rng.expovariate(rate))
+            if len(in_flight) >= max_in_flight:
+                self.dropped += 1
+                continue
+            task = asyncio.create_task(self._issue_one())
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+        if in_flight:
+            await asyncio.gather(*in_flight)
+
+    def report(self, wall_time: float) -> Dict[str, Any]:
+        total = sum(len(s.latencies) for s in self.stats.values())
+        return {
+            "wall_time_s": round(wall_time, 2),
+            "total_requests": total,
+            "overall_throughput_per_s": round(total / wall_time, 2) if wall_time > 0 else 0.0,
+            "dropped_arrivals": self.dropped,
+            "endpoints": {name: stats.summary(wall_time) for name, stats in sorted(self.stats.items())},
+        }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\nRequests: {report['total_requests']} in {report['wall_time_s']}s "
+          f"({report['overall_throughput_per_s']}/s), dropped arrivals: {report['dropped_arrivals']}")
+    for name, summary in report["endpoints"].items():
+        print(f"\n{name}: count={summary['count']} errors={summary['errors']} ({summary['error_rate'] * 100:.1f}%)")
+        if summary["count"]:
+            print(f"  p50={summary['p50_ms']}ms p95={summary['p95_ms']}ms p99={summary['p99_ms']}ms max={summary['max_ms']}ms")
+        peak = max(summary["histogram_ms"].values()) or 1
+        for bound, count in summary["histogram_ms"].items():
+            print(f"  <= {bound:>6} ms | {'#' * int(40 * count / peak):<40} {count}")
+
+
+def _parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Concurrent load generator for the Chatbot API")
+    parser.add_argument("--base-url", default="http://localhost:8000", help="API base URL")
+    parser.add_argument("--mode", choices=["open", "closed"], default="closed", help="Arrival model")
+    parser.add_argument("--concurrency", type=int, default=16, help="Workers (closed) or max in-flight requests (open)")
+    parser.add_argument("--rate", type=float, default=10.0, help="Arrivals per second in open-loop mode")
+    parser.add_argument("--duration", type=float, default=30.0, help="Test duration in seconds")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Pause between requests per closed-loop worker")
+    parser.add_argument("--mix", default="chat=2,text_search=4,image_search=1,list_products=1",
+                        help="Weighted traffic mix, e.g. chat=2,text_search=4,image_search=1,list_products=1")
+    parser.add_argument("--image", help="JPEG file used for image searches")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request client timeout in seconds")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    image_bytes = open(args.image, "rb").read() if args.image else _default_image_bytes()
+    mix = _parse_mix(args.mix)
+
+    async with ChatbotAPITester(args.base_url, max_connections=args.concurrency, timeout=args.timeout) as tester:
+        health = await tester.health_check()
+        print(f"✅ Health Check: {health}")
+
+        generator = LoadGenerator(tester, mix, image_bytes)
+        print(f"🚀 Running {args.mode}-loop load for {args.duration}s with mix {mix}...")
+        start = time.perf_counter()
+        if args.mode == "closed":
+            await generator.run_closed_loop(args.concurrency, args.duration, args.think_time)
+        else:
+            await generator.run_open_loop(args.rate, args.duration, args.concurrency)
+        report = generator.report(time.perf_counter() - start)
+
+    report["config"] = vars(args)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+CLIP model loading benchmark
+Compares cold start time and per-worker memory of the standard
+from_pretrained path against the memory-mapped weight cache.
+
+Run from the Backend directory:
+    python -m benchmarks.model_load_benchmark --workers 4 --output model_load.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from typing import Any, Dict, List
+
+from benchmarks.stats import memory_breakdown_mb
+
+
+def load_worker(mmap_weights: bool, barrier: Any, results: Any) -> None:
+    """Load CLIP, embed once to page weights in, then measure while all workers are alive"""
+    os.environ["CLIP_MMAP_WEIGHTS"] = str(mmap_weights)
+    from PIL import Image
+    from app.rag.embeddings import ClipEmbedder
+
+    start = time.perf_counter()
+    embedder = ClipEmbedder()
+    load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    embedder.get_text_embedding("wireless noise cancelling headphones")
+    embedder.get_image_embedding(image=Image.new("RGB", (336, 336), (120, 120, 120)))
+    first_embed_s = time.perf_counter() - start
+
+    barrier.wait()
+    results.put({"load_s": round(load_s, 2), "first_embed_s": round(first_embed_s, 2), **memory_breakdown_mb()})
+    barrier.wait()
+
+
+def run_mode(mmap_weights: bool, workers: int) -> Dict[str, Any]:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=load_worker, args=(mmap_weights, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    samples: List[Dict[str, float]] = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    return {
+        "workers": samples,
+        "mean_load_s": round(sum(s["load_s"] for s in samples) / workers, 2),
+        "total_rss_mb": round(sum(s.get("rss_mb", 0) for s in samples), 1),
+        "total_pss_mb": round(sum(s.get("pss_mb", 0) for s in samples), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLIP model loading benchmark")
+    parser.add_argument("--workers", type=int, default=2, help="Concurrent worker processes per mode")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    # Build the cache up front so the mmap run measures loading, not conversion
+    from app.config import settings
+    from app.rag.embeddings import WEIGHTS_FILENAME, build_weight_cache, weight_cache_path
+    if not (weight_cache_path(settings.CLIP_MODEL_NAME) / WEIGHTS_FILENAME).exists():
+        print("📦 Building weight cache...")
+        build_weight_cache(settings.CLIP_MODEL_NAME)
+
+    report = {}
+    for label, mmap_weights in (("from_pretrained", False), ("mmap_cache", True)):
+        print(f"⏱️  Loading with {label} in {args.workers} workers...")
+        report[label] = run_mode(mmap_weights, args.workers)
+        print(json.dumps({k: v for k, v in report[label].items() if k != "workers"}, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
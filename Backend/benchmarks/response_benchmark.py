@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Response serialization and compression benchmark for the catalog endpoints
+Serves synthetic product listings through an in-process FastAPI app the way
+the product routes did before and after switching to FastJSONResponse and
+CompressionMiddleware, and reports latency and bytes on the wire.
+
+Run from the Backend directory:
+    python -m benchmarks.response_benchmark --sizes 10,100,1000 --output responses.json
+"""
+
+import argparse
+import json
+import time
+from typing import Any, Dict, List
+
+import fastapi
+from fastapi import FastAPI, Query
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+
+from app.api.responses import CompressionMiddleware, FastJSONResponse, brotli, orjson
+from app.models import ProductResponse
+from benchmarks.catalog import generate_catalog
+from benchmarks.stats import summarize_latencies
+
+
+def build_app(products: List[ProductResponse]) -> FastAPI:
+    app = FastAPI()
+    adapter = TypeAdapter(List[ProductResponse])
+
+    @app.get("/legacy")
+    async def legacy_listing(limit: int = Query(1000)) -> JSONResponse:
+        # What response_model does on FastAPI < 0.115: validate, dump to JSON-ready python, json.dumps
+        return JSONResponse(adapter.dump_python(adapter.validate_python(products[:limit]), mode="json"))
+
+    @app.get("/default", response_model=List[ProductResponse])
+    async def default_listing(limit: int = Query(1000)) -> List[ProductResponse]:
+        # response_model path of the installed FastAPI
+        return products[:limit]
+
+    @app.get("/fast", response_model=List[ProductResponse])
+    async def fast_listing(limit: int = Query(1000)) -> List[ProductResponse]:
+        return FastJSONResponse(products[:limit])
+
+    app.add_middleware(CompressionMiddleware)
+    return app
+
+
+def catalog_responses(size: int) -> List[ProductResponse]:
+    return [
+        ProductResponse(
+            id=product.id,
+            title=product.title,
+            description=product.description,
+            price=product.price,
+            images=[image.file_url for image in product.images],
+            category=product.category,
+            tags=product.tags,
+            created_at=product.created_at,
+            updated_at=product.updated_at
+        )
+        for product in generate_catalog(size)
+    ]
+
+
+def run_scenario(client: TestClient, path: str, size: int, encoding: str, repeats: int) -> Dict[str, Any]:
+    headers = {"Accept-Encoding": encoding}
+    url = f"{path}?limit={size}"
+    # Warm up routing and the serializers
+    response = client.get(url, headers=headers)
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeats):
+        call_start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        latencies.append(time.perf_counter() - call_start)
+    result = summarize_latencies(latencies, time.perf_counter() - start)
+    result["wire_bytes"] = int(response.headers.get("content-length", len(response.content)))
+    result["content_encoding"] = response.headers.get("content-encoding", "identity")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catalog response serialization and compression benchmark")
+    parser.add_argument("--sizes", default="10,100,1000", help="Comma-separated products per response")
+    parser.add_argument("--repeats", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    scenarios = [
+        ("legacy", "/legacy", "identity"),
+        ("default", "/default", "identity"),
+        ("fast", "/fast", "identity"),
+        ("fast+gzip", "/fast", "gzip"),
+    ]
+    if brotli is not None:
+        scenarios.append(("fast+br", "/fast", "br"))
+
+    products = catalog_responses(max(sizes))
+    client = TestClient(build_app(products))
+    print(
+        f"📦 FastAPI {fastapi.__version__}, orjson {'available' if orjson else 'missing'}, "
+        f"brotli {'available' if brotli else 'missing'}"
+    )
+    print(f"{'size':>6} {'scenario':<12} {'p50 ms':>9} {'p95 ms':>9} {'bytes':>10}")
+
+    report: Dict[str, Any] = {"fastapi": fastapi.__version__, "sizes": {}}
+    for size in sizes:
+        results = {}
+        for name, path, encoding in scenarios:
+            result = run_scenario(client, path, size, encoding, args.repeats)
+            results[name] = result
+            print(f"{size:>6} {name:<12} {result['p50_ms']:>9} {result['p95_ms']:>9} {result['wire_bytes']:>10}")
+        report["sizes"][str(size)] = results
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
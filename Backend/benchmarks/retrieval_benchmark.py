@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Offline retrieval benchmark for ProductVectorStore
+Runs add/search/get operations against synthetic catalogs without a server.
+
+Run from the Backend directory:
+    python -m benchmarks.retrieval_benchmark --sizes 1000,10000,100000 --output baseline.json
+    python -m benchmarks.retrieval_benchmark --embedder clip --sizes 1000
+    python -m benchmarks.retrieval_benchmark --sizes 1000 --compare baseline.json
+    python -m benchmarks.retrieval_benchmark --index-backend numpy --compare baseline.json
+    python -m benchmarks.retrieval_benchmark --sharding hash --compare baseline.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from benchmarks.catalog import generate_catalog, generate_queries
+from benchmarks.stats import summarize_latencies, peak_rss_mb
+
+
+def _time_calls(fn: Callable[[Any], Any], args: List[Any]) -> Dict[str, float]:
+    """Call fn once per argument and summarize the per-call latencies"""
+    latencies = []
+    start = time.perf_counter()
+    for arg in args:
+        call_start = time.perf_counter()
+        fn(arg)
+        latencies.append(time.perf_counter() - call_start)
+    return summarize_latencies(latencies, time.perf_counter() - start)
+
+
+def _directory_size_mb(path: Path) -> float:
+    total = sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+    return round(total / (1024 * 1024), 2)
+
+
+def run_catalog_benchmark(size: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Benchmark one catalog size; runs in a fresh process so peak RSS is per size"""
+    from app.rag.vector_store import ProductVectorStore
+
+    work_dir = Path(tempfile.mkdtemp(prefix=f"retrieval-bench-{size}-"))
+    try:
+        load_start = time.perf_counter()
+        if options["embedder"] == "clip":
+            from app.rag.embeddings import ClipEmbedder
+            embedder = ClipEmbedder()
+        else:
+            from benchmarks.fake_embedder import FakeEmbedder
+            embedder = FakeEmbedder(dim=options["dim"])
+        embedder_load_s = time.perf_counter() - load_start
+
+        store = ProductVectorStore(
+            embedder=embedder,
+            persist_directory=str(work_dir / "chroma_db"),
+            index_backend=options["index_backend"],
+            index_sharding=options["sharding"]
+        )
+
+        # Real CLIP needs real image files; the fake embedder only hashes paths
+        image_dir = work_dir / "images" if options["embedder"] == "clip" else None
+        catalog = generate_catalog(size, images_per_product=options["images_per_product"], image_dir=image_dir)
+        queries = generate_queries(options["queries"])
+        rng = random.Random(13)
+        lookup_ids = [rng.choice(catalog).id for _ in range(options["queries"])]
+
+        results: Dict[str, Any] = {
+            "catalog_size": size,
+            "embedder_load_s": round(embedder_load_s, 3),
+        }
+
+        # Silence the per-product log line while ingesting
+        with contextlib.redirect_stdout(io.StringIO()):
+            results["add_product"] = _time_calls(store.add_product, catalog)
+            results["search_products"] = _time_calls(lambda q: store.search_products(query=q, limit=10), queries)
+        results["get_product_by_id"] = _time_calls(store.get_product_by_id, lookup_ids)
+        for limit in (100, 1000):
+            results[f"get_all_products_{limit}"] = _time_calls(
+                lambda n: store.get_all_products(limit=n), [limit] * options["listing_repeats"]
+            )
+
+        results["documents"] = store.product_collection.count()
+        results["index_size_mb"] = _directory_size_mb(work_dir / "chroma_db")
+        results["peak_rss_mb"] = peak_rss_mb()
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def compare_to_baseline(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print p50/p95 latency and throughput changes relative to a baseline report"""
+    print("\nComparison against baseline")
+    print(f"{'size':>8} {'operation':<22} {'p50 ms':>18} {'p95 ms':>18} {'throughput/s':>20}")
+    for size, ops in current["results"].items():
+        base_ops = baseline.get("results", {}).get(size)
+        if not base_ops:
+            continue
+        for op, stats in ops.items():
+            base_stats = base_ops.get(op)
+            if not isinstance(stats, dict) or not isinstance(base_stats, dict) or not stats.get("count"):
+                continue
+            cells = []
+            for key in ("p50_ms", "p95_ms", "throughput_per_s"):
+                old, new = base_stats.get(key), stats.get(key)
+                change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+                cells.append(f"{new:>9} ({change:>7})")
+            print(f"{size:>8} {op:<22} {cells[0]:>18} {cells[1]:>18} {cells[2]:>20}")
+        for key in ("peak_rss_mb", "index_size_mb"):
+            if key in ops and key in base_ops:
+                print(f"{size:>8} {key:<22} {base_ops[key]} -> {ops[key]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ProductVectorStore retrieval benchmark")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated catalog sizes")
+    parser.add_argument("--embedder", choices=["fake", "clip"], default="fake", help="Embedding backend")
+    parser.add_argument("--index-backend", choices=["chroma", "numpy"], default="chroma", help="Vector index backend")
+    parser.add_argument("--sharding", choices=["none", "category", "hash"], default="none", help="Vector index sharding")
+    parser.add_argument("--dim", type=int, default=768, help="Fake embedder dimension")
+    parser.add_argument("--images-per-product", type=int, default=1, help="Images generated per product")
+    parser.add_argument("--queries", type=int, default=200, help="Search and lookup calls per size")
+    parser.add_argument("--listing-repeats", type=int, default=20, help="get_all_products calls per limit")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    args = parser.parse_args()
+
+    options = {
+        "embedder": args.embedder,
+        "index_backend": args.index_backend,
+        "sharding": args.sharding,
+        "dim": args.dim,
+        "images_per_product": args.images_per_product,
+        "queries": args.queries,
+        "listing_repeats": args.listing_repeats,
+    }
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            **options,
+        },
+        "results": {},
+    }
+
+    # A fresh spawned process per size keeps peak RSS and caches independent
+    context = multiprocessing.get_context("spawn")
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        print(f"📦 Benchmarking catalog of {size} products ({args.embedder} embedder, {args.index_backend} index)...")
+        with context.Pool(1) as pool:
+            results = pool.apply(run_catalog_benchmark, (size, options))
+        report["results"][str(size)] = results
+        print(json.dumps(results, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare_to_baseline(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import resource
+import sys
+import numpy as np
+from typing import Dict, List
+
+
+def summarize_latencies(latencies: List[float], wall_time: float) -> Dict[str, float]:
+    """Throughput and latency percentiles (milliseconds) for a list of per-call seconds"""
+    if not latencies:
+        return {"count": 0}
+
+    samples = np.asarray(latencies) * 1000.0
+    return {
+        "count": len(latencies),
+        "throughput_per_s": round(len(latencies) / wall_time, 2) if wall_time > 0 else 0.0,
+        "mean_ms": round(float(samples.mean()), 3),
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p95_ms": round(float(np.percentile(samples, 95)), 3),
+        "p99_ms": round(float(np.percentile(samples, 99)), 3),
+        "max_ms": round(float(samples.max()), 3),
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the current process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+def memory_breakdown_mb() -> Dict[str, float]:
+    """Current RSS, PSS and shared memory of this process in MB (Linux only)
+
+    PSS divides shared pages between the processes mapping them, so summing
+    PSS across workers gives their true combined footprint.
+    """
+    fields = {"Rss": "rss_mb", "Pss": "pss_mb", "Shared_Clean": "shared_clean_mb", "Private_Dirty": "private_dirty_mb"}
+    breakdown: Dict[str, float] = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in fields:
+                    breakdown[fields[key]] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        pass
+    return breakdown
@@ -1,12 +1,15 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 import os
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from app.api.routes import router
 from app.api.product_routes import router as product_router
+from app.api.responses import CompressionMiddleware
 from app.config import settings
+from app.services.service_manager import shutdown_services
 
 # Validate settings on startup
 try:
@@ -28,6 +31,7 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("👋 Shutting down Chatbot API...")
+    await shutdown_services()
 
 
 # Create FastAPI app
@@ -45,8 +49,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],    
     allow_headers=["*"],
+    # Let browser clients read ETags for conditional catalog requests
+    expose_headers=["ETag"],
 )
 
+# Compress JSON responses; added last so it wraps every other middleware
+if settings.RESPONSE_COMPRESSION:
+    app.add_middleware(CompressionMiddleware)
+
 # Include API routes
 app.include_router(router)
 app.include_router(product_router)
@@ -67,6 +77,12 @@ async def root():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics in text exposition format"""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 if __name__ == "__main__":
     import uvicorn
     
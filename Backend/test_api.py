@@ -13,12 +13,17 @@ from typing import Dict, Any
 class ChatbotAPITester:
     """Test client for the Chatbot API"""
     
-    def __init__(self, base_url: str = "http://localhost:8000"):
+    def __init__(self, base_url: str = "http://localhost:8000", max_connections: int = 100, timeout: float = 300):
         self.base_url = base_url
+        self.max_connections = max_connections
+        self.timeout = timeout
         self.session = None
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_connections),
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -32,17 +37,48 @@ class ChatbotAPITester:
     
     async def send_message(self, message: str, thread_id: str = None, user_id: str = None) -> Dict[str, Any]:
         """Send a message to the chatbot"""
-        payload = {
-            "message": message,
-            "user_id": user_id
-        }
+        # The chat endpoint takes form fields
+        payload = aiohttp.FormData()
+        payload.add_field("message", message)
+        if user_id:
+            payload.add_field("user_id", user_id)
         if thread_id:
-            payload["thread_id"] = thread_id
+            payload.add_field("thread_id", thread_id)
         
         async with self.session.post(
             f"{self.base_url}/api/v1/chat",
-            json=payload
+            data=payload
+        ) as response:
+            response.raise_for_status()
+            return await response.json()
+    
+    async def text_search(self, query: str, limit: int = 10) -> Dict[str, Any]:
+        """Search products by text"""
+        async with self.session.get(
+            f"{self.base_url}/api/v1/products/search/simple",
+            params={"q": query, "limit": limit}
+        ) as response:
+            response.raise_for_status()
+            return await response.json()
+    
+    async def image_search(self, image_bytes: bytes, content_type: str = "image/jpeg", limit: int = 10) -> Dict[str, Any]:
+        """Search products by raw image bytes"""
+        async with self.session.post(
+            f"{self.base_url}/api/v1/products/search/image/binary",
+            params={"limit": limit},
+            data=image_bytes,
+            headers={"Content-Type": content_type}
+        ) as response:
+            response.raise_for_status()
+            return await response.json()
+    
+    async def list_products(self, limit: int = 100) -> Dict[str, Any]:
+        """List products in the catalog"""
+        async with self.session.get(
+            f"{self.base_url}/api/v1/products/",
+            params={"limit": limit}
         ) as response:
+            response.raise_for_status()
             return await response.json()
     
     async def get_thread_history(self, thread_id: str) -> Dict[str, Any]: